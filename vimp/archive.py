@@ -6,24 +6,99 @@ Distributed under the LGPL v2.1; see LICENSE.txt
 """
 
 import contextlib
+import fnmatch
 import os
+import posixpath
+import re
 import shutil
 import tarfile
 import zipfile
 
+from vimp.log import verb
+from vimp.util import (joinpath, mkdir, pathname)
+
 class ArchiveMember(object):
-    def __init__(self, member, name, isdir):
+    """A member of an archive.
+
+    symlink and hardlink are the member names links point to, and mode is
+    the file's permission bits, or None if the archive has none."""
+    def __init__(self, member, name, isdir, symlink=None, hardlink=None,
+                 mode=None):
         self._obj = member
         self.name = name
         self.isdir = isdir
+        self.symlink = symlink
+        self.hardlink = hardlink
+        self.mode = mode
+
+    @property
+    def islink(self):
+        return self.symlink is not None or self.hardlink is not None
 
     def __str__(self):
         return "<ArchiveMember isdir={} '{}'>".format(self.isdir, self.name)
 
+def normalize(name):
+    """Returns member name without leading ./ and trailing slash."""
+    while name.startswith("./"):
+        name = name[2:]
+    return name.rstrip("/")
+
+def isunsafe(name):
+    """Checks if a member name could be extracted outside the destination,
+    like "/etc/passwd" or "plugin/../../x"."""
+    return name.startswith("/") or ".." in name.split("/")
+
+def isglob(pattern):
+    """Checks if pattern contains glob characters."""
+    return any(c in pattern for c in "*?[")
+
+class Pattern(object):
+    """An (archive pattern, destination) pair from a script's extract list.
+
+    A plain pattern names a single member, which is extracted to the
+    destination path.  A glob pattern, like "autoload/l9/*", matches all
+    members below it (fnmatch's * also matches slashes), and each is
+    extracted to the destination directory with its path relative to the
+    part of the pattern before the first glob character.  Absolute member
+    names, and names with "..", are skipped.
+    """
+    def __init__(self, pattern, output):
+        self.pattern = normalize(pattern)
+        self.output = output
+        self.glob = isglob(self.pattern)
+        if self.glob:
+            parts = self.pattern.split("/")
+            base = []
+            for part in parts:
+                if isglob(part):
+                    break
+                base.append(part)
+            self.base = "/".join(base)
+            self.regex = re.compile(fnmatch.translate(self.pattern))
+
+    def match(self, name):
+        """Returns destination for member name, or None.
+
+        Members with names that would end up outside the destination are
+        never matched."""
+        if isunsafe(name):
+            verb("Skipping unsafe member name %s" % name)
+            return None
+        if not self.glob:
+            return self.output if name == self.pattern else None
+        if not self.regex.match(name) or name == self.base:
+            return None
+        relative = name[len(self.base):].lstrip("/") if self.base else name
+        return joinpath(self.output, *relative.split("/"))
+
 class ZipArchive(object):
     """Extract files from zip file."""
-    def __init__(self, path):
-        self.zipfile = zipfile.ZipFile(path)
+    streaming = False
+
+    def __init__(self, path, fileobj=None):
+        source = fileobj if fileobj is not None else path
+        self.zipfile = zipfile.ZipFile(source)
 
     def __enter__(self):
         return self
@@ -49,16 +124,29 @@ class ZipArchive(object):
 
     def extract(self, member, path):
         if not member.isdir:
+            mkdir(pathname(path))
             with self.open(member) as src:
-                with file(path, "wb") as dst:
+                with open(path, "wb") as dst:
                     shutil.copyfileobj(src, dst)
         else:
-            os.mkdir(path)
+            mkdir(path)
 
 class TarArchive(object):
-    """Extract files from tar file."""
-    def __init__(self, path):
-        self.tar = tarfile.open(path, "r")
+    """Extract files from tar file.
+
+    In streaming mode (the default), the tar file is read front to back
+    exactly once, without building a list of all members first.  The
+    members can then only be iterated once, and a member can only be
+    extracted while it is the current one.  This also works for
+    non-seekable file objects, such as a network or pipe stream.
+    """
+    def __init__(self, path, fileobj=None, stream=True):
+        self.streaming = stream
+        mode = "r|*" if stream else "r"
+        if fileobj is not None:
+            self.tar = tarfile.open(fileobj=fileobj, mode=mode)
+        else:
+            self.tar = tarfile.open(path, mode)
 
     def __enter__(self):
         return self
@@ -71,36 +159,59 @@ class TarArchive(object):
 
     @property
     def members(self):
-        for m in self.tar.getmembers():
-            name = m.name
-            isdir = m.isdir()
-            yield ArchiveMember(m, name, isdir)
+        infos = self.tar if self.streaming else self.tar.getmembers()
+        for m in infos:
+            yield ArchiveMember(m, m.name, m.isdir(),
+                                symlink=m.linkname if m.issym() else None,
+                                hardlink=m.linkname if m.islnk() else None,
+                                mode=m.mode)
+
+    @contextlib.contextmanager
+    def open(self, member):
+        f = self.tar.extractfile(member._obj)
+        if f is None:
+            raise ValueError("Cannot extract %s from tar file" % member.name)
+        yield f
+        f.close()
 
     def extract(self, member, path):
         if not member.isdir:
-            obj = member._obj
-            onlypath, filename = os.path.split(path)
-
-            # Requested to change filename as well?
-            if len(filename) > 0:
-                obj.name = filename
-                self.tar.extract(obj, onlypath)
-            else:
-                self.tar.extract(obj, path)
+            mkdir(pathname(path))
+            with self.open(member) as src:
+                with open(path, "wb") as dst:
+                    shutil.copyfileobj(src, dst)
         else:
-            os.mkdir(path)
+            mkdir(path)
+
+# File name endings of tar files, compressed or not.
+TAR_TYPES = [".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz",
+             ".txz"]
 
 class Archive(object):
-    """Extract files form tar og zip file."""
-    def __init__(self, path):
+    """Extract files form tar og zip file.
+
+    The archive type is taken from the file name.  If fileobj is given, the
+    archive is read from it instead of from path; for tar files it does not
+    have to be seekable.
+
+    If reuse is given, reuse(destination) returns the path of an existing
+    file, or None.  A member with the same contents as that file is then
+    hardlinked to it instead of written, and counted in self.reused.
+
+    Symbolic links in tar files are recreated if they point inside the
+    archive, and hard links are made to where their target was extracted.
+    Other links are skipped with a warning.
+    """
+    def __init__(self, path, fileobj=None, reuse=None):
+        self.path = path
+        self.reuse = reuse
+        self.reused = 0
+        # Member name to the path it was first extracted to
+        self.written = {}
         if path.lower().endswith(".zip"):
-            self.archive = ZipArchive(path)
-        elif path.lower().endswith(".tar.gz"):
-            self.archive = TarArchive(path)
-        elif path.lower().endswith(".tar.bz2"):
-            self.archive = TarArchive(path)
-        elif path.lower().endswith(".tar"):
-            self.archive = TarArchive(path)
+            self.archive = ZipArchive(path, fileobj)
+        elif any(path.lower().endswith(ext) for ext in TAR_TYPES):
+            self.archive = TarArchive(path, fileobj)
         else:
             raise ValueError("Unknown type of archive file: %s" % path)
 
@@ -118,4 +229,161 @@ class Archive(object):
         return self.archive.members
 
     def extract(self, member, path):
-        self.archive.extract(member, path)
+        if member.islink:
+            self.link(member, path)
+            return
+
+        old = self.reuse(path) if self.reuse is not None else None
+        if old is None or member.isdir or not os.path.isfile(old):
+            self.archive.extract(member, path)
+            self.extracted(member, path)
+            return
+
+        with self.archive.open(member) as f:
+            data = f.read()
+        mkdir(pathname(path))
+        if os.path.getsize(old) == len(data):
+            with open(old, "rb") as f:
+                same = f.read() == data
+            if same:
+                try:
+                    os.link(old, path)
+                    verb("Unchanged %s" % path)
+                    self.reused += 1
+                    self.written.setdefault(normalize(member.name), path)
+                    return
+                except OSError:
+                    pass
+        with open(path, "wb") as f:
+            f.write(data)
+        self.extracted(member, path)
+
+    def extracted(self, member, path):
+        """Restores the permissions of a file that was written."""
+        if member.isdir:
+            return
+        if member.mode is not None:
+            # The owner must always be able to read and replace it
+            os.chmod(path, (member.mode & 0o777) | 0o600)
+        self.written.setdefault(normalize(member.name), path)
+
+    def link(self, member, path):
+        """Recreates a link member at path."""
+        name = normalize(member.name)
+        if member.symlink is not None:
+            target = posixpath.normpath(posixpath.join(
+                posixpath.dirname(name), member.symlink))
+            if member.symlink.startswith("/") or isunsafe(target):
+                print("Warning: Skipping %s in %s, which links outside the "
+                      "archive" % (name, self.path))
+                return
+            source = None
+        else:
+            source = self.written.get(normalize(member.hardlink))
+            if source is None:
+                print("Warning: Skipping %s in %s, which links to %s that "
+                      "is not extracted" % (name, self.path, member.hardlink))
+                return
+
+        mkdir(pathname(path))
+        if os.path.lexists(path):
+            os.unlink(path)
+        if source is None:
+            os.symlink(member.symlink, path)
+            return
+        try:
+            os.link(source, path)
+        except OSError:
+            shutil.copy(source, path)
+
+    def _extract_to(self, member, dests):
+        """Extracts member to each destination, reading it only once."""
+        name = normalize(member.name)
+        first = None
+        for dest in dests:
+            if first is None or member.isdir or member.islink:
+                verb("Extracting %s -> %s" % (name, dest))
+                self.extract(member, dest)
+                first = dest
+            else:
+                verb("Copying %s -> %s" % (first, dest))
+                mkdir(pathname(dest))
+                shutil.copy(first, dest)
+
+    def extract_pairs(self, pairs):
+        """Extracts (pattern, destination) pairs in a single pass.
+
+        Returns list of patterns that matched nothing.
+        """
+        patterns = [Pattern(p, o) for (p, o) in pairs]
+        if self.archive.streaming:
+            missing = self._extract_streaming(patterns)
+        else:
+            missing = self._extract_indexed(patterns)
+
+        for pattern in missing:
+            print("Warning: %s not found in %s" % (pattern, self.path))
+        return missing
+
+    def _extract_indexed(self, patterns):
+        """Extracts patterns from an archive with random access.
+
+        The member names are indexed once, every pattern is resolved
+        against the index, and each wanted member is then read once, in
+        archive order.
+        """
+        members = list(self.members)
+        index = {}
+        for member in members:
+            index.setdefault(normalize(member.name), member)
+
+        wanted = {}
+        missing = []
+        for pattern in patterns:
+            if not pattern.glob:
+                names = [pattern.pattern] if pattern.pattern in index else []
+            else:
+                names = [n for n in index if pattern.match(n) is not None]
+            if len(names) == 0:
+                missing.append(pattern.pattern)
+            for name in names:
+                wanted.setdefault(name, []).append(pattern.match(name))
+
+        for member in members:
+            name = normalize(member.name)
+            if name in wanted:
+                self._extract_to(member, wanted.pop(name))
+        return missing
+
+    def _extract_streaming(self, patterns):
+        """Extracts patterns while reading the archive front to back.
+
+        Plain patterns are looked up in a dict, so only glob patterns are
+        matched against each member name.
+        """
+        exact = {}
+        globs = []
+        for pattern in patterns:
+            if pattern.glob:
+                globs.append(pattern)
+            else:
+                exact.setdefault(pattern.pattern, []).append(pattern)
+
+        seen = set()
+        matched = set()
+        for member in self.members:
+            name = normalize(member.name)
+            if name in seen:
+                continue
+            seen.add(name)
+
+            dests = []
+            for pattern in exact.get(name, []) + globs:
+                dest = pattern.match(name)
+                if dest is not None:
+                    dests.append(dest)
+                    matched.add(pattern)
+            if len(dests) > 0:
+                self._extract_to(member, dests)
+
+        return [p.pattern for p in patterns if p not in matched]
@@ -0,0 +1,151 @@
+"""
+Measures how much each installed plugin adds to vim's startup time.
+
+Vim is started headlessly with `--startuptime`, first with all enabled
+plugins, and then once with each plugin left out in turn.  A plugin is left
+out by adding it to pathogen's g:pathogen_disabled and dropping its block
+from the rendered vimrc, so nothing on disk is changed.  With the native
+backend, vim's own package loading is turned off instead, and the plugins
+that are measured are put on the runtimepath by hand.  The cost of a
+plugin is how much faster vim starts without it.
+
+Copyright (C) 2014 Christian Stigen Larsen
+Distributed under the LGPL v2.1; see LICENSE.txt
+"""
+
+import json
+import os
+import re
+import subprocess
+import tempfile
+
+from vimp.log import verb
+from vimp.util import (VimpError, mkdir, pathname)
+
+# Number of times vim is started for each measurement.
+RUNS = 5
+
+# A plugin whose cost grows by more than this many milliseconds, and this
+# fraction, since the baseline is reported as a regression.
+REGRESSION_MS = 1.0
+REGRESSION_RATIO = 0.10
+
+# A line for a sourced file: clock, self+sourced, self, path
+SOURCED = re.compile(r"^\s*([\d.]+)\s+([\d.]+)\s+([\d.]+):\s+sourcing\s+(.*)$")
+# Any timed line: clock, elapsed or self+sourced, ...
+TIMED = re.compile(r"^\s*([\d.]+)\s+[\d.]+")
+
+class Measurement(object):
+    """Timings from one startup of vim."""
+    def __init__(self, total, sourced):
+        # Milliseconds until vim was ready
+        self.total = total
+        # List of (path, self milliseconds) for each sourced file
+        self.sourced = sourced
+
+    def files(self, prefixes):
+        """Returns (count, self milliseconds) of files below prefixes."""
+        count = 0
+        spent = 0.0
+        for (path, own) in self.sourced:
+            if any(path == p or path.startswith(p + os.sep)
+                   for p in prefixes):
+                count += 1
+                spent += own
+        return (count, spent)
+
+def parse_startuptime(text):
+    """Returns a Measurement for the output of `vim --startuptime`."""
+    total = 0.0
+    sourced = []
+    for line in text.splitlines():
+        match = SOURCED.match(line)
+        if match:
+            sourced.append((match.group(4).strip(), float(match.group(3))))
+        match = TIMED.match(line)
+        if match:
+            total = max(total, float(match.group(1)))
+    return Measurement(total, sourced)
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2 == 1:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+def startvim(vimrc, vim="vim"):
+    """Starts vim headlessly with vimrc and returns a Measurement."""
+    fd, logfile = tempfile.mkstemp(prefix="vimp-bench-", suffix=".log")
+    os.close(fd)
+    try:
+        command = [vim, "-N", "-u", vimrc, "-i", "NONE", "-es",
+                   "--startuptime", logfile, "-c", "qa!"]
+        verb("Running %s" % " ".join(command))
+        with open(os.devnull, "r+b") as null:
+            try:
+                subprocess.call(command, stdin=null, stdout=null,
+                                stderr=null)
+            except OSError as e:
+                raise VimpError("Cannot run %s: %s" % (vim, e))
+        with open(logfile, "rt") as f:
+            return parse_startuptime(f.read())
+    finally:
+        os.unlink(logfile)
+
+def measure(text, runs=RUNS, vim="vim"):
+    """Starts vim runs times with the vimrc text.
+
+    Returns the median total and the Measurement closest to it."""
+    fd, vimrc = tempfile.mkstemp(prefix="vimp-bench-", suffix=".vim")
+    with os.fdopen(fd, "wt") as f:
+        f.write(text)
+    try:
+        results = [startvim(vimrc, vim) for _ in range(runs)]
+    finally:
+        os.unlink(vimrc)
+    total = median([r.total for r in results])
+    closest = min(results, key=lambda r: abs(r.total - total))
+    return (total, closest)
+
+def benchvimrc(vimprc, disabled=(), bundles=None):
+    """Returns a vimrc that loads vimprc with pathogen bundles disabled.
+
+    If bundles is a list of directories, vim's packages are not loaded,
+    and only those directories are added to the runtimepath."""
+    names = ", ".join("'%s'" % name for name in disabled)
+    out = ["set nocompatible\n",
+           "let g:pathogen_disabled = [%s]\n" % names]
+    if bundles is not None:
+        out.append("set packpath=\n")
+        for path in bundles:
+            out.append("set runtimepath^=%s\n" % path.replace(" ", "\\ "))
+            if os.path.isdir(os.path.join(path, "after")):
+                out.append("set runtimepath+=%s/after\n" % (
+                           path.replace(" ", "\\ ")))
+    return "".join(out) + vimprc
+
+def load_baseline(path):
+    """Returns the stored baseline, or None."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rt") as f:
+            return json.load(f)
+    except ValueError:
+        verb("Warning: Ignoring corrupt benchmark baseline %s" % path)
+        return None
+
+def save_baseline(path, results):
+    """Atomically stores results as the baseline."""
+    mkdir(pathname(path))
+    temp = "%s.%d" % (path, os.getpid())
+    with open(temp, "wt") as f:
+        json.dump(results, f, indent=1, sort_keys=True)
+    os.rename(temp, path)
+
+def regressed(cost, before):
+    """Checks if a cost in milliseconds is a regression from before."""
+    if before is None:
+        return False
+    return cost - before > max(REGRESSION_MS, REGRESSION_RATIO * before)
@@ -0,0 +1,227 @@
+"""
+Content-addressed cache of downloaded archives.
+
+Archives are stored under objects/ by their SHA-256 digest, and an index
+maps each URL to the digest of what it last returned, along with the HTTP
+validators (ETag and Last-Modified) needed to check it for changes.
+
+Copyright (C) 2014 Christian Stigen Larsen
+Distributed under the LGPL v2.1; see LICENSE.txt
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from vimp.log import verb
+from vimp.util import (
+    VimpError,
+    joinpath,
+    mkdir,
+    pathname,
+)
+
+# Default maximum size of the cache in bytes.
+MAX_SIZE = 512*1024*1024
+
+# Number of seconds a cached URL is used without asking the server whether
+# it has changed.
+MAX_AGE = 24*60*60
+
+class ChecksumError(VimpError):
+    """A download did not have the expected SHA-256 digest."""
+    pass
+
+def sha256sum(path):
+    """Returns the hex SHA-256 digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(64*1024)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def linkfile(src, dst):
+    """Hardlinks src to dst, or copies it if hardlinking is not possible."""
+    mkdir(pathname(dst))
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+class Cache(object):
+    """An archive cache with LRU eviction."""
+    def __init__(self, path, max_size=None):
+        self.path = path
+        self.max_size = max_size if max_size is not None else MAX_SIZE
+        self._index = None
+        self._lock = threading.RLock()
+
+    @property
+    def indexfile(self):
+        return joinpath(self.path, "index.json")
+
+    def objectpath(self, sha256):
+        """Returns path to the cached object with the given digest."""
+        return joinpath(self.path, "objects", sha256[:2], sha256)
+
+    @property
+    def index(self):
+        with self._lock:
+            if self._index is None:
+                self._index = {"objects": {}, "urls": {}}
+                if os.path.exists(self.indexfile):
+                    try:
+                        with open(self.indexfile, "rt") as f:
+                            self._index = json.load(f)
+                    except ValueError:
+                        verb("Warning: Ignoring corrupt cache index %s" %
+                             self.indexfile)
+                self._index.setdefault("validators", {})
+            return self._index
+
+    def save(self):
+        """Atomically writes the index to disk."""
+        with self._lock:
+            mkdir(self.path)
+            # A unique name, since other Cache objects or processes may be
+            # saving the same index
+            fd, temp = tempfile.mkstemp(prefix="index.json.", dir=self.path)
+            try:
+                with os.fdopen(fd, "wt") as f:
+                    json.dump(self.index, f, indent=1, sort_keys=True)
+                os.rename(temp, self.indexfile)
+            except BaseException:
+                os.unlink(temp)
+                raise
+
+    def lookup(self, url, sha256=None):
+        """Returns path to cached archive for url/digest, or None."""
+        with self._lock:
+            if sha256 is None:
+                sha256 = self.index["urls"].get(url)
+            if sha256 is None or sha256 not in self.index["objects"]:
+                verb("Cache miss for %s" % url)
+                return None
+
+            path = self.objectpath(sha256)
+            if not os.path.exists(path):
+                verb("Cache object %s has disappeared" % sha256)
+                self._forget(sha256)
+                self.save()
+                return None
+
+            verb("Cache hit for %s" % url)
+            self.index["objects"][sha256]["atime"] = time.time()
+            self.index["urls"][url] = sha256
+            self.save()
+            return path
+
+    def digest(self, url):
+        """Returns the digest of what url last returned, or None."""
+        with self._lock:
+            return self.index["urls"].get(url)
+
+    def validators(self, url):
+        """Returns dict with the HTTP validators stored for url."""
+        with self._lock:
+            return dict(self.index["validators"].get(url, {}))
+
+    def isfresh(self, url):
+        """Checks if url was downloaded or revalidated within MAX_AGE."""
+        checked = self.validators(url).get("checked", 0)
+        return time.time() - checked < MAX_AGE
+
+    def revalidated(self, url):
+        """Records that the server says the cached url is unchanged."""
+        with self._lock:
+            entry = self.index["validators"].setdefault(url, {})
+            entry["checked"] = time.time()
+            self.save()
+
+    def store(self, url, filename, sha256=None, validators=None):
+        """Adds a downloaded file to the cache and returns its digest.
+
+        Raises ChecksumError if sha256 is given and does not match.  The
+        validators dict holds the "etag" and "last_modified" headers
+        returned by the server, if any.
+        """
+        digest = sha256sum(filename)
+        if sha256 is not None and digest != sha256.lower():
+            raise ChecksumError("Checksum mismatch for %s: expected %s, got %s"
+                                % (url, sha256, digest))
+
+        with self._lock:
+            path = self.objectpath(digest)
+            if not os.path.exists(path):
+                verb("Caching %s as %s" % (url, digest))
+                linkfile(filename, path)
+            self.index["objects"][digest] = {
+                "size": os.path.getsize(path),
+                "atime": time.time(),
+            }
+            self.index["urls"][url] = digest
+            entry = {"checked": time.time()}
+            entry.update(validators or {})
+            self.index["validators"][url] = entry
+            self.prune()
+            self.save()
+        return digest
+
+    def _forget(self, sha256):
+        self.index["objects"].pop(sha256, None)
+        for url, digest in list(self.index["urls"].items()):
+            if digest == sha256:
+                del self.index["urls"][url]
+                self.index["validators"].pop(url, None)
+
+    def stats(self):
+        """Returns (number of archives, total size in bytes)."""
+        with self._lock:
+            objects = self.index["objects"].values()
+            return (len(objects), sum(o["size"] for o in objects))
+
+    def prune(self, max_size=None):
+        """Evicts least recently used archives until the cache fits.
+
+        Returns (number of archives, bytes) removed."""
+        if max_size is None:
+            max_size = self.max_size
+
+        with self._lock:
+            _, total = self.stats()
+            objects = self.index["objects"]
+            removed, freed = 0, 0
+            for sha256 in sorted(objects, key=lambda s: objects[s]["atime"]):
+                if total <= max_size:
+                    break
+                size = objects[sha256]["size"]
+                verb("Evicting %s (%d bytes) from cache" % (sha256, size))
+                path = self.objectpath(sha256)
+                if os.path.exists(path):
+                    os.unlink(path)
+                self._forget(sha256)
+                total -= size
+                freed += size
+                removed += 1
+            if removed > 0:
+                self.save()
+            return (removed, freed)
+
+    def remove(self, digests):
+        """Removes the archives with the given digests from the cache."""
+        with self._lock:
+            for sha256 in digests:
+                verb("Removing %s from cache" % sha256)
+                path = self.objectpath(sha256)
+                if os.path.exists(path):
+                    os.unlink(path)
+                self._forget(sha256)
+            if len(digests) > 0:
+                self.save()
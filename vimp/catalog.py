@@ -0,0 +1,316 @@
+"""
+Compiled catalog of available vim scripts.
+
+Instead of importing the large SCRIPTS dict from vimp.scripts on every run,
+vimp compiles it once into a compact binary file that is memory-mapped on
+startup.  Names, aliases, keywords and dependencies are read directly from
+the mapping, and a script's full recipe is only unpickled when asked for.
+After `vimp update`, the catalog is compiled from the list of scripts
+fetched from the catalog feed instead, unless the feed is older than the
+installed vimp.scripts.
+
+The file layout is (all integers are little-endian uint32):
+
+    header   MAGIC, then stamp length, entry count, alias count, and the
+             offsets of the entry table, alias table, string pool and
+             recipe blobs
+    stamp    identifies the source the catalog was compiled from
+    entries  per script, sorted by name: (offset, length) of its name,
+             short name, keywords and deps in the string pool, and of its
+             pickled recipe in the blob section
+    aliases  per alias, sorted: (offset, length) of the alias in the
+             string pool, and the index of the entry it refers to
+    strings  UTF-8 strings; keyword and dependency lists are NUL-separated
+    blobs    pickled recipes
+
+Copyright (C) 2014 Christian Stigen Larsen
+Distributed under the LGPL v2.1; see LICENSE.txt
+"""
+
+import mmap
+import os
+import struct
+import sys
+
+from vimp.log import verb
+from vimp.util import (VimpError, mkdir, pathname)
+
+MAGIC = b"VIMPCAT\x01"
+HEADER = struct.Struct("<8s7I")
+ENTRY = struct.Struct("<10I")
+ALIAS = struct.Struct("<3I")
+
+class CatalogError(VimpError):
+    """The compiled catalog is missing or damaged."""
+    pass
+
+def source_stamp():
+    """Returns a string identifying the vimp.scripts source file, or None.
+
+    The stamp changes whenever scripts.py is edited, without having to
+    import it.  It also includes the Python version, since recipes are
+    stored with pickle."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        "scripts.py")
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return "py%d:%d:%d" % (sys.version_info[0], int(st.st_mtime), st.st_size)
+
+def compile_catalog(path, version, aliases, scripts, stamp):
+    """Writes a compiled catalog of scripts to path."""
+    import pickle
+
+    strings = bytearray()
+    blobs = bytearray()
+
+    def string(s):
+        data = s.encode("utf-8") if not isinstance(s, bytes) else s
+        offset = len(strings)
+        strings.extend(data)
+        return (offset, len(data))
+
+    def blob(recipe):
+        data = pickle.dumps(recipe, protocol=2)
+        offset = len(blobs)
+        blobs.extend(data)
+        return (offset, len(data))
+
+    names = sorted(scripts)
+    shortnames = {}
+    for alias in sorted(aliases):
+        shortnames.setdefault(aliases[alias], alias)
+
+    entries = bytearray()
+    for name in names:
+        s = scripts[name]
+        fields = (string(name) +
+                  string(shortnames.get(name, name)) +
+                  string("\0".join(s.get("keywords", []))) +
+                  string("\0".join(s.get("deps", []))) +
+                  blob(s))
+        entries.extend(ENTRY.pack(*fields))
+
+    position = dict((name, i) for (i, name) in enumerate(names))
+    table = bytearray()
+    count = 0
+    for alias in sorted(aliases):
+        if aliases[alias] in position:
+            table.extend(ALIAS.pack(*(string(alias) +
+                                      (position[aliases[alias]],))))
+            count += 1
+
+    stamp = ("%s\0%s" % (stamp, version)).encode("utf-8")
+    entries_at = HEADER.size + len(stamp)
+    aliases_at = entries_at + len(entries)
+    strings_at = aliases_at + len(table)
+    blobs_at = strings_at + len(strings)
+
+    mkdir(pathname(path))
+    temp = "%s.%d" % (path, os.getpid())
+    with open(temp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(stamp), len(names), count, entries_at,
+                            aliases_at, strings_at, blobs_at))
+        f.write(stamp)
+        f.write(entries)
+        f.write(table)
+        f.write(strings)
+        f.write(blobs)
+    os.rename(temp, path)
+
+class Catalog(object):
+    """Read-only view of a compiled catalog file."""
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, OSError, ValueError) as e:
+            raise CatalogError("Cannot open catalog %s: %s" % (path, e))
+
+        if len(self._map) < HEADER.size:
+            raise CatalogError("Catalog %s is truncated" % path)
+        (magic, stamplen, self._count, self._acount, self._entries,
+         self._aliases, self._strings, self._blobs) = \
+            HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise CatalogError("Catalog %s has the wrong format" % path)
+
+        stamp = self._map[HEADER.size:HEADER.size+stamplen].decode("utf-8")
+        self.stamp, self.version = stamp.split("\0")
+        self._recipes = {}
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        self._map.close()
+
+    def _string(self, offset, length):
+        start = self._strings + offset
+        return self._map[start:start+length].decode("utf-8")
+
+    def _entry(self, index):
+        return ENTRY.unpack_from(self._map, self._entries + index*ENTRY.size)
+
+    def _name(self, index):
+        return self._string(*self._entry(index)[0:2])
+
+    def _find(self, name):
+        """Returns index of entry with given full name, or None."""
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._name(mid) < name:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count and self._name(lo) == name:
+            return lo
+        return None
+
+    def _alias(self, alias):
+        """Returns index of entry an alias refers to, or None."""
+        lo, hi = 0, self._acount
+        while lo < hi:
+            mid = (lo + hi) // 2
+            fields = ALIAS.unpack_from(self._map,
+                                       self._aliases + mid*ALIAS.size)
+            if self._string(*fields[0:2]) < alias:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._acount:
+            fields = ALIAS.unpack_from(self._map,
+                                       self._aliases + lo*ALIAS.size)
+            if self._string(*fields[0:2]) == alias:
+                return fields[2]
+        return None
+
+    def _lookup(self, name):
+        index = self._alias(name)
+        return index if index is not None else self._find(name)
+
+    def __contains__(self, name):
+        return self._lookup(name) is not None
+
+    def names(self):
+        """Returns sorted list of full script names."""
+        return [self._name(i) for i in range(self._count)]
+
+    def aliases(self):
+        """Returns dict of alias to full script name."""
+        out = {}
+        for i in range(self._acount):
+            fields = ALIAS.unpack_from(self._map, self._aliases + i*ALIAS.size)
+            out[self._string(*fields[0:2])] = self._name(fields[2])
+        return out
+
+    def full_name(self, name):
+        """Returns full name for an alias or full name, or name if unknown."""
+        index = self._alias(name)
+        return self._name(index) if index is not None else name
+
+    def short_name(self, name):
+        """Returns the (first) alias of a full name, or name if it has none."""
+        index = self._find(name)
+        if index is None:
+            return name
+        return self._string(*self._entry(index)[2:4])
+
+    def _list(self, name, field):
+        index = self._lookup(name)
+        if index is None:
+            return []
+        text = self._string(*self._entry(index)[field:field+2])
+        return text.split("\0") if len(text) > 0 else []
+
+    def keywords(self, name):
+        """Returns keywords of a script without loading its recipe."""
+        return self._list(name, 4)
+
+    def deps(self, name):
+        """Returns dependencies of a script without loading its recipe."""
+        return self._list(name, 6)
+
+    def get(self, name):
+        """Returns the recipe of a script, or None if it is unknown."""
+        index = self._lookup(name)
+        if index is None:
+            return None
+        if index not in self._recipes:
+            # Only commands that need a recipe pay for importing pickle
+            import pickle
+            offset, length = self._entry(index)[8:10]
+            start = self._blobs + offset
+            self._recipes[index] = pickle.loads(self._map[start:start+length])
+        return self._recipes[index]
+
+def feed_stamp(path):
+    """Returns a string identifying a catalog fetched from a feed, or
+    None if there is none."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return "py%d:feed:%.6f:%d" % (sys.version_info[0], st.st_mtime,
+                                  st.st_size)
+
+def feed_outdated(data):
+    """Checks if a catalog fetched from a feed was published from an older
+    release of vimp.scripts than the one installed."""
+    from vimp.state import versionkey
+
+    if data.get("release") is None:
+        return False
+    from vimp.scripts import __version__
+    return versionkey("vimp-%s" % data["release"]) < \
+           versionkey("vimp-%s" % __version__)
+
+def load_catalog(path, feed=None):
+    """Opens the compiled catalog at path, compiling it first if needed.
+
+    If feed is the path of a catalog fetched by `vimp update`, and it
+    exists, it is compiled instead of vimp.scripts, unless it was published
+    from an older release of vimp.scripts.  That way, a feed that has not
+    been updated since vimp was upgraded does not hide the newer scripts."""
+    stamp = source_stamp()
+    if stamp is None:
+        # Installed without sources, e.g. from a zip file
+        from vimp.scripts import __version__
+        stamp = "py%d:%s" % (sys.version_info[0], __version__)
+
+    # Which of them is newer is only decided again when either changes
+    fed = feed_stamp(feed) if feed is not None else None
+    if fed is not None:
+        stamp = "%s;%s" % (fed, stamp)
+
+    catalog = _open_current(path, stamp)
+    if catalog is None:
+        data = None
+        if fed is not None:
+            from vimp.feed import read_json
+            data = read_json(feed)
+            if feed_outdated(data):
+                verb("Ignoring %s, since vimp.scripts is newer" % feed)
+                data = None
+        if data is not None:
+            compile_catalog(path, str(data["version"]), data["aliases"],
+                            data["scripts"], stamp)
+        else:
+            from vimp.scripts import (ALIASES, SCRIPTS, __version__)
+            compile_catalog(path, __version__, ALIASES, SCRIPTS, stamp)
+        catalog = Catalog(path)
+    return catalog
+
+def _open_current(path, stamp):
+    """Returns the catalog at path if it was compiled from stamp."""
+    try:
+        catalog = Catalog(path)
+        if catalog.stamp == stamp:
+            return catalog
+        catalog.close()
+    except CatalogError:
+        pass
+    return None
@@ -9,23 +9,31 @@ import sys
 
 from vimp import (__author__, __license__, __version__)
 from vimp.install import (
-    download_parallel,
+    BACKENDS,
     expandvars,
     get_full_name,
+    getbackend,
+    getcache,
+    getcatalog,
     get_script,
     get_short_name,
     getpath,
-    install_script,
+    getstate,
     isinstalled,
+    packable,
+    reconcile,
+    render_vimprc,
+    update_vimprc,
 )
 from vimp.util import (
+    formatsize,
     joinpath,
+    parsesize,
     readlink,
     unlink,
     unlinktree,
 )
 from vimp.log import verb
-from vimp.scripts import SCRIPTS
 
 def lookup_function(name):
     """
@@ -45,7 +53,8 @@ def print_help(name=None):
     """
     if name is None:
         print("%s %s by %s" % ("vimp", __version__, __author__))
-        print("Usage: vimp [-v] command [ argument(s) ]")
+        print("Usage: vimp [-v] [-j N] [--profile-startup] command "
+              "[ argument(s) ]")
         print("")
         print("vimp is a simple package manager for vim that downloads all")
         print("dependencies and enables them in vim for you.  It relies on")
@@ -61,6 +70,7 @@ def print_help(name=None):
         print("vimp disable fuzzyfinder # disable but do not delete")
         print("vimp help install # show help for install")
         print("vimp get -v ctrlp # install ctrlp and show all actions")
+        print("vimp -j 16 get ctrlp nerdtree # use 16 parallel downloads")
         print("")
         print("It works by creating symlinks from ~/.vim/bundle/ to")
         print("~/.vimp/install and adds a command in ~/.vimrc that")
@@ -100,71 +110,197 @@ def print_version():
     print("Written by %s" % __author__)
     print(__license__)
 
-def garbage_collect():
-    # TODO: Remove files in installed/ that do not have symlinks from vim
-    # TODO: Delete cache dir
-    # TODO: If script A requires B and C and you uninstall A, then we should
-    # also remove B and C if no other installed scripts require them.
-    # (Only exception is if you actually WANT to install B).
-    # Solution: A refcount somewhere _could_ work, but is prone to getting
-    # out of sync.  Perhaps a flag may be enough (i.e., refcount from 0 to
-    # 1).
-    raise NotImplementedError()
+def gc(*args):
+    """
+    Removes packages and files that nothing needs any more.
 
-def install(*names):
-  """
-  Installs vim script with given name.
-  """
-  # For many items, download everything in parallel
-  urls = set()
+    vimp gc      deletes them
+    vimp gc -n   only lists them
 
-  def add(n):
-    s = get_script(n)
-    if "download" not in s:
-      return
-    url, arch = s["download"]
-    arch = joinpath(getpath("download", n), expandvars(n, arch))
-    urls.update([(n, url, arch)])
+    Packages you installed are kept, enabled or not, along with everything
+    they depend on.  Other installed packages, like dependencies of removed
+    packages, are deleted, and so are unused cached archives, git
+    repositories and leftovers of interrupted installs.  What installs still
+    running in other vimp processes are using is left alone.  Files are
+    deleted in parallel.
+    """
+    from vimp.gc import (collect, plan, reclaimable)
+    from vimp.objects import ObjectStore
+
+    dry_run = "-n" in args
+    state = getstate()
+    c = getcache()
+    store = ObjectStore(getpath("objects"))
+    packages, paths, objects = plan(state, getcatalog(), c, getbackend())
+    unused = store.unused()
+    size = reclaimable(paths + [c.objectpath(o) for o in objects] + unused,
+                       store.inodes())
+
+    for full in packages:
+        entry = state.get(full)
+        print("%s %s" % ("Would remove" if dry_run else "Removing", full) +
+              ("" if entry["enabled"] else " (disabled)"))
+    owned = set(getpath("install", full) for full in packages)
+    for path in [p for p in paths if p not in owned]:
+        print("%s %s" % ("Would delete" if dry_run else "Deleting", path))
+    if len(objects) > 0:
+        print("%s %d unused cached archives" % (
+              "Would delete" if dry_run else "Deleting", len(objects)))
+    if len(unused) > 0:
+        print("%s %d unused objects" % (
+              "Would delete" if dry_run else "Deleting", len(unused)))
+
+    if len(packages) + len(paths) + len(objects) + len(unused) == 0:
+        print("Nothing to collect")
+        return
+    if dry_run:
+        print("Would free %s" % formatsize(size))
+        return
 
-  # Add pathogen dependency
-  if not isinstalled("pathogen") and "pathogen" not in names:
-    names = ("pathogen",) + names
+    failed = collect(state, c, packages, paths, objects)
+    for path in sorted(failed):
+        print("Error: Could not delete %s: %s" % (path, failed[path]))
+    if len(failed) > 0:
+        sys.exit(1)
+    print("Freed %s" % formatsize(size))
 
-  for n in names:
-    s = get_script(n)
-    if "deps" in s:
-      for dep in s["deps"]:
-        add(dep)
-    add(n)
+def bench(*args):
+    """
+    Measures how much each installed plugin adds to vim's startup time.
 
-  download_parallel(list(urls))
-  install_rest(*names)
+    vimp bench [-n RUNS] [--save]
 
-def install_rest(name=None, *rest):
+    Starts vim headlessly with --startuptime, with all enabled plugins and
+    then without each of them in turn, RUNS times each (default 5), and
+    reports the median cost of each plugin and how many files it sources.
+    Costs are compared with the baseline in ~/.vimp/bench.json, and use
+    --save to store the results as the new baseline.  In packed mode,
+    plugins are measured as ordinary bundles.
     """
-    Installs vim script with given name.
-    """
-    if name is None:
-        return
+    from vimp.bench import (
+        RUNS,
+        benchvimrc,
+        load_baseline,
+        measure,
+        regressed,
+        save_baseline,
+    )
+
+    runs = RUNS
+    save = False
+    args = list(args)
+    while len(args) > 0:
+        arg = args.pop(0)
+        if arg == "--save":
+            save = True
+        elif arg == "-n" and len(args) > 0 and args[0].isdigit():
+            runs = max(1, int(args.pop(0)))
+        else:
+            print("Unknown bench flag: %s" % arg)
+            sys.exit(1)
 
-    if not isinstalled(name):
-        script = get_script(name)
-        deps = script["deps"] if "deps" in script else []
+    state = getstate()
+    installed = state.installed()
+    if len(installed) == 0:
+        print("You have not installed any scripts.")
+        return
 
-        # We don't *have* to install dependencies first. So we'll install
-        # the plugin in question here. This should also work in the case
-        # someone creates circular dependencies.
-        install_script(name, script)
+    print("Starting vim %d times with and without each of %d plugins" % (
+      runs, len(installed)))
+    # With the native backend, the plugins to load are listed explicitly
+    bundles = None
+    if getbackend() == "native":
+        bundles = dict(packable(state))
+
+    def loaded(exclude):
+        if bundles is None:
+            return None
+        return [d for (f, d) in sorted(bundles.items()) if f != exclude]
+
+    total, measured = measure(benchvimrc(render_vimprc(state, packed=False),
+                                         bundles=loaded(None)), runs)
+    results = {"total": total, "runs": runs, "plugins": {}}
+    for full in installed:
+        if full.startswith("pathogen"):
+            # Every other plugin is loaded by pathogen
+            continue
+        entry = state.get(full)
+        text = benchvimrc(render_vimprc(state, exclude=[full], packed=False),
+                          [entry["name"]], loaded(full))
+        without, _ = measure(text, runs)
+        prefixes = [dst for (_, dst) in entry["symlinks"]]
+        prefixes.append(getpath("install", full))
+        count, sourced = measured.files(prefixes)
+        results["plugins"][full] = {
+            "cost": total - without,
+            "files": count,
+            "sourced": sourced,
+        }
+
+    baseline = load_baseline(getpath("bench"))
+    before = baseline["plugins"] if baseline is not None else {}
+    print("Startup time %.1f ms%s" % (total, " (baseline %.1f ms)" % (
+      baseline["total"]) if baseline is not None else ""))
+    print("%9s %9s %6s  %s" % ("cost ms", "self ms", "files", "plugin"))
+    plugins = results["plugins"]
+    regressions = 0
+    for full in sorted(plugins, key=lambda f: -plugins[f]["cost"]):
+        p = plugins[full]
+        old = before.get(full, {}).get("cost")
+        note = ""
+        if regressed(p["cost"], old):
+            note = "  REGRESSION, was %.1f ms" % old
+            regressions += 1
+        elif old is not None:
+            note = "  (was %.1f ms)" % old
+        print("%9.1f %9.1f %6d  %s%s" % (p["cost"], p["sourced"], p["files"],
+                                          full, note))
+
+    if save:
+        save_baseline(getpath("bench"), results)
+        print("Saved baseline to %s" % getpath("bench"))
+    elif regressions > 0:
+        print("%d plugins are slower than the baseline" % regressions)
+
+def cache(action="stats", *args):
+    """
+    Manages the cache of downloaded archives in ~/.vimp/cache.
 
-        # Now install dependencies recursively
-        if len(deps) > 0:
-          print("%s depends on %s" % (name, " ".join(deps)))
-          install_rest(*deps)
+    vimp cache stats         shows the number and size of cached archives
+    vimp cache prune [SIZE]  evicts least recently used archives until the
+                             cache is smaller than SIZE, e.g. 100M (default
+                             is the cache size limit, 0 empties the cache)
+    """
+    c = getcache()
+    if action == "stats":
+        count, size = c.stats()
+        print("%d cached archives using %s (limit %s)" % (
+          count, formatsize(size), formatsize(c.max_size)))
+        print("Cache directory: %s" % c.path)
+    elif action == "prune":
+        limit = parsesize(args[0]) if len(args) > 0 else None
+        count, size = c.prune(limit)
+        print("Removed %d archives, freed %s" % (count, formatsize(size)))
     else:
-        print("%s is already installed" % name)
+        print("Unknown cache action: %s" % action)
+        sys.exit(1)
 
-    # Continue installing any remaining plugins
-    install_rest(*rest)
+def install(*names):
+  """
+  Installs vim script with given name.
+
+  Packages and their dependencies are downloaded in parallel, and each is
+  installed as soon as its download and dependencies are ready.
+  """
+  from vimp.pipeline import install_all
+
+  # Add pathogen dependency, unless vim loads the packages itself
+  if getbackend() == "pathogen" and not isinstalled("pathogen") and \
+          "pathogen" not in names:
+    names = ("pathogen",) + names
+
+  if len(install_all(names)) > 0:
+    sys.exit(1)
 
 
 def disable(name, *rest, **kw):
@@ -187,6 +323,7 @@ def disable(name, *rest, **kw):
         if readlink(dst) != None:
             verb("Removing symlink %s" % dst)
             unlink(dst)
+    getstate().set_enabled(get_full_name(name), False)
 
 def remove(name, *rest):
     """
@@ -199,16 +336,104 @@ def remove(name, *rest):
     print("Removing %s" % full)
     unlinktree(getpath("install"), full)
     unlinktree(getpath("download"), full)
+    getstate().remove(full)
 
     if len(rest) > 0:
       remove(*rest)
 
 
+def lazy(*names):
+    """
+    Loads packages on first use instead of when vim starts.
+
+    vimp lazy <package(s)>     loads packages when one of their commands
+                               is run, or their file types are opened
+    vimp lazy -d <package(s)>  loads packages when vim starts again
+    vimp lazy                  lists packages that can be loaded lazily
+
+    Only packages whose recipe lists such triggers can be loaded lazily.
+    """
+    from vimp.lazy import triggers
+
+    state = getstate()
+    names = list(names)
+    flag = True
+    if len(names) > 0 and names[0] == "-d":
+        flag = False
+        names = names[1:]
+
+    if len(names) == 0:
+        for full in getcatalog().names():
+            if triggers(get_script(full)) is not None:
+                entry = state.get(full)
+                print("%s%s" % (full, " (lazy)" if entry is not None and
+                                entry.get("lazy") else ""))
+        return
+
+    for name in names:
+        full = get_full_name(name)
+        if triggers(get_script(full)) is None:
+            print("%s cannot be loaded lazily" % name)
+            sys.exit(1)
+        if state.get(full) is None:
+            print("Script %s is not installed" % name)
+            sys.exit(1)
+        print("%s %s" % ("Lazy loading" if flag else "Eagerly loading", name))
+        state.set_lazy(full, flag)
+
+def backend(name=None):
+    """
+    Shows or sets how packages are loaded into vim on this machine.
+
+    vimp backend pathogen  links packages into ~/.vim/bundle for pathogen
+    vimp backend native    links them into ~/.vim/pack/vimp, where vim 8
+                           loads them itself, from start/, or with
+                           :packadd from opt/ if they are loaded lazily
+
+    The native backend does not need pathogen, and saves it from running
+    at every vim start.  Installed packages are moved when it is changed.
+    """
+    state = getstate()
+    if name is None:
+        print(getbackend())
+        return
+    if name not in BACKENDS:
+        print("Unknown backend %s, use one of: %s" % (name,
+              ", ".join(BACKENDS)))
+        sys.exit(1)
+    state.set_option("backend", name)
+    print("Using the %s backend" % name)
+    if name == "pathogen" and not isinstalled("pathogen"):
+        print("Install pathogen with `vimp install pathogen`")
+
+def pack(*args):
+    """
+    Merges the enabled plugins into a single runtimepath entry.
+
+    vimp pack     turns on packed mode
+    vimp pack -d  turns it off again
+
+    In packed mode, vimp links the runtime files of the enabled plugins
+    into ~/.vimp/packed, which pathogen loads as one bundle, so that vim
+    has fewer directories to search.  The tree is updated whenever plugins
+    are installed, enabled or disabled.  Plugins that have files with the
+    same path, and plugins loaded lazily, are left as ordinary bundles.
+    """
+    flag = "-d" not in args
+    state = getstate()
+    if state.get_option("packed", False) == flag:
+        # Nothing changes, but bring the packed tree up to date anyway
+        update_vimprc(force=True)
+    else:
+        state.set_option("packed", flag)
+    print("Packed mode is %s" % ("on" if flag else "off"))
+
 def list_all(FLAG_L):
   """Lists all known scripts."""
-  width = max(map(len, SCRIPTS.keys()))
+  names = getcatalog().names()
+  width = max(map(len, names))
   print("All available plugins")
-  for name in sorted(SCRIPTS.keys()):
+  for name in names:
     s = get_script(name)
     if FLAG_L:
       print("%-*s %s" % (width, get_full_name(name),
@@ -260,7 +485,7 @@ def list_installed(*args):
       return
 
     # List installed scripts
-    installed = [n for n in SCRIPTS if isinstalled(n)]
+    installed = getstate().installed()
     if len(installed) == 0:
       print("You have not installed any scripts.")
       print("You can view all available scripts with `vimp ls -a`")
@@ -274,78 +499,259 @@ def list_installed(*args):
         else:
             print("%s" % get_short_name(n))
 
-def update():
+def fsck(*args):
     """
-    Update list of vim scripts from the net.
+    Checks the installed-state database against the filesystem.
+
+    vimp keeps a record of installed packages in ~/.vimp/state, so that it
+    does not have to inspect the filesystem every time.  This command
+    inspects it anyway and fixes any differences, and regenerates
+    ~/.vimp/vimrc.  Use -n to only report them.
+    """
+    dry_run = "-n" in args
+    changes = reconcile(getstate(), dry_run)
+    if not dry_run:
+        update_vimprc(force=True)
+    for (full, change) in changes:
+        print("%s: %s" % (full, change))
+    if len(changes) == 0:
+        print("Installed-state database is consistent")
+    elif not dry_run:
+        print("Fixed %d problems" % len(changes))
+
+def helptags(*names):
     """
-    raise NotImplementedError()
+    Regenerates the help tags of installed packages (default all).
 
-def upgrade(name=None):
+    vimp writes doc/tags for each package when it is installed, so that vim
+    does not have to at startup.  This rebuilds them in parallel, e.g. for
+    packages installed by older versions of vimp.
     """
-    Upgrades vim scripts.
+    from vimp.helptags import helptags_all
+
+    if len(names) == 0:
+        names = getstate().installed(enabled=False)
+    docdirs = dict((joinpath(getpath("install", name), "doc"), name)
+                   for name in names)
+    failed = helptags_all(docdirs.keys())
+    for docdir in sorted(failed):
+        print("%s: %s" % (docdirs[docdir], failed[docdir]))
+    if len(failed) > 0:
+        sys.exit(1)
+
+def dedup(*args):
     """
-    raise NotImplementedError()
+    Shares identical files between installed packages.
 
+    vimp dedup         hardlinks the files of all installed packages to the
+                       object store in ~/.vimp/objects
+    vimp dedup stats   shows the size of the object store and what it saves
 
-def search(name=None, *rest):
+    Packages are added to the store when they are installed, so this is only
+    needed for packages installed by older versions of vimp.
     """
-    Search for vim scripts and suggested matches.
+    from vimp.objects import ObjectStore
+    from vimp.pool import WorkerPool
+
+    store = ObjectStore(getpath("objects"))
+    if "stats" not in args:
+        names = getstate().installed(enabled=False)
+        with WorkerPool() as pool:
+            tasks = [pool.submit(store.dedup, (getpath("install", name),))
+                     for name in names]
+            pool.join()
+        failed = [(name, t.error) for (name, t) in zip(names, tasks)
+                  if t.error is not None]
+        for (name, error) in failed:
+            print("%s: %s" % (name, error))
+        done = [t.result for t in tasks if t.error is None]
+        print("Shared %d files, freed %s" % (sum(r[0] for r in done),
+              formatsize(sum(r[1] for r in done))))
+        if len(failed) > 0:
+            sys.exit(1)
+
+    count, size, saved = store.stats()
+    print("%d objects using %s, saving %s" % (count, formatsize(size),
+          formatsize(saved)))
+
+def lock(filename="vimp.lock"):
     """
-    def phonetically_similar(candidate, fuzz):
-      # This is an old heuristic that actually performs quite well: Remove
-      # all vowels and compare.  Means that "powrlaine" will match
-      # "powerline". Furthermore, remove double letters, and translate
-      # some consonants such as C to K, etc.
+    Writes the installed packages to a lockfile (default vimp.lock).
 
-      def no_vowels(s):
-        """Removes all vowels in string."""
-        return "".join(c for c in s if c not in "aeiouy")
+    The lockfile records the full name of each enabled package, where it
+    was downloaded from and the SHA-256 digest of the download, so that
+    `vimp sync` can install exactly the same packages on another machine.
+    """
+    from vimp.lock import (lock_entries, write_lock)
+
+    packages = lock_entries(getstate(), getcatalog(), getcache())
+    for full in sorted(packages):
+        entry = packages[full]
+        if entry["url"] is not None and entry["sha256"] is None and \
+                entry.get("commit") is None:
+            print("Warning: No digest known for %s, it will not be verified"
+                  % full)
+    write_lock(filename, packages)
+    print("Locked %d packages in %s" % (len(packages), filename))
+
+def sync(filename):
+    """
+    Installs and removes packages to match a lockfile.
 
-      def no_repeats(s):
-        """Removes repeated characters in string."""
-        if len(s) <= 1:
-            return s
-        else:
-            return s[0] + "".join(s[n] if s[n]!=s[n-1] else ""
-                                  for n in xrange(1,len(s)))
+    Packages that are not in the lockfile are removed, and missing ones are
+    downloaded from the locked URLs and verified against the locked
+    digests.  Packages installed from another download or git commit than
+    the locked one are installed again, and lazy loading is set as locked.
+    Nothing is done if the installed packages already match.
+    """
+    from vimp.lock import (compare, lock_entries, read_lock)
+
+    packages = read_lock(filename)
+    state = getstate()
+    current = lock_entries(state, getcatalog(), getcache())
+    extra = [f for f in state.installed(enabled=False) if f not in packages]
+    changed, lazy = compare(current, packages)
+    missing = sorted(set(f for f in packages if f not in current) |
+                     set(changed))
+    if len(extra) == 0 and len(missing) == 0 and len(lazy) == 0:
+        print("Installed packages match %s" % filename)
+        return
+
+    from vimp.pipeline import install_all
+
+    failed = {}
+    with state.batch():
+        for full in sorted(extra):
+            remove(full)
+        for full in changed:
+            print("%s differs from %s" % (full, filename))
+            remove(full)
+
+        if len(missing) > 0:
+            names = [get_short_name(f) for f in missing]
+            pins = dict((get_short_name(f), packages[f]) for f in missing)
+            requested = [get_short_name(f) for f in missing
+                         if packages[f].get("requested")]
+            failed = install_all(names, pins=pins, requested=requested)
+
+        for full in sorted(packages):
+            flag = packages[full].get("lazy", False)
+            entry = state.get(full)
+            if entry is not None and entry.get("lazy", False) != flag:
+                print("%s %s" % ("Lazy loading" if flag else
+                                 "Eagerly loading", full))
+                state.set_lazy(full, flag)
+
+    if len(failed) > 0:
+        sys.exit(1)
+
+def update(*args):
+    """
+    Updates the list of available scripts from a catalog feed.
+
+    vimp update             fetches what changed since the last update
+    vimp update --url URL   sets the feed to use on this machine, and
+                            updates from it
 
-      def simplify(s):
-        """Change q->k, w->v, z->s etc. to simplify comparison."""
-        tr = {"q":"k", "w":"v", "z":"s", "c":"k"}
-        return "".join(tr[c] if c in tr else c for c in s)
+    Only the changes since the version you have are downloaded, and each
+    file is checked against the SHA-256 digests in the feed's index.  If
+    the feed was published from an older release of vimp than the one
+    installed, the scripts that came with vimp are used until it catches up.
+    """
+    from vimp.catalog import feed_outdated
+    from vimp.feed import (Feed, load_local, write_json)
+
+    args = list(args)
+    state = getstate()
+    if len(args) == 2 and args[0] == "--url":
+        state.set_option("feed", args.pop())
+        args.pop()
+    if len(args) > 0:
+        print("Unknown update flag: %s" % args[0])
+        sys.exit(1)
+
+    url = state.get_option("feed")
+    if url is None:
+        print("No catalog feed is set, use `vimp update --url <url>`")
+        sys.exit(1)
+
+    path = joinpath(getpath("list"), "feed.json")
+    local = load_local(path)
+    feed = Feed(url, getpath("download"))
+    catalog, incremental = feed.update(local)
+    if local is not None and catalog["version"] == local["version"]:
+        print("Catalog is up to date (version %d)" % local["version"])
+    else:
+        write_json(path, catalog)
+        print("Updated catalog %sto version %d, using %s (%s)" % (
+              "from version %d " % local["version"] if local is not None
+              else "", catalog["version"],
+              "deltas" if incremental else "the whole catalog",
+              formatsize(feed.received)))
+    if feed_outdated(catalog):
+        print("Warning: The feed has the scripts of vimp %s, so the newer "
+              "ones installed with vimp are used instead" % catalog["release"])
+
+def upgrade(*names):
+    """
+    Upgrades installed packages to the newest versions in the catalog.
+
+    vimp upgrade                upgrades all enabled packages
+    vimp upgrade <package(s)>   upgrades only the given packages
+    vimp upgrade -n             lists what would be upgraded
+
+    The new versions are downloaded in parallel.  Files that have not
+    changed are reused from the installed versions, and each package's
+    symlinks are swapped over atomically.
+    """
+    from vimp.upgrade import (missing_deps, plan, upgrade_all)
+    from vimp.pipeline import install_all
+
+    names = list(names)
+    dry_run = "-n" in names
+    if dry_run:
+        names.remove("-n")
+
+    state = getstate()
+    upgrades = plan(state, getcatalog(), names if len(names) > 0 else None)
+    if len(upgrades) == 0:
+        print("All packages are up to date")
+        return
+    for (old, new) in upgrades:
+        print("%s -> %s" % (old, new))
+    if dry_run:
+        return
 
-      def phonetic(s):
-        return no_repeats(no_vowels(simplify(s)))
+    failed = {}
+    with state.batch():
+        deps = missing_deps(state, getcatalog(), upgrades)
+        if len(deps) > 0:
+            failed.update(install_all([get_short_name(d) for d in deps],
+                                      requested=[]))
+        failed.update(upgrade_all(upgrades))
+    if len(failed) > 0:
+        sys.exit(1)
 
-      a = phonetic(candidate)
-      b = phonetic(fuzz)
 
-      return (a==b) or (a in b) or (b in a)
+def search(name=None, *rest):
+    """
+    Search for vim scripts and suggested matches.
 
-    def keyword_match(name, s):
-      """Check if name matches keywords."""
-      if "keywords" in s:
-        for keyword in s["keywords"]:
-          if (keyword in name) or (name in keyword):
-            return True
-      return False
+    Scripts are matched on name, keywords and how their names sound, and
+    the best matches are listed first.
+    """
+    from vimp.search import load_index
 
     if name is None:
       return
-    else:
-      name = name.lower()
-
-    for n in sorted(SCRIPTS):
-      match = (name in n) | (n in name)
-      match |= phonetically_similar(name, n)
-      match |= keyword_match(name, get_script(n))
 
-      if match:
-        s = get_script(n)
-        if "about" in s:
-          print("%s - %s" % (n, expandvars(n, s["about"])))
-        else:
-          print("%s" % n)
+    index = load_index(joinpath(getpath("list"), "search"), getcatalog())
+    for (_, n) in index.search(name):
+      s = get_script(n)
+      if "about" in s:
+        print("%s - %s" % (n, expandvars(n, s["about"])))
+      else:
+        print("%s" % n)
 
 def switch(previous, new):
     """
@@ -357,13 +763,26 @@ def switch(previous, new):
 
 # Associate command name with function.
 COMMANDS = {
+    "backend": backend,
+    "bench": bench,
+    "cache": cache,
+    "dedup": dedup,
     "disable": disable,
+    "fsck": fsck,
+    "gc": gc,
     "help": print_help,
+    "helptags": helptags,
     "install": install,
+    "lazy": lazy,
     "list": list_installed,
+    "lock": lock,
+    "pack": pack,
     "remove": remove,
     "search": search,
     "switch": switch,
+    "update": update,
+    "sync": sync,
+    "upgrade": upgrade,
     "version": version,
 }
 
@@ -6,12 +6,10 @@ Distributed under the LGPL v2.1; see LICENSE.txt
 """
 
 import os
-import pickle
 
-from vimp.install import getpath
+from vimp.install import (VIMPRC_HEADER, getpath)
 from vimp.log import verb
-from vimp.scripts import (SCRIPTS, __version__ as SCRIPTS_VER)
-from vimp.util import (touch, joinpath, mkdir)
+from vimp.util import (touch, joinpath, mkdir, unlink)
 
 VIMRC_INCLUDE = '    exec ":source" . $HOME . "/.vimp/vimrc"'
 
@@ -29,9 +27,6 @@ VIMRC_COMPLETE = """
 
 """
 
-VIMPRC_HEADER = """" This file is maintained by vimp
-"""
-
 
 def vimrc_links_to_vimp():
     """Check if user's vimrc links to vimp."""
@@ -41,21 +36,6 @@ def vimrc_links_to_vimp():
                 return True
     return False
 
-def write_repo(version_scripts):
-    """Writes repository version/script to vimp dir."""
-    version, scripts = version_scripts
-    scripts = joinpath(getpath("list"), "scripts")
-    with open(scripts, "wb") as f:
-        f.write(pickle.dumps((version, scripts), protocol=2))
-
-def read_repo():
-    """Return (version, scripts) from vimp dir."""
-    scripts = joinpath(getpath("list"), "scripts")
-    if os.path.exists(scripts):
-        with open(scripts, "rb") as f:
-            return pickle.loads(f.read())
-    return (None, None)
-
 def link_vimrc_to_vimp():
     """Creates a link from user's vimrc to vimp."""
     verb("Adding vimp hook in ~/.vimrc")
@@ -67,8 +47,6 @@ def configure():
     Performs configuration of vimp.
     If no ~/.vimp/ exists, creates it.
     """
-    global SCRIPTS
-
     touch(getpath("vimrc"))
 
     vimpdir = getpath("vimp")
@@ -92,9 +70,8 @@ def configure():
     if not vimrc_links_to_vimp():
         link_vimrc_to_vimp()
 
-    # Update scripts repository if needed
-    as_tuple = lambda s: tuple(map(int, s.split(".")))
-    (rver, rscr) = read_repo()
-    if (rver is None) or (as_tuple(SCRIPTS_VER) > as_tuple(rver)):
-        write_repo((SCRIPTS_VER, SCRIPTS))
-
+    # The script list is now compiled into list/catalog on demand, so
+    # remove the pickled copy written by older versions.
+    old_repo = joinpath(listdir, "scripts")
+    if os.path.exists(old_repo):
+        unlink(old_repo)
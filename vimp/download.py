@@ -0,0 +1,256 @@
+"""
+Download engine for vim packages.
+
+Copyright (C) 2014 Christian Stigen Larsen
+Distributed under the LGPL v2.1; see LICENSE.txt
+"""
+
+import json
+import os
+
+try:
+    from urllib2 import (HTTPError, Request, urlopen)
+    from urlparse import urlparse
+except ImportError:
+    from urllib.error import HTTPError
+    from urllib.request import (Request, urlopen)
+    from urllib.parse import urlparse
+
+from vimp.log import verb
+from vimp.pool import WorkerPool
+from vimp.util import (exists, mkdir, pathname)
+
+# Maximum number of simultaneous downloads from a single host.  vim.org is
+# slow and does not like being hammered, so it gets a lower limit.
+HOST_LIMIT = 4
+HOST_LIMITS = {
+    "www.vim.org": 2,
+    "vim.sourceforge.net": 2,
+}
+
+def gethost(url):
+    """Returns the host part of an URL."""
+    return urlparse(url).netloc.lower()
+
+# Size of the blocks read from the network and written to disk.
+CHUNK_SIZE = 64*1024
+
+class Fetched(object):
+    """Outcome of fetch(): whether anything changed, and HTTP validators."""
+    def __init__(self, modified, received=0, etag=None, last_modified=None,
+                 resumed=False):
+        self.modified = modified
+        self.received = received
+        self.etag = etag
+        self.last_modified = last_modified
+        self.resumed = resumed
+
+    @property
+    def validators(self):
+        """Returns the validators as a dict, e.g. for storing in the cache."""
+        return {"etag": self.etag, "last_modified": self.last_modified}
+
+def read_partial(filename, url):
+    """Returns (size, etag, last_modified) of a resumable partial download.
+
+    The partial download is in filename.part, and its validators are in
+    filename.part.json.  Returns None if there is nothing to resume."""
+    partial = filename + ".part"
+    try:
+        with open(partial + ".json", "rt") as f:
+            meta = json.load(f)
+        size = os.path.getsize(partial)
+    except (IOError, OSError, ValueError):
+        return None
+    if meta.get("url") != url or size == 0:
+        return None
+    if meta.get("etag") is None and meta.get("last_modified") is None:
+        return None
+    return (size, meta.get("etag"), meta.get("last_modified"))
+
+def fetch(url, filename, progress=None, etag=None, modified=None):
+    """Streams url to filename and returns a Fetched.
+
+    The data is written in chunks to filename.part in the same directory,
+    which is renamed to filename when complete, so filename either does not
+    exist or holds the complete download.  If given, progress(received,
+    total) is called after each chunk; total is None if the server did not
+    send a Content-Length.
+
+    If the server sent an ETag or Last-Modified header, an interrupted
+    download is kept and resumed with a Range request on the next call.
+    If etag or modified are given, the request is made conditional, and
+    when the server answers 304 Not Modified nothing is written and
+    Fetched.modified is False.
+    """
+    path = pathname(filename)
+    mkdir(path)
+    partial = filename + ".part"
+    meta = partial + ".json"
+
+    request = Request(url)
+    if etag is not None:
+        request.add_header("If-None-Match", etag)
+    if modified is not None:
+        request.add_header("If-Modified-Since", modified)
+
+    offset = 0
+    resume = read_partial(filename, url)
+    if resume is not None:
+        offset, part_etag, part_modified = resume
+        verb("Resuming %s from byte %d" % (url, offset))
+        request.add_header("Range", "bytes=%d-" % offset)
+        request.add_header("If-Range", part_etag or part_modified)
+
+    verb("Downloading %s -> %s" % (url, filename))
+    try:
+        resp = urlopen(request)
+    except HTTPError as e:
+        if e.code == 304:
+            verb("Not modified: %s" % url)
+            return Fetched(False, etag=etag, last_modified=modified)
+        if e.code == 416 and offset > 0:
+            # Our partial file no longer matches, start over
+            os.unlink(partial)
+            return fetch(url, filename, progress, etag, modified)
+        raise
+
+    try:
+        headers = resp.info()
+        result = Fetched(True, etag=headers.get("ETag"),
+                         last_modified=headers.get("Last-Modified"))
+
+        # A server may ignore our Range or If-Range and send everything
+        result.resumed = offset > 0 and resp.getcode() == 206
+        if not result.resumed:
+            offset = 0
+        received = offset
+
+        length = headers.get("Content-Length")
+        total = offset + int(length) if length is not None else None
+
+        if result.etag is not None or result.last_modified is not None:
+            with open(meta, "wt") as f:
+                json.dump({"url": url, "etag": result.etag,
+                           "last_modified": result.last_modified}, f)
+        elif os.path.exists(meta):
+            os.unlink(meta)
+
+        try:
+            with open(partial, "ab" if result.resumed else "wb") as f:
+                while True:
+                    chunk = resp.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    received += len(chunk)
+                    if progress is not None:
+                        progress(received, total)
+        except BaseException:
+            # Keep resumable downloads for next time
+            if not os.path.exists(meta):
+                os.unlink(partial)
+            raise
+
+        if total is not None and received != total:
+            raise IOError("Incomplete download of %s: got %d of %d bytes" %
+                          (url, received, total))
+
+        os.rename(partial, filename)
+        if os.path.exists(meta):
+            os.unlink(meta)
+    finally:
+        resp.close()
+
+    verb("Downloaded %d bytes from %s" % (received - offset, url))
+    result.received = received - offset
+    return result
+
+class Result(object):
+    """Outcome of a single download."""
+    def __init__(self, name, url, filename, options):
+        self.name = name
+        self.url = url
+        self.filename = filename
+        self.options = options
+        self.error = None
+        self.received = 0
+        self.total = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+class Downloader(object):
+    """Downloads many files using a bounded pool of workers.
+
+    At most `jobs` downloads run at once, and at most HOST_LIMITS[host] (or
+    HOST_LIMIT) from the same host.  A failing download is recorded in its
+    Result and does not affect the others.  If given, progress(result) is
+    called as data arrives, with byte counts in result.received and
+    result.total.
+
+    Downloads are performed by fetcher(url, filename, progress, **options),
+    which defaults to fetch().
+    """
+    def __init__(self, jobs=None, callback=None, progress=None, fetcher=None):
+        self.pool = WorkerPool(jobs, limits=HOST_LIMITS,
+                               default_limit=HOST_LIMIT)
+        self.fetcher = fetcher if fetcher is not None else fetch
+        self.callback = callback
+        self.progress = progress
+        self.results = []
+
+    @property
+    def received(self):
+        """Total number of bytes received so far."""
+        return sum(result.received for result in self.results)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ex, bt, a):
+        self.pool.__exit__(ex, bt, a)
+
+    def close(self):
+        self.pool.close()
+
+    def _done(self, task):
+        result = task.args[0]
+        result.error = task.error
+        if self.callback is not None:
+            self.callback(result)
+
+    def _run(self, result):
+        def progress(received, total):
+            result.received = received
+            result.total = total
+            if self.progress is not None:
+                self.progress(result)
+        self.fetcher(result.url, result.filename, progress, **result.options)
+
+    def add(self, name, url, filename, **options):
+        """Queues url for download to filename and returns its Result."""
+        result = Result(name, url, filename, options)
+        self.results.append(result)
+        self.pool.submit(self._run, (result,), key=gethost(url),
+                         callback=self._done)
+        return result
+
+    def wait(self):
+        """Waits for all queued downloads and returns their Results."""
+        self.pool.join()
+        return list(self.results)
+
+def download_all(urls_files, jobs=None, fetcher=None):
+    """Downloads (name, url, filename, options) tuples.
+
+    Returns list of Results."""
+    with Downloader(jobs, fetcher=fetcher) as downloader:
+        for (name, url, filename, options) in urls_files:
+            if exists(filename):
+                continue
+            downloader.add(name, url, filename, **options)
+        results = downloader.wait()
+        verb("Downloaded %d bytes in total" % downloader.received)
+        return results
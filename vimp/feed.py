@@ -0,0 +1,227 @@
+"""
+Catalog feeds, for updating the list of scripts without upgrading vimp.
+
+A feed is a directory on a web server with these files:
+
+    index.json           the current version, and the files below
+    catalog-N.json.gz    the whole catalog at version N
+    delta-N.json.gz      the changes from version N-1 to N
+
+Versions are serial numbers.  The index lists the SHA-256 digest of each
+file, and of the catalog that results from applying them, in the form
+
+    {"version": 12, "sha256": <digest of catalog 12>,
+     "catalog": {"version": 12, "file": "catalog-12.json.gz",
+                 "sha256": ...},
+     "deltas": [{"version": 11, "file": "delta-11.json.gz", "sha256": ...},
+                {"version": 12, "file": "delta-12.json.gz", "sha256": ...}]}
+
+A catalog holds "version", "aliases" and "scripts", and "release", the
+version of vimp.scripts it was published from.  A delta holds the aliases
+and scripts that were added or changed, with null for those that were
+removed.  `vimp update` applies the deltas after the version it has,
+and only downloads the whole catalog if it has none, or if the deltas do
+not reach back far enough.
+
+Feeds are written with publish(), e.g. `python -m vimp.feed <directory>`
+to publish the scripts in vimp.scripts.
+
+Copyright (C) 2014 Christian Stigen Larsen
+Distributed under the LGPL v2.1; see LICENSE.txt
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+from vimp.cache import (ChecksumError, sha256sum)
+from vimp.download import fetch
+from vimp.log import verb
+from vimp.util import (VimpError, joinpath, mkdir, pathname)
+
+# Number of deltas kept in a feed.  Catalogs older than this are updated by
+# downloading the whole catalog.
+MAX_DELTAS = 30
+
+class FeedError(VimpError):
+    """A catalog feed cannot be read."""
+    pass
+
+def digest(catalog):
+    """Returns the SHA-256 digest of the aliases and scripts of a catalog."""
+    data = json.dumps({"aliases": catalog["aliases"],
+                       "scripts": catalog["scripts"]},
+                      sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+def read_json(path):
+    """Reads JSON from path, which may be gzipped."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        return json.loads(f.read().decode("utf-8"))
+
+def write_json(path, data, compress=False):
+    """Atomically writes data to path as JSON."""
+    mkdir(pathname(path))
+    text = json.dumps(data, indent=1, sort_keys=True).encode("utf-8")
+    temp = "%s.%d" % (path, os.getpid())
+    if compress:
+        with gzip.open(temp, "wb") as f:
+            f.write(text)
+    else:
+        with open(temp, "wb") as f:
+            f.write(text)
+    os.rename(temp, path)
+
+def apply_delta(catalog, delta):
+    """Returns catalog with the changes in delta."""
+    result = {"version": delta["version"],
+              "aliases": dict(catalog["aliases"]),
+              "scripts": dict(catalog["scripts"])}
+    if "release" in delta:
+        result["release"] = delta["release"]
+    for key in ("aliases", "scripts"):
+        for (name, value) in delta.get(key, {}).items():
+            if value is None:
+                result[key].pop(name, None)
+            else:
+                result[key][name] = value
+    return result
+
+def make_delta(old, new):
+    """Returns the delta that turns catalog old into catalog new."""
+    delta = {"version": new["version"], "aliases": {}, "scripts": {}}
+    if "release" in new:
+        delta["release"] = new["release"]
+    for key in ("aliases", "scripts"):
+        for name in set(old[key]) | set(new[key]):
+            if old[key].get(name) != new[key].get(name):
+                delta[key][name] = new[key].get(name)
+    return delta
+
+def load_local(path):
+    """Returns the catalog previously fetched from a feed, or None."""
+    if not os.path.exists(path):
+        return None
+    try:
+        return read_json(path)
+    except ValueError:
+        verb("Warning: Ignoring corrupt catalog %s" % path)
+        return None
+
+class Feed(object):
+    """A catalog feed at an URL."""
+    def __init__(self, url, workdir):
+        self.url = url.rstrip("/")
+        self.workdir = workdir
+        self.received = 0
+
+    def get(self, name, sha256=None):
+        """Downloads a file from the feed, checks its digest and returns
+        its contents."""
+        fd, filename = tempfile.mkstemp(prefix="vimp-feed-", suffix="-" + name,
+                                        dir=self.workdir)
+        os.close(fd)
+        os.unlink(filename)
+        try:
+            result = fetch("%s/%s" % (self.url, name), filename)
+            self.received += result.received
+            if sha256 is not None and sha256sum(filename) != sha256:
+                raise ChecksumError("%s/%s does not have the digest given "
+                                    "in the feed index" % (self.url, name))
+            try:
+                return read_json(filename)
+            except (IOError, ValueError) as e:
+                raise FeedError("Cannot read %s/%s: %s" % (self.url, name, e))
+        finally:
+            if os.path.exists(filename):
+                os.unlink(filename)
+
+    def update(self, local):
+        """Returns the newest catalog, and whether it was built from deltas.
+
+        local is the catalog we have, or None."""
+        index = self.get("index.json")
+        version = index["version"]
+        if local is not None and local["version"] == version:
+            return (local, True)
+
+        if local is not None:
+            deltas = [d for d in index.get("deltas", [])
+                      if d["version"] > local["version"]]
+            versions = [d["version"] for d in deltas]
+            if versions == list(range(local["version"] + 1, version + 1)):
+                catalog = local
+                for entry in deltas:
+                    verb("Applying catalog delta %d" % entry["version"])
+                    catalog = apply_delta(catalog,
+                                          self.get(entry["file"],
+                                                   entry["sha256"]))
+                if digest(catalog) == index["sha256"]:
+                    return (catalog, True)
+                print("Warning: Catalog deltas did not add up, downloading "
+                      "the whole catalog")
+
+        entry = index["catalog"]
+        catalog = self.get(entry["file"], entry["sha256"])
+        if catalog.get("version") != version or \
+                digest(catalog) != index["sha256"]:
+            raise FeedError("Catalog %s/%s does not match the feed index" %
+                            (self.url, entry["file"]))
+        return (catalog, False)
+
+def publish(directory, aliases, scripts, release=None):
+    """Adds a new version of the catalog to the feed in directory.
+
+    release is the version of vimp.scripts the scripts are from, if any.
+    Returns the new version, or None if the catalog has not changed."""
+    index_path = joinpath(directory, "index.json")
+    index = read_json(index_path) if os.path.exists(index_path) else None
+    catalog = {"aliases": aliases, "scripts": scripts}
+    # Round-trip through JSON, so tuples compare equal to lists
+    catalog = json.loads(json.dumps(catalog))
+    if release is not None:
+        catalog["release"] = release
+
+    if index is not None:
+        old = read_json(joinpath(directory, index["catalog"]["file"]))
+        if digest(old) == digest(catalog) and \
+                old.get("release") == catalog.get("release"):
+            return None
+        catalog["version"] = old["version"] + 1
+        delta = make_delta(old, catalog)
+        name = "delta-%d.json.gz" % catalog["version"]
+        write_json(joinpath(directory, name), delta, compress=True)
+        deltas = index["deltas"] + [{"version": catalog["version"],
+                                     "file": name,
+                                     "sha256": sha256sum(joinpath(directory,
+                                                                  name))}]
+        for entry in deltas[:-MAX_DELTAS]:
+            os.unlink(joinpath(directory, entry["file"]))
+        deltas = deltas[-MAX_DELTAS:]
+        os.unlink(joinpath(directory, index["catalog"]["file"]))
+    else:
+        catalog["version"] = 1
+        deltas = []
+
+    name = "catalog-%d.json.gz" % catalog["version"]
+    write_json(joinpath(directory, name), catalog, compress=True)
+    write_json(index_path, {
+        "version": catalog["version"],
+        "sha256": digest(catalog),
+        "catalog": {"version": catalog["version"], "file": name,
+                    "sha256": sha256sum(joinpath(directory, name))},
+        "deltas": deltas,
+    })
+    return catalog["version"]
+
+if __name__ == "__main__":
+    from vimp.scripts import (ALIASES, SCRIPTS, __version__)
+    version = publish(sys.argv[1], ALIASES, SCRIPTS, __version__)
+    if version is None:
+        print("Catalog has not changed")
+    else:
+        print("Published catalog version %d" % version)
@@ -0,0 +1,212 @@
+"""
+Garbage collection of packages and files that nothing needs any more.
+
+The packages the user asked for are live, whether they are enabled or
+not, and so is everything they depend on, directly or not.  Everything else
+vimp keeps on disk is garbage:
+
+    - installed packages that are not live, like dependencies left behind
+      when the packages that needed them were removed,
+    - directories in ~/.vimp/installed and ~/.vimp/download that belong to
+      no installed package, left by interrupted installs,
+    - cached archives and git stores no installed package came from,
+    - objects in ~/.vimp/objects that no installed file is linked to.
+
+What installs still running in other vimp processes are using is not
+garbage: the packages and directories of transactions in ~/.vimp/journal,
+staging and backup directories of running processes, and downloads and git
+stores that were written to recently, since an install has no journal
+until its download is done.
+
+Garbage is found by walking the dependency graph from the live packages
+every time, instead of keeping reference counts that could get out of
+sync.  Installed files are hardlinked to the object store, and may be
+shared between packages, so only the bytes of files that have all their
+links in garbage, or in the store, are counted as reclaimable.
+
+Copyright (C) 2014 Christian Stigen Larsen
+Distributed under the LGPL v2.1; see LICENSE.txt
+"""
+
+import os
+import re
+import shutil
+import time
+
+from vimp.git import storepath
+from vimp.install import (get_full_name, getpath)
+from vimp.log import verb
+from vimp.objects import ObjectStore
+from vimp.pool import WorkerPool
+from vimp.state import getbasename
+from vimp.transaction import (pending, running)
+from vimp.util import (joinpath, readlink, unlink)
+
+# Downloads and git stores written to within this many seconds may belong to
+# an install that is still running.
+RECENT = 60 * 60
+
+# Matches the staging and backup directories of a transaction.
+ARTIFACT = re.compile(r"\.(staging|backup)\.(\d+)$")
+
+def roots(state, backend):
+    """Returns full names of the packages that are live by themselves.
+
+    Disabled packages the user asked for are live, so that enabling them
+    again does not need a download."""
+    live = []
+    for full in state.installed(enabled=False):
+        entry = state.get(full)
+        # Pathogen is needed to load the others, even if nobody asked for it
+        if entry.get("requested") or \
+                (backend == "pathogen" and entry["name"] == "pathogen"):
+            live.append(full)
+    return live
+
+def reachable(state, catalog, roots):
+    """Returns the set of installed packages that roots depend on, including
+    themselves.
+
+    Dependencies are matched by name regardless of version, so a package
+    still keeps an upgraded dependency alive."""
+    versions = {}
+    for full in state.installed(enabled=False):
+        versions.setdefault(getbasename(full), []).append(full)
+
+    live = set()
+    pending = list(roots)
+    while len(pending) > 0:
+        full = pending.pop()
+        if full in live:
+            continue
+        live.add(full)
+        for dep in catalog.deps(full):
+            pending.extend(versions.get(getbasename(get_full_name(dep)), []))
+    return live
+
+def orphans(directory, owned):
+    """Returns paths of the entries in directory that are not in owned."""
+    if not os.path.isdir(directory):
+        return []
+    return [joinpath(directory, name) for name in sorted(os.listdir(directory))
+            if name not in owned]
+
+def recent(path, now=None):
+    """Checks if path, or anything below it, was modified within RECENT
+    seconds."""
+    since = (now if now is not None else time.time()) - RECENT
+    try:
+        if os.path.getmtime(path) >= since:
+            return True
+        for base, dirs, names in os.walk(path):
+            for name in dirs + names:
+                if os.path.getmtime(joinpath(base, name)) >= since:
+                    return True
+    except OSError:
+        # Something else is changing it
+        return True
+    return False
+
+def inflight(state, journal):
+    """Returns the full names of packages with transactions in progress, and
+    the paths those transactions use."""
+    packages = set()
+    paths = set()
+    for txn in pending(state, journal):
+        packages.add(txn.fullname)
+        paths.update((txn.data["install"], txn.data["staging"],
+                      txn.data["backup"], getpath("download", txn.fullname)))
+    return (packages, paths)
+
+def busy(path, paths):
+    """Checks if path is used by an install that may still be running."""
+    match = ARTIFACT.search(path)
+    return path in paths or \
+           (match is not None and running(int(match.group(2))))
+
+def plan(state, catalog, cache, backend):
+    """Finds garbage.
+
+    Returns the full names of garbage packages, the paths to delete (their
+    install directories included), and the digests of unused archives in
+    the cache.  Unused objects are always deleted, and are not included."""
+    live = reachable(state, catalog, roots(state, backend))
+    installing, used = inflight(state, getpath("journal"))
+    installed = state.installed(enabled=False)
+    packages = [full for full in installed
+                if full not in live and full not in installing]
+    kept = [state.get(full) for full in live]
+
+    paths = [getpath("install", full) for full in packages]
+    paths += orphans(getpath("install"), set(installed))
+    paths += [path for path in orphans(getpath("download"), ())
+              if not recent(path)]
+
+    gitroot = getpath("git")
+    stores = set(os.path.basename(storepath(gitroot, entry["url"]))
+                 for entry in kept if entry.get("commit") and entry.get("url"))
+    paths += [path for path in orphans(gitroot, stores) if not recent(path)]
+    paths = [path for path in paths if not busy(path, used)]
+
+    digests = set(entry.get("sha256") for entry in kept)
+    objects = sorted(sha256 for sha256 in cache.index["objects"]
+                     if sha256 not in digests)
+    return (packages, paths, objects)
+
+def reclaimable(paths, shared=()):
+    """Returns the number of bytes freed by deleting paths.
+
+    A file is only counted if all its hardlinks are below paths, except for
+    one in the object store if its (device, inode) is in shared, since the
+    object is then removed as well."""
+    links = {}
+    sizes = {}
+
+    def count(path):
+        st = os.lstat(path)
+        key = (st.st_dev, st.st_ino)
+        links[key] = links.get(key, 0) + 1
+        sizes[key] = (st.st_size, st.st_nlink)
+
+    for path in paths:
+        if not os.path.lexists(path):
+            continue
+        if os.path.isdir(path) and not os.path.islink(path):
+            for base, _, names in os.walk(path):
+                for name in names:
+                    count(joinpath(base, name))
+        else:
+            count(path)
+
+    return sum(size for (key, (size, nlink)) in sizes.items()
+               if links[key] + (1 if key in shared else 0) >= nlink)
+
+def delete(path):
+    verb("Removing %s" % path)
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.unlink(path)
+
+def collect(state, cache, packages, paths, objects, jobs=None):
+    """Deletes garbage found by plan(), in parallel.
+
+    Returns dict of path to error for paths that could not be deleted."""
+    # Unlink packages from vim before their files disappear
+    with state.batch():
+        for full in packages:
+            for (src, dst) in state.get(full)["symlinks"]:
+                if readlink(dst) == src:
+                    unlink(dst)
+            state.remove(full)
+
+    with WorkerPool(jobs) as pool:
+        tasks = [pool.submit(delete, (path,)) for path in paths]
+        pool.join()
+    cache.remove(objects)
+
+    # Including those only used by the deleted packages
+    for path in ObjectStore(getpath("objects")).unused():
+        delete(path)
+    return dict((task.args[0], task.error) for task in tasks
+                if task.error is not None)
@@ -0,0 +1,111 @@
+"""
+Fetches packages from git repositories.
+
+A script can name a git repository and a ref (a tag, branch or commit)
+instead of an archive to download:
+
+    "git": ("https://github.com/tpope/vim-fugitive.git", "v2.1"),
+
+Each repository is fetched into a bare repository in ~/.vimp/git, which is
+shared by all versions of the package.  Fetches are shallow, and git only
+transfers the objects the store does not have yet, so installing a new
+version of a package fetches what changed since the last one instead of a
+whole archive.  The commit is then exported as a tar file, and extracted
+like any other archive.
+
+Copyright (C) 2014 Christian Stigen Larsen
+Distributed under the LGPL v2.1; see LICENSE.txt
+"""
+
+import os
+import re
+import subprocess
+import threading
+
+from vimp.log import verb
+from vimp.util import (VimpError, joinpath, mkdir, pathname)
+
+# Matches a full commit id.
+COMMIT = re.compile(r"^[0-9a-f]{40}$")
+
+class GitError(VimpError):
+    """A git command failed."""
+    pass
+
+# Fetches into the same store must not run at the same time, since git
+# locks its shallow file while fetching.
+_locks = {}
+_locks_lock = threading.Lock()
+
+def storelock(store):
+    with _locks_lock:
+        return _locks.setdefault(store, threading.Lock())
+
+def storepath(root, url):
+    """Returns the bare repository below root that url is fetched into."""
+    name = re.sub(r"^\w+://", "", url).rstrip("/")
+    if name.endswith(".git"):
+        name = name[:-4]
+    return joinpath(root, re.sub(r"[^\w.-]+", "_", name).strip("_") + ".git")
+
+def git(store, *args):
+    """Runs git on the bare repository store, and returns its output."""
+    command = ["git", "--git-dir", store, "-c", "gc.auto=0"] + list(args)
+    verb("Running %s" % " ".join(command))
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+    except OSError as e:
+        raise GitError("Cannot run git: %s" % e)
+    out, err = process.communicate()
+    if process.returncode != 0:
+        raise GitError("git %s failed: %s" % (args[0],
+                       err.decode("utf-8", "replace").strip()))
+    return out.decode("utf-8", "replace").strip()
+
+def hascommit(store, commit):
+    """Checks if the store already has a commit."""
+    try:
+        git(store, "cat-file", "-e", commit + "^{commit}")
+        return True
+    except GitError:
+        return False
+
+def fetch(root, url, ref, name):
+    """Fetches ref from url into the shared store as refs/vimp/name.
+
+    Returns the id of the fetched commit."""
+    store = storepath(root, url)
+    with storelock(store):
+        if not os.path.isdir(store):
+            mkdir(pathname(store))
+            verb("Creating git store %s" % store)
+            git(store, "init", "--bare", "--quiet")
+
+        local = "refs/vimp/%s" % name
+        if COMMIT.match(ref) and hascommit(store, ref):
+            verb("Already have %s from %s" % (ref, url))
+            git(store, "update-ref", local, ref)
+        else:
+            print("Fetching %s %s" % (url, ref))
+            git(store, "fetch", "--quiet", "--depth", "1", "--no-tags", url,
+                "+%s:%s" % (ref, local))
+        return git(store, "rev-parse", local + "^{commit}")
+
+def revision(root, url, name):
+    """Returns the commit last fetched as name, or None."""
+    store = storepath(root, url)
+    try:
+        return git(store, "rev-parse", "refs/vimp/%s^{commit}" % name)
+    except GitError:
+        return None
+
+def export(root, url, ref, name, filename):
+    """Fetches ref from url and writes its files to the tar file filename.
+
+    Returns the id of the commit."""
+    commit = fetch(root, url, ref, name)
+    mkdir(pathname(filename))
+    git(storepath(root, url), "archive", "--format=tar", "-o", filename,
+        commit)
+    return commit
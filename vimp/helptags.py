@@ -0,0 +1,85 @@
+"""
+Generates vim help tags files, like `:helptags`, without starting vim.
+
+Help files are the *.txt files in a plugin's doc directory.  A tag is a
+word between stars, like *fugitive-commands*, that is preceded by white
+space or the start of the line and followed by white space or the end of
+the line.  The tags file lists each tag with the file it is in, sorted, so
+that `:help` can find it.
+
+Copyright (C) 2014 Christian Stigen Larsen
+Distributed under the LGPL v2.1; see LICENSE.txt
+"""
+
+import os
+
+from vimp.log import verb
+from vimp.pool import WorkerPool
+from vimp.util import joinpath
+
+def find_tags(line):
+    """Returns the tags defined in a line of a help file, as bytes."""
+    tags = []
+    start = line.find(b"*")
+    while start != -1:
+        end = line.find(b"*", start + 1)
+        if end == -1:
+            break
+        tag = line[start+1:end]
+        after = line[end+1:end+2]
+        if len(tag) > 0 and \
+                not any(c in tag for c in (b" ", b"\t", b"|")) and \
+                (start == 0 or line[start-1:start] in (b" ", b"\t")) and \
+                after in (b"", b" ", b"\t", b"\n", b"\r"):
+            tags.append(tag)
+        start = end
+    return tags
+
+def helptags(docdir):
+    """Writes docdir/tags for the help files in docdir.
+
+    Returns the number of tags, or None if docdir has no help files."""
+    names = sorted(n for n in os.listdir(docdir) if n.endswith(".txt"))
+    if len(names) == 0:
+        return None
+
+    tags = {}
+    utf8 = False
+    for name in names:
+        with open(joinpath(docdir, name), "rb") as f:
+            for number, line in enumerate(f):
+                # Like vim, a non-ASCII first line marks the file as UTF-8
+                if number == 0 and any(c > 127 for c in bytearray(line)):
+                    utf8 = True
+                for tag in find_tags(line):
+                    if tag in tags:
+                        verb("Duplicate help tag %s in %s" % (
+                             tag.decode("utf-8", "replace"), name))
+                        continue
+                    tags[tag] = name.encode("utf-8")
+
+    lines = []
+    if utf8:
+        lines.append(b"!_TAG_FILE_ENCODING\tutf-8\t//\n")
+    for tag in sorted(tags):
+        pattern = tag.replace(b"\\", b"\\\\").replace(b"/", b"\\/")
+        lines.append(b"\t".join([tag, tags[tag], b"/*" + pattern + b"*"]) +
+                     b"\n")
+
+    path = joinpath(docdir, "tags")
+    temp = "%s.%d" % (path, os.getpid())
+    with open(temp, "wb") as f:
+        f.write(b"".join(lines))
+    os.rename(temp, path)
+    verb("Wrote %d help tags to %s" % (len(tags), path))
+    return len(tags)
+
+def helptags_all(docdirs, jobs=None):
+    """Generates tags files for many doc directories in parallel.
+
+    Returns dict of doc directory to the error for those that failed."""
+    with WorkerPool(jobs) as pool:
+        tasks = [pool.submit(helptags, (d,), key=d)
+                 for d in docdirs if os.path.isdir(d)]
+        pool.join()
+    return dict((t.key, t.error) for t in tasks if t.error is not None)
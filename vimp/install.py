@@ -5,96 +5,282 @@ Copyright (C) 2014 Christian Stigen Larsen
 Distributed under the LGPL v2.1; see LICENSE.txt
 """
 
-from zipfile import ZipFile
-import contextlib
 import os
-import shutil
 import sys
-import tarfile
 import threading
 
-try:
-    import urllib2
-except ImportError:
-    import urllib
-
 from vimp.log import (verb)
-from vimp.scripts import (SCRIPTS, ALIASES)
+from vimp.catalog import load_catalog
+from vimp.timing import profile
 from vimp.util import (
     copyfile,
     exists,
+    formatsize,
     joinpath,
     mkdir,
     pathname,
     readlink,
     symlink,
+    unlink,
     unlinktree,
 )
 
 
+# Guards creating the catalog, cache and state below, which may first be
+# needed by worker threads.  Reentrant, since loading the state needs the
+# catalog.
+_lock = threading.RLock()
+
+_catalog = None
+
+def getcatalog():
+    """Returns the compiled catalog of available scripts."""
+    global _catalog
+    if _catalog is None:
+      with _lock:
+        if _catalog is None:
+          with profile.phase("load catalog"):
+            _catalog = load_catalog(joinpath(getpath("list"), "catalog"),
+                                    joinpath(getpath("list"), "feed.json"))
+    return _catalog
+
 def get_full_name(name):
-    return ALIASES[name] if name in ALIASES else name
+    """Returns the full name of the package installed under a short name,
+    or the catalog's full name for names that are not installed.
+
+    An upgraded package keeps its name, even if the catalog's aliases point
+    to another version."""
+    full = getstate().named(name)
+    if full is not None:
+        return full
+    return getcatalog().full_name(name)
 
 def get_short_name(fullname):
-    for k in ALIASES.keys():
-      if ALIASES[k] == fullname:
-        return k
-    return fullname
+    """Returns the name an installed package is linked under, or the
+    catalog's short name for packages that are not installed.
 
-def has_vimprc(text):
-    vimprc = getpath("vimprc")
-    with open(vimprc, "rt") as f:
-        for l in f.readlines():
-            if l.startswith(text):
-                return True
-    return False
-
-def remove_vimprc(name, text):
-    verb("Warning: Unimplemented remove_vimprc")
-    pass
-
-def add_vimprc(name, lines):
-    """Adds a line to .vimp/vimrc."""
-    tab = "  "
-    indent = 0
-
-    if len(lines) == 0:
-        return
+    An upgraded package keeps its name, even if the catalog's aliases point
+    to another version."""
+    entry = getstate().get(fullname)
+    if entry is not None:
+        return entry["name"]
+    return getcatalog().short_name(fullname)
 
-    # Check if text is already there
-    header = "\" ==== %s ====" % name
-    if has_vimprc(header):
-        verb("There is already an entry in .vimp/vimrc for %s" % name)
-        return
+VIMPRC_HEADER = """" This file is maintained by vimp
+"""
 
-    verb("Adding entry for %s to .vimp/vimrc" % name)
-    with open(getpath("vimprc"), "at") as f:
-        f.write("\n" + header + "\n")
+# Ways of loading packages into vim: through pathogen and ~/.vim/bundle, or
+# with vim's own package loader and ~/.vim/pack (vim 8 and later).
+BACKENDS = ("pathogen", "native")
+
+def getbackend():
+    """Returns the backend used on this machine."""
+    return getstate().get_option("backend", "pathogen")
+
+def render_vimprc(state, exclude=(), packed=True):
+    """Returns the contents of .vimp/vimrc for the enabled packages.
+
+    Each package gets a block with its vimrc lines, guarded by checks that
+    its symlinks exist.  Pathogen comes first, since the other blocks rely
+    on it.  Full names in exclude are left out.
+
+    Packages set to load lazily are kept out of pathogen's runtimepath, and
+    get stubs that load them on first use at the end.  So are packages in
+    the packed tree, which is loaded instead.  Set packed to False to load
+    them as ordinary bundles even in packed mode.
+
+    With the native backend, vim loads the packages itself, so pathogen is
+    left out, and lazy packages are loaded with :packadd from opt/."""
+    from vimp.lazy import (render_disabled, render_stubs, triggers)
+    from vimp.pack import (BUNDLE, packed_names)
+
+    native = state.get_option("backend") == "native"
+
+    names = sorted((f for f in state.installed() if f not in exclude),
+                   key=lambda full: (not full.startswith("pathogen"), full))
+    out = [VIMPRC_HEADER]
+    lazy = []
+    for full in names:
+        s = getcatalog().get(full)
+        if s is None:
+            continue
+        name = state.get(full)["name"]
+        if native and name == "pathogen":
+            continue
+        if state.get(full).get("lazy") and triggers(s) is not None:
+            path = "" if native else expandvars(full, "{bundle}", name=name)
+            lazy.append((name, path, triggers(s)))
+
+        lines = s.get("vimrc", [])
+        if len(lines) == 0:
+            continue
 
-        # Check if symlinks exists before executing commands
-        s = get_script(name)
         tab = "  "
-        for (_, dst) in s["symlink"]:
-            dst = expandvars(name, dst)
-            f.write(tab*indent + "if filereadable(\"%s\")\n" % dst)
+        indent = 0
+        out.append("\n\" ==== %s ====\n" % name)
+        for (_, dst) in s.get("symlink", []):
+            dst = expandvars(full, dst, name=name)
+            out.append(tab*indent + "if filereadable(\"%s\")\n" % dst)
             indent += 1
-
         for line in lines:
-            f.write(tab*indent + "%s\n" % expandvars(name, line))
-
-        for (_, dst) in s["symlink"]:
+            out.append(tab*indent + "%s\n" % expandvars(full, line,
+                                                         name=name))
+        for _ in s.get("symlink", []):
             indent -= 1
-            f.write(tab*indent + "endif\n")
+            out.append(tab*indent + "endif\n")
+
+    disabled = [name for (name, _, _) in lazy]
+    if state.get_option("packed"):
+        if packed:
+            disabled += [state.get(full)["name"]
+                         for full in packed_names(getpath("packed") + ".json")
+                         if state.get(full) is not None]
+        else:
+            disabled.append(BUNDLE)
+    if len(disabled) > 0 and not native:
+        out.insert(1, render_disabled(disabled))
+    out.append(render_stubs(lazy))
+    return "".join(out)
+
+def update_vimprc(force=False):
+    """Rewrites .vimp/vimrc if the installed packages have changed.
+
+    The file is only written if its contents differ, and then atomically.
+    Set force to render it even if the state has not been modified.  In
+    packed mode, the packed tree is brought up to date first, and then
+    packages are relinked in case they have moved."""
+    if _state is None or not (_state.modified or force):
+        return
 
-def helptags(name, path):
-    s =  "if !filereadable(\"%s/tags\")\n" % path
-    s += "  call pathogen#helptags()\n"
-    s += "endif\n"
-    return s
+    update_pack(_state)
+    relink(_state)
+
+    text = render_vimprc(_state)
+    vimprc = getpath("vimprc")
+    if exists(vimprc):
+        with open(vimprc, "rt") as f:
+            if f.read() == text:
+                verb("%s is up to date" % vimprc)
+                return
+
+    verb("Writing %s" % vimprc)
+    temp = "%s.%d" % (vimprc, os.getpid())
+    with open(temp, "wt") as f:
+        f.write(text)
+    os.rename(temp, vimprc)
+
+def packable(state):
+    """Returns (full name, directory) of packages that can be packed.
+
+    Those are the enabled packages that are symlinked into the bundle
+    directory, and are not loaded lazily."""
+    from vimp.lazy import triggers
+
+    packages = []
+    for full in state.installed():
+        script = getcatalog().get(full)
+        if script is None or (state.get(full).get("lazy") and
+                              triggers(script) is not None):
+            continue
+        for (src, dst) in script.get("symlink", []):
+            src = expandvars(full, src)
+            if dst == "{bundle}" and os.path.isdir(src):
+                packages.append((full, src))
+    return packages
+
+def update_pack(state):
+    """Brings the packed tree up to date, or removes it if packed mode is
+    off."""
+    from vimp.pack import (BUNDLE, build, plan)
+    global _packed
+
+    path = getpath("packed")
+    manifest = path + ".json"
+    vim = getpath("vim")
+    bundles = [joinpath(vim, "bundle", BUNDLE),
+               joinpath(vim, "pack", "vimp", "start", BUNDLE)]
+    bundle = bundles[1 if state.get_option("backend") == "native" else 0]
+    for link in bundles:
+        if link != bundle or not state.get_option("packed"):
+            if readlink(link) == path:
+                unlink(link)
+
+    _packed = None
+    if not state.get_option("packed"):
+        if exists(manifest):
+            verb("Removing packed tree %s" % path)
+            unlinktree(path)
+            unlink(manifest)
+        return
+
+    links, names, conflicts = plan(packable(state))
+    reported = set()
+    for (rel, fulls) in conflicts:
+        if tuple(fulls) not in reported:
+            reported.add(tuple(fulls))
+            print("Warning: Not packing %s, since they all have %s" % (
+                  " and ".join(fulls), rel))
+    build(path, manifest, links, names)
+    _packed = None
+    if readlink(bundle) != path:
+        symlink(path, bundle)
+
+def relink(state):
+    """Moves the symlinks of enabled packages to where they belong now.
+
+    Where a package is linked depends on the backend, and with the native
+    backend also on whether it is loaded lazily or packed."""
+    with state.batch():
+        for full in state.installed():
+            script = getcatalog().get(full)
+            if script is None:
+                continue
+            links = [(expandvars(full, src), expandvars(full, dst))
+                     for (src, dst) in script.get("symlink", [])]
+            old = [tuple(link) for link in state.get(full)["symlinks"]]
+            if links == old:
+                continue
+            verb("Relinking %s" % full)
+            for (src, dst) in old:
+                if (src, dst) not in links and readlink(dst) == src:
+                    unlink(dst)
+            for (src, dst) in links:
+                if readlink(dst) != src:
+                    symlink(src, dst)
+            state.set_symlinks(full, links)
+
+_packed = None
+
+def bundledir(name):
+    """Returns the directory a package is linked to for vim to load it.
+
+    With the pathogen backend, this is in ~/.vim/bundle.  With the native
+    backend, it is in ~/.vim/pack/vimp, under opt/ if the package is loaded
+    lazily or through the packed tree, and under start/ otherwise."""
+    from vimp.lazy import triggers
+    from vimp.pack import packed_names
+    global _packed
+
+    vim = getpath("vim")
+    short = get_short_name(name)
+    state = getstate()
+    if state.get_option("backend") != "native":
+        return joinpath(vim, "bundle", short)
+
+    full = get_full_name(name)
+    entry = state.get(full)
+    optional = entry is not None and entry.get("lazy") and \
+               triggers(getcatalog().get(full) or {}) is not None
+    if state.get_option("packed"):
+        if _packed is None:
+            _packed = packed_names(getpath("packed") + ".json")
+        optional = optional or full in _packed
+    return joinpath(vim, "pack", "vimp", "opt" if optional else "start",
+                    short)
 
 def getpath(label, name=""):
     """Returns full path to various parts of vimp and vim."""
-    full = get_full_name(name)
+    full = get_full_name(name) if len(name) > 0 else name
     vimp = os.path.expanduser(joinpath("~", ".vimp"))
     vimrc = os.path.expanduser(joinpath("~", ".vimrc"))
     vim = os.path.expanduser(joinpath("~", ".vim"))
@@ -111,213 +297,298 @@ def getpath(label, name=""):
         "vimp":     lambda: vimp,
         "vimprc":   lambda: joinpath(vimp, "vimrc"),
         "install":  lambda: joinpath(vimp, "installed", full),
-        "bundle":   lambda: joinpath(vim, "bundle", get_short_name(name)),
+        "bundle":   lambda: bundledir(name),
         "download": lambda: joinpath(vimp, "download", full),
+        "cache":    lambda: joinpath(vimp, "cache"),
+        "state":    lambda: joinpath(vimp, "state"),
+        "journal":  lambda: joinpath(vimp, "journal"),
+        "bench":    lambda: joinpath(vimp, "bench.json"),
+        "packed":   lambda: joinpath(vimp, "packed"),
+        "git":      lambda: joinpath(vimp, "git"),
+        "objects":  lambda: joinpath(vimp, "objects"),
         "colors":   lambda: joinpath(vim, "colors"),
      }.get(label, unknown_label)()
 
-def download(url, filename, skip_existing=True):
-    """Stores download in .vimp/downloads/ and returns filename."""
-    if exists(filename) and skip_existing:
-        return
-    else:
-        mkdir(pathname(filename))
+_cache = None
+
+def getcache():
+    """Returns the download cache."""
+    from vimp.cache import Cache
+    global _cache
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                _cache = Cache(getpath("cache"))
+    return _cache
+
+def getsource(name, script):
+    """Returns (url, archive, download options) for a script, or None if it
+    has nothing to download.
+
+    For scripts fetched with git, the archive is a tar file of the commit."""
+    full = get_full_name(name)
+    if "git" in script:
+        url, ref = script["git"]
+        archive = joinpath(getpath("download", name), full + ".tar")
+        return (url, archive, {"ref": ref, "package": full})
+    if "download" in script:
+        url, archive = script["download"]
+        archive = joinpath(getpath("download", name),
+                           expandvars(name, archive))
+        return (url, archive, {"sha256": script.get("sha256")})
+    return None
+
+def download(url, filename, progress=None, sha256=None, skip_existing=True,
+             ref=None, package=None):
+    """Stores download in .vimp/downloads/ and returns filename.
+
+    Archives are fetched from the download cache when possible, and new
+    downloads are added to it.  If sha256 is given, the download must have
+    that digest.  Cached downloads without a digest are revalidated with a
+    conditional request when they are older than cache.MAX_AGE.
+
+    If ref is given, url is a git repository instead, and ref is fetched
+    into the git store for package and exported to filename."""
+    from vimp.cache import linkfile
+    from vimp.download import fetch
 
-    verb("Downloading %s -> %s" % (url, filename))
-    resp = urllib2.urlopen(url)
-    with open(filename, "wb") as f:
-        f.write(resp.read())
-    resp.close()
+    if exists(filename) and skip_existing:
+        return filename
+
+    if ref is not None:
+        from vimp.git import export
+        export(getpath("git"), url, ref, package, filename)
+        return filename
+
+    cache = getcache()
+    cached = cache.lookup(url, sha256)
+    if cached is not None and (sha256 is not None or cache.isfresh(url)):
+        verb("Using cached %s for %s" % (cached, url))
+        linkfile(cached, filename)
+        return filename
+
+    validators = cache.validators(url) if cached is not None else {}
+    try:
+        fetched = fetch(url, filename, progress,
+                        etag=validators.get("etag"),
+                        modified=validators.get("last_modified"))
+    except Exception as e:
+        if cached is None:
+            raise
+        print("Warning: Could not check %s for changes, using cached copy: %s"
+              % (url, e))
+        linkfile(cached, filename)
+        return filename
+
+    if not fetched.modified:
+        verb("Using revalidated %s for %s" % (cached, url))
+        cache.revalidated(url)
+        linkfile(cached, filename)
+        return filename
+
+    try:
+        cache.store(url, filename, sha256, fetched.validators)
+    except Exception:
+        os.unlink(filename)
+        raise
+    return filename
 
 def download_parallel(urls_files):
-  """Download list of (url, file) tuples in parallel."""
-  threads = []
-  names = []
-  for (name, url, filename) in urls_files:
-    if exists(filename):
-      continue
-    names.append(name)
-    thread = threading.Thread(target=download, args=(url, filename, True))
-    threads.append(thread)
-
-  if len(threads) > 0:
+  """Download list of (name, url, file, sha256) tuples in parallel.
+
+  Returns the list of failed download Results."""
+  from vimp.download import download_all
+
+  names = [n for (n, _, filename, _) in urls_files if not exists(filename)]
+
+  if len(names) > 0:
     if len(names) > 1:
       print("Downloading %d packages in parallel: %s" % (
         len(names), " ".join(names)))
     else:
       print("Downloading %s" % " ".join(names))
 
-    map(lambda s: s.start(), threads)
-    map(lambda s: s.join(), threads)
-
-@contextlib.contextmanager
-def zipfile(path):
-    z = ZipFile(path)
-    yield z
-    z.close()
-
-@contextlib.contextmanager
-def zipfile_member(zipobj, member):
-    f = zipobj.open(member)
-    yield f
-    f.close()
-
-def unzip_member(zipobj, member, output):
-    with zipfile_member(zipobj, member) as src:
-        mkdir(pathname(output))
-        with file(output, "wb") as dst:
-            shutil.copyfileobj(src, dst)
-
-def unzip_members(archive, pairs):
-    """From archive, unzip (member, destination) from pairs."""
-    with zipfile(archive) as z:
-        members = z.namelist()
-
-        for pattern, output in pairs:
-            # Poor man's glob
-            if pattern.endswith("*"):
-                for member in members:
-                    base = os.path.basename(member)
-                    dest = joinpath(output, base)
-                    if member.startswith(pattern[:-1]):
-                        verb("Unzipping %s -> %s" % (member, dest))
-                        unzip_member(z, member, dest)
-            else:
-                verb("Unzipping %s -> %s" % (pattern, output))
-                unzip_member(z, pattern, output)
-
-@contextlib.contextmanager
-def open_tarfile(path):
-    t = tarfile.open(path, "r")
-    yield t
-    t.close()
-
-def untar_member(tar, member, output):
-    mkdir(pathname(output))
-
-    if member.isdir():
-        return
+  jobs = [(name, url, filename, {"sha256": sha256})
+          for (name, url, filename, sha256) in urls_files]
+  failed = [r for r in download_all(jobs, fetcher=download) if not r.ok]
+  for result in failed:
+    print("Error: Could not download %s from %s: %s" % (
+      result.name, result.url, result.error))
+  return failed
+
+def extract(archive, pairs, reuse=None):
+  """Extract (member, output filename) pairs from archive.
+
+  Returns the number of files hardlinked to existing ones given by reuse,
+  see Archive."""
+  from vimp.archive import Archive
 
-    name = member.get_info("utf-8", None)["name"]
-    verb("Untar %s to %s" % (name, output))
-
-    member.name = os.path.basename(output)
-    tar.extract(member, pathname(output))
-
-def untargz_members(archive, pairs):
-    def get(tarinfo, field):
-        return tarinfo.get_info("utf-8", None)[field]
-
-    with open_tarfile(archive) as t:
-        members = t.getmembers()
-
-        for pattern, output in pairs:
-            # Poor man's glob
-            if pattern.endswith("*"):
-                for info in members:
-                    member = get(info, "name")
-                    base = os.path.basename(member)
-                    dest = joinpath(output, base)
-                    if member.startswith(pattern[:-1]):
-                        untar_member(t, info, dest)
-            else:
-                for info in members:
-                    member = get(info, "name")
-                    if member == pattern:
-                        base = os.path.basename(member)
-                        dest = joinpath(output, base)
-                        untar_member(t, info, output)
-                        break
-
-def extract(archive, pairs):
-  """Extract member from archive and save to output filename."""
   verb("Extracting %s" % archive)
+  with Archive(archive, reuse=reuse) as a:
+    a.extract_pairs(pairs)
+    return a.reused
 
-  base, ext = os.path.splitext(archive)
-  if ext == ".zip":
-      unzip_members(archive, pairs)
-  elif archive.endswith(".tar.gz"):
-      untargz_members(archive, pairs)
-  else:
-      print("Error: Unknown archive type: %s" % archive)
+def expandvars(package, s, **paths):
+  """Expands {variables} in s for the given script.
 
-def expandvars(name, s):
+  Keyword arguments override variables, e.g. install."""
   variables = {
-      "bundle": getpath("bundle", name),
-      "download": getpath("download", name),
+      "bundle": getpath("bundle", package),
+      "download": getpath("download", package),
       "colors": getpath("colors"),
-      "install": getpath("install", name),
-      "name": name,
-      "fullname": get_full_name(name),
-      "shortname": get_short_name(name),
+      "install": getpath("install", package),
+      "name": package,
+      "fullname": get_full_name(package),
+      "shortname": get_short_name(package),
       "vim": getpath("vim"),
       "CR": "\r\n",
   }
+  variables.update(paths)
   return s.format(**variables)
 
-def install_script(name, script):
-  print("Installing %s" % name)
+def listfiles(path):
+  """Returns relative paths of all files below path."""
+  files = []
+  for root, _, names in os.walk(path):
+    for n in names:
+      files.append(os.path.relpath(joinpath(root, n), path))
+  return files
+
+def install_script(name, script, requested=False, previous=None):
+  """Installs a script and records it in the state database.
+
+  Set requested if the user asked for the package, as opposed to it being
+  installed as a dependency.
+
+  If previous is the full name of an installed version of the package, it
+  is upgraded: files that have not changed are hardlinked from it instead
+  of written, its symlinks are swapped for the new ones, and then it is
+  removed.  The new version is linked under the same name as the old one."""
+  from vimp.helptags import helptags
+  from vimp.objects import ObjectStore
+  from vimp.transaction import Transaction
+
+  full = get_full_name(name)
+  if previous is None:
+    print("Installing %s" % name)
+  else:
+    print("Upgrading %s to %s" % (previous, full))
+  txn = Transaction(getstate(), full, getpath("install", name),
+                    getpath("journal"))
+  old = getstate().get(previous) if previous is not None else None
+  if old is not None:
+    short = old["name"]
+    names = {"name": short, "shortname": short,
+             "bundle": getpath("bundle", previous)}
+  else:
+    short = get_short_name(name)
+    names = {}
 
   def expand(s):
-    return expandvars(name, s)
+    return expandvars(name, s, **names)
 
-  def expand_all(pairs):
+  def stage(s):
+    # Files are written to the staging directory until they are published
+    return expandvars(name, s, install=txn.staging, **names)
+
+  def stage_all(pairs):
       out = []
       for a, b in pairs:
-          out.append((expand(a), expand(b)))
+          out.append((stage(a), stage(b)))
       return out
 
   archive = None
-
-  if "download" in script:
-    url, archive = script["download"]
-    archive = joinpath(getpath("download", name), expand(archive))
-    download(url, archive)
-
-  if "extract" in script:
-    extract(archive, expand_all(script["extract"]))
-
-  if "embed" in script:
-    for (filename, text) in script["embed"]:
-      filename = expand(filename)
-      text = expand(text)
-      mkdir(pathname(filename))
-      with open(filename, "wt") as f:
-          f.write(text)
-
-  if "copy" in script:
-    for (src, dst) in script["copy"]:
-      mkdir(pathname(expand(dst)))
-      copyfile(expand(src), expand(dst))
-
-  if "symlink" in script:
-    for (src, dst) in script["symlink"]:
-      symlink(expand(src), expand(dst))
-
-  # Add helptags
-  if not name.startswith("pathogen"):
-    vimrc = helptags(name, expand("{bundle}/doc")).split("\n")
-    vimrc = vimrc[0:-1]
-  else:
-    vimrc = []
-  if "vimrc" in script:
-      vimrc += script["vimrc"]
-  add_vimprc(name, vimrc)
+  url = None
+  sha256 = None
+  commit = None
+
+  source = getsource(name, script)
+  if source is not None:
+    url, archive, options = source
+    download(url, archive, **options)
+    if "git" in script:
+      from vimp.git import revision
+      commit = revision(getpath("git"), url, full)
+    else:
+      sha256 = script.get("sha256") or getcache().digest(url)
+
+  def previous_file(dst):
+    # The file in the previous version at the same place as dst
+    return joinpath(getpath("install", previous),
+                    os.path.relpath(dst, txn.staging))
+
+  with txn:
+    unchanged = 0
+    if "extract" in script:
+      unchanged = extract(archive, stage_all(script["extract"]),
+                          previous_file if old is not None else None)
+
+    # Files below are never written through, since an extracted file may be
+    # hardlinked to the previous version
+    if "embed" in script:
+      for (filename, text) in script["embed"]:
+        filename = stage(filename)
+        text = expand(text)
+        mkdir(pathname(filename))
+        unlink(filename)
+        with open(filename, "wt") as f:
+            f.write(text)
+
+    if "copy" in script:
+      for (src, dst) in script["copy"]:
+        mkdir(pathname(stage(dst)))
+        unlink(stage(dst))
+        copyfile(stage(src), stage(dst))
+
+    # Generate help tags here, so vim never has to at startup
+    docdir = stage("{install}/doc")
+    if os.path.isdir(docdir):
+      helptags(docdir)
+
+    # Share files with the same contents as those of other packages
+    shared, saved = ObjectStore(getpath("objects")).dedup(txn.staging)
+    if shared > 0:
+      verb("Shared %d files (%s) of %s with other packages" % (
+           shared, formatsize(saved), full))
+
+    txn.publish()
+
+    links = [(expand(src), expand(dst))
+             for (src, dst) in script.get("symlink", [])]
+    for (src, dst) in links:
+      txn.link(src, dst)
+
+    files = listfiles(getpath("install", name))
+    if old is not None:
+      requested = requested or old.get("requested", False)
+    getstate().add(full, short, files, links,
+                   requested=requested, url=url, sha256=sha256,
+                   commit=commit)
+    if old is not None and old.get("lazy"):
+      getstate().set_lazy(full, True)
 
   # Remove download
   unlinktree(getpath("download", get_full_name(name)))
 
+  if old is not None:
+    verb("%d of %d files in %s were unchanged" % (unchanged, len(files),
+                                                  full))
+    for (src, dst) in old["symlinks"]:
+      if (src, dst) not in links and readlink(dst) == src:
+        unlink(dst)
+    unlinktree(getpath("install", previous))
+    getstate().remove(previous)
+
   if "print" in script:
       for line in script["print"]:
           print(expand(line))
 
 def get_script(name):
     # Lookup aliases first
-    if name in ALIASES.keys():
-      name = ALIASES[name]
+    name = get_full_name(name)
 
-    if name in SCRIPTS.keys():
-        script = SCRIPTS[name]
+    script = getcatalog().get(name)
+    if script is not None:
         script["name"] = name
         return script
     else:
@@ -325,36 +596,107 @@ def get_script(name):
         sys.exit(1)
 
 def isinstalled(name):
-    """Check if script is installed."""
-    def yes(): verb("Is installed %s? Yes" % name); return True
-    def no(): verb("Is installed %s? No" % name); return False
-
-    # Special handling for pathogen
-    if name == "pathogen":
-        path = joinpath(getpath("vim"), "autoload", "pathogen.vim")
-        if exists(path):
-          return yes()
-        else:
-          return no()
+    """Check if script is installed and enabled."""
+    installed = getstate().isinstalled(get_full_name(name))
 
-    # First of all, the install directory must exist
-    if not exists(getpath("install", name)):
-      return no()
+    # Special handling for pathogen, which may have been installed by hand
+    if not installed and name == "pathogen":
+      installed = exists(joinpath(getpath("vim"), "autoload", "pathogen.vim"))
 
-    # Now we check that all symlinks have been installed (we check that
-    # these are _actual_ symlinks pointing to .vimp/installed).
-    s = get_script(name)
-    for (src, dst) in s["symlink"]:
-      src = expandvars(name, src)
-      dst = expandvars(name, dst)
+    verb("Is installed %s? %s" % (name, "Yes" if installed else "No"))
+    return installed
 
-      if not exists(src):
-        return no()
+def probe(name):
+    """Inspects the filesystem to see if a script is installed.
 
-      if not exists(dst):
-        return no()
+    Returns a state record for the script as found on disk, or None if it
+    is not installed.  This is slow, so it is only used to check and
+    rebuild the state database."""
+    full = get_full_name(name)
+    s = get_script(full)
+
+    # First of all, the install directory must exist
+    install = getpath("install", full)
+    if not os.path.isdir(install):
+      return None
 
-      if readlink(dst) != src:
-        return no()
+    # Now we check that all symlinks have been installed (we check that
+    # these are _actual_ symlinks pointing to .vimp/installed).
+    links = [(expandvars(full, src), expandvars(full, dst))
+             for (src, dst) in s.get("symlink", [])]
+    enabled = all(exists(src) and readlink(dst) == src for (src, dst) in links)
 
-    return yes()
+    return {
+      "name": get_short_name(full),
+      "files": listfiles(install),
+      "symlinks": links,
+      "enabled": enabled,
+    }
+
+def reconcile(state, dry_run=False):
+    """Updates state to match what is installed on disk.
+
+    Returns list of (full name, description of change)."""
+    changes = []
+    with state.batch():
+      catalog = getcatalog()
+      for full in catalog.names():
+        found = probe(full)
+        entry = state.get(full)
+        if found is None and entry is not None:
+          changes.append((full, "recorded as installed, but is missing"))
+          if not dry_run:
+            state.remove(full)
+        elif found is not None and entry is None:
+          changes.append((full, "installed, but not recorded"))
+          if not dry_run:
+            state.add(full, found["name"], found["files"], found["symlinks"],
+                      enabled=found["enabled"], requested=True)
+        elif found is not None and found["enabled"] != entry["enabled"]:
+          changes.append((full, "recorded as %s, but is %s" % (
+            "enabled" if entry["enabled"] else "disabled",
+            "enabled" if found["enabled"] else "disabled")))
+          if not dry_run:
+            state.set_enabled(full, found["enabled"])
+      for full in state.installed(enabled=False):
+        if full not in catalog:
+          changes.append((full, "recorded as installed, but is unknown"))
+          if not dry_run:
+            state.remove(full)
+    return changes
+
+_state = None
+_loading = None
+
+def getstate():
+    """Returns the installed-state database.
+
+    The first time vimp runs with a state database, it is built by
+    inspecting what is already installed."""
+    from vimp.state import State
+    global _state
+    global _loading
+    if _state is None:
+      with _lock:
+        if _state is None:
+          # Building the state needs it, e.g. to expand {bundle}, and only
+          # this thread can get here while it is being built
+          if _loading is not None:
+            return _loading
+          with profile.phase("load state"):
+            _loading = State(getpath("state"))
+            try:
+              if _loading.exists:
+                _loading.load()
+              else:
+                verb("Building installed-state database")
+                reconcile(_loading)
+                _loading.save()
+              if os.path.isdir(getpath("journal")):
+                from vimp.transaction import recover
+                recover(_loading, getpath("journal"))
+              # Other threads only see the state once it is complete
+              _state = _loading
+            finally:
+              _loading = None
+    return _state
@@ -0,0 +1,138 @@
+"""
+Generates vimscript that loads plugins on first use.
+
+A package that is loaded lazily is left out of pathogen's runtimepath with
+g:pathogen_disabled, and stubs for its triggers are put in .vimp/vimrc
+instead.  The first time a trigger fires, the bundle is added to the
+runtimepath, its plugin files are sourced and the trigger is replayed.
+
+Recipes declare their triggers in a "lazy" entry:
+
+    "lazy": {"commands":  ["NERDTreeToggle", "NERDTree"],
+             "mappings":  ["<Leader>cc"],
+             "filetypes": ["python"],
+             "events":    ["CursorHold"]}
+
+A stub command with each name is defined, as well as normal and visual
+mode stub mappings for each key sequence, which are typed again once the
+plugin has made its own mappings.  The plugin is also loaded when a buffer
+gets one of the file types, or when one of the events fires.  Plugins that
+must be there when vim starts, like statuslines, should not be lazy.
+With the native backend, lazy plugins are in ~/.vim/pack/vimp/opt, and are
+loaded with :packadd instead.
+
+Copyright (C) 2014 Christian Stigen Larsen
+Distributed under the LGPL v2.1; see LICENSE.txt
+"""
+
+import re
+
+# Trigger kinds a recipe may list under "lazy".
+TRIGGERS = ("commands", "mappings", "filetypes", "events")
+
+LOADER = """
+" ==== lazy loading ====
+let g:vimp_lazy_loaded = []
+
+function! VimpLazyLoad(name, path, commands, mappings)
+  if index(g:vimp_lazy_loaded, a:name) >= 0
+    return
+  endif
+  call add(g:vimp_lazy_loaded, a:name)
+  for cmd in a:commands
+    silent! execute 'delcommand ' . cmd
+  endfor
+  for lhs in a:mappings
+    silent! execute 'nunmap ' . lhs
+    silent! execute 'xunmap ' . lhs
+  endfor
+  execute 'augroup vimp_lazy_' . substitute(a:name, '\\W', '_', 'g')
+        \\ . ' | autocmd! | augroup END'
+  if a:path == ''
+    execute 'packadd ' . fnameescape(a:name)
+    return
+  endif
+  execute 'set runtimepath^=' . fnameescape(a:path)
+  execute 'set runtimepath+=' . fnameescape(a:path . '/after')
+  for file in glob(a:path . '/plugin/**/*.vim', 0, 1)
+        \\ + glob(a:path . '/after/plugin/**/*.vim', 0, 1)
+    execute 'source ' . fnameescape(file)
+  endfor
+endfunction
+
+function! VimpLazyCommand(name, path, commands, mappings, cmd, bang, args)
+  call VimpLazyLoad(a:name, a:path, a:commands, a:mappings)
+  execute a:cmd . a:bang . ' ' . a:args
+endfunction
+
+function! VimpLazyMap(name, path, commands, mappings, lhs, prefix)
+  call VimpLazyLoad(a:name, a:path, a:commands, a:mappings)
+  let lhs = substitute(a:lhs, '\\c<Leader>',
+        \\ '\\=get(g:, "mapleader", "\\\\")', 'g')
+  call feedkeys(a:prefix . eval('"' . escape(lhs, '\\"<') . '"'), 'i')
+endfunction
+"""
+
+def quote(s):
+    """Returns s as a single-quoted vimscript string."""
+    return "'%s'" % s.replace("'", "''")
+
+def triggers(script):
+    """Returns the lazy triggers of a recipe, or None if it has none."""
+    lazy = script.get("lazy")
+    if not lazy or not any(lazy.get(kind) for kind in TRIGGERS):
+        return None
+    return lazy
+
+def maparg(s):
+    """Returns s escaped for use in the right-hand side of a mapping."""
+    return s.replace("<", "<lt>").replace("|", "<Bar>")
+
+def render_disabled(names):
+    """Returns vimscript that keeps pathogen from loading the bundles."""
+    return "let g:pathogen_disabled = get(g:, 'pathogen_disabled', []) " \
+           "+ [%s]\n" % ", ".join(quote(n) for n in names)
+
+def render_stubs(packages):
+    """Returns vimscript with the loader and stubs for lazy packages.
+
+    packages is a list of (name, bundle path, triggers).  An empty path
+    means the package is in pack/*/opt, and is loaded with :packadd."""
+    if len(packages) == 0:
+        return ""
+
+    out = [LOADER]
+    for (name, path, lazy) in packages:
+        commands = lazy.get("commands", [])
+        mappings = lazy.get("mappings", [])
+        args = "%s, %s, [%s], [%s]" % (quote(name), quote(path),
+                                       ", ".join(quote(c) for c in commands),
+                                       ", ".join(quote(m) for m in mappings))
+        out.append("\n\" ==== %s (lazy) ====\n" % name)
+        for cmd in commands:
+            out.append("command! -nargs=* -bang -complete=file %s "
+                       "call VimpLazyCommand(%s, %s, '<bang>', <q-args>)\n"
+                       % (cmd, args, quote(cmd)))
+        for lhs in mappings:
+            out.append("nnoremap <silent> %s :<C-u>call VimpLazyMap(%s, "
+                       "%s, '')<Cr>\n" % (lhs, maparg(args),
+                                          maparg(quote(lhs))))
+            out.append("xnoremap <silent> %s :<C-u>call VimpLazyMap(%s, "
+                       "%s, 'gv')<Cr>\n" % (lhs, maparg(args),
+                                            maparg(quote(lhs))))
+
+        autocmds = []
+        if lazy.get("filetypes"):
+            autocmds.append(
+              "  autocmd FileType %s nested call VimpLazyLoad(%s) "
+              "| execute 'doautocmd FileType ' . &filetype\n"
+              % (",".join(lazy["filetypes"]), args))
+        for event in lazy.get("events", []):
+            autocmds.append("  autocmd %s * call VimpLazyLoad(%s)\n" % (
+                            event, args))
+        if len(autocmds) > 0:
+            out.append("augroup vimp_lazy_%s\n" % re.sub(r"\W", "_", name))
+            out.append("  autocmd!\n")
+            out.extend(autocmds)
+            out.append("augroup END\n")
+    return "".join(out)
@@ -0,0 +1,95 @@
+"""
+Lockfiles that pin the exact set of installed packages.
+
+A lockfile is JSON, and maps the full name of each installed package to its
+short name, the URL it was downloaded from, the SHA-256 digest of the
+download, whether it was installed on request or as a dependency, and
+whether it is loaded lazily.  Packages fetched with git record the commit
+instead of a digest.  It is written by `vimp lock` and read by `vimp sync`.
+
+Copyright (C) 2014 Christian Stigen Larsen
+Distributed under the LGPL v2.1; see LICENSE.txt
+"""
+
+import json
+import os
+
+from vimp.util import VimpError
+
+# Lockfile format version.
+VERSION = 1
+
+class LockError(VimpError):
+    """A lockfile cannot be read."""
+    pass
+
+def lock_entries(state, catalog, cache):
+    """Returns lockfile entries for the enabled packages in state.
+
+    Packages installed before vimp recorded URLs and digests are looked up
+    in the catalog and download cache instead."""
+    packages = {}
+    for full in state.installed():
+        entry = state.get(full)
+        url = entry.get("url")
+        sha256 = entry.get("sha256")
+        if url is None and full in catalog:
+            script = catalog.get(full)
+            if "download" in script:
+                url = script["download"][0]
+                sha256 = script.get("sha256")
+        if url is not None and sha256 is None and entry.get("commit") is None:
+            sha256 = cache.digest(url)
+        packages[full] = {
+            "name": entry["name"],
+            "url": url,
+            "sha256": sha256,
+            "requested": entry.get("requested", False),
+            "lazy": entry.get("lazy", False),
+        }
+        if entry.get("commit") is not None:
+            packages[full]["commit"] = entry["commit"]
+    return packages
+
+def compare(current, locked):
+    """Compares the lockfile entries of what is installed with those of a
+    lockfile.
+
+    Returns sorted full names of the packages in both that were installed
+    from another download or commit than the locked one, and of those whose
+    lazy setting differs."""
+    changed = []
+    lazy = []
+    for full in sorted(set(current) & set(locked)):
+        for key in ("sha256", "commit"):
+            if locked[full].get(key) is not None and \
+                    current[full].get(key) != locked[full][key]:
+                changed.append(full)
+                break
+        if current[full].get("lazy", False) != \
+                locked[full].get("lazy", False):
+            lazy.append(full)
+    return (changed, lazy)
+
+def write_lock(path, packages):
+    """Atomically writes lockfile entries to path."""
+    temp = "%s.%d" % (path, os.getpid())
+    with open(temp, "wt") as f:
+        json.dump({"version": VERSION, "packages": packages}, f, indent=1,
+                  sort_keys=True)
+        f.write("\n")
+    os.rename(temp, path)
+
+def read_lock(path):
+    """Returns the entries of the lockfile at path."""
+    try:
+        with open(path, "rt") as f:
+            data = json.load(f)
+    except (IOError, OSError) as e:
+        raise LockError("Cannot read lockfile %s: %s" % (path, e))
+    except ValueError as e:
+        raise LockError("Lockfile %s is not valid JSON: %s" % (path, e))
+
+    if not isinstance(data, dict) or data.get("version") != VERSION:
+        raise LockError("Lockfile %s has an unknown format" % path)
+    return data.get("packages", {})
@@ -0,0 +1,123 @@
+"""
+Content-addressed store of installed files.
+
+Files that are the same in several installed packages, like two versions of
+a plugin, or nerdtree and nerdtree@ctrl-d, are kept once in ~/.vimp/objects
+under their SHA-256 digest, and hardlinked into each install directory.
+This saves disk space, and since the copies are one file, vim reads them
+through the same pages of the page cache.
+
+Files in install directories are never written through, but replaced, so
+changing one package never changes another.  An object that is only linked
+from the store itself is no longer used, and is removed by `vimp gc`.
+
+Copyright (C) 2014 Christian Stigen Larsen
+Distributed under the LGPL v2.1; see LICENSE.txt
+"""
+
+import errno
+import os
+
+from vimp.cache import sha256sum
+from vimp.log import verb
+from vimp.util import (joinpath, mkdir, pathname)
+
+class ObjectStore(object):
+    """Deduplicated file contents, hardlinked into install directories."""
+    def __init__(self, path):
+        self.path = path
+
+    def objectpath(self, sha256):
+        """Returns path to the object with the given digest."""
+        return joinpath(self.path, sha256[:2], sha256)
+
+    def add(self, filename):
+        """Replaces filename with a hardlink to the object with its contents,
+        adding it to the store if it is new.
+
+        Returns the number of bytes saved, which is the size of the file if
+        the store already had it."""
+        sha256 = sha256sum(filename)
+        path = self.objectpath(sha256)
+        st = os.lstat(filename)
+        mkdir(pathname(path))
+        try:
+            os.link(filename, path)
+            return 0
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                # E.g. the store is on another filesystem
+                verb("Cannot add %s to object store: %s" % (filename, e))
+                return 0
+
+        old = os.lstat(path)
+        if (old.st_dev, old.st_ino) == (st.st_dev, st.st_ino):
+            return 0
+        if old.st_size != st.st_size or sha256sum(path) != sha256:
+            # Someone has edited an installed file in place
+            verb("Replacing changed object %s" % path)
+            self._replace(filename, path)
+            return 0
+        temp = "%s.vimp-%d" % (filename, os.getpid())
+        try:
+            os.link(path, temp)
+            os.rename(temp, filename)
+        except OSError as e:
+            verb("Cannot link %s to %s: %s" % (filename, path, e))
+            if os.path.lexists(temp):
+                os.unlink(temp)
+            return 0
+        return st.st_size
+
+    def _replace(self, filename, path):
+        temp = "%s.vimp-%d" % (path, os.getpid())
+        try:
+            os.link(filename, temp)
+            os.rename(temp, path)
+        except OSError as e:
+            verb("Cannot replace %s: %s" % (path, e))
+            if os.path.lexists(temp):
+                os.unlink(temp)
+
+    def dedup(self, root):
+        """Adds all files below root to the store.
+
+        Returns the number of files and bytes saved."""
+        files, saved = 0, 0
+        for base, _, names in os.walk(root):
+            for name in names:
+                filename = joinpath(base, name)
+                if os.path.isfile(filename) and not os.path.islink(filename):
+                    size = self.add(filename)
+                    if size > 0:
+                        files += 1
+                        saved += size
+        return (files, saved)
+
+    def objects(self):
+        """Yields (path, stat) of each object."""
+        if not os.path.isdir(self.path):
+            return
+        for prefix in sorted(os.listdir(self.path)):
+            directory = joinpath(self.path, prefix)
+            for name in sorted(os.listdir(directory)):
+                path = joinpath(directory, name)
+                yield (path, os.lstat(path))
+
+    def stats(self):
+        """Returns (number of objects, their size, bytes saved by sharing)."""
+        count, size, saved = 0, 0, 0
+        for (_, st) in self.objects():
+            count += 1
+            size += st.st_size
+            # One link is the store's own, and one is the first user's
+            saved += st.st_size * max(0, st.st_nlink - 2)
+        return (count, size, saved)
+
+    def unused(self):
+        """Returns paths of objects that no install directory links to."""
+        return [path for (path, st) in self.objects() if st.st_nlink == 1]
+
+    def inodes(self):
+        """Returns the set of (device, inode) of the objects."""
+        return set((st.st_dev, st.st_ino) for (_, st) in self.objects())
@@ -0,0 +1,135 @@
+"""
+Packed mode, which merges plugins into a single runtimepath entry.
+
+Pathogen adds one runtimepath entry for each bundle, and vim searches all
+of them whenever it looks for a runtime file.  In packed mode, vimp instead
+builds one tree in ~/.vimp/packed with a symlink for each runtime file of
+the enabled plugins, and makes it the only bundle pathogen loads for them.
+With the native backend, the tree is a start package instead, and the
+merged plugins are moved to opt/.
+
+Two plugins that have a file with the same path cannot be merged, so they
+are reported and left as ordinary bundles.  Each plugin's doc/tags is left
+out, and tags for the merged doc directory are generated instead.  The
+links in the tree are recorded in a manifest, so that enabling or disabling
+a plugin only adds or removes its own links.
+
+Copyright (C) 2014 Christian Stigen Larsen
+Distributed under the LGPL v2.1; see LICENSE.txt
+"""
+
+import json
+import os
+
+from vimp.helptags import helptags
+from vimp.log import verb
+from vimp.util import (joinpath, mkdir, pathname, readlink, symlink)
+
+# Name of the bundle pathogen sees the packed tree as.
+BUNDLE = "vimp-packed"
+
+# Directories of a plugin that are merged.  Other files, like READMEs, are
+# not looked up through the runtimepath.
+RUNTIME_DIRS = ("after", "autoload", "colors", "compiler", "doc", "ftdetect",
+                "ftplugin", "indent", "keymap", "lang", "macros", "plugin",
+                "spell", "syntax")
+
+def runtimefiles(root):
+    """Returns relative paths of the runtime files of a plugin."""
+    files = []
+    for top in RUNTIME_DIRS:
+        for base, _, names in os.walk(joinpath(root, top)):
+            for name in names:
+                rel = os.path.relpath(joinpath(base, name), root)
+                if rel != joinpath("doc", "tags"):
+                    files.append(rel)
+    return sorted(files)
+
+def plan(packages):
+    """Decides how to merge plugins.
+
+    packages is a list of (full name, plugin directory).  Returns a dict of
+    relative path to link target, the full names of the merged plugins, and
+    a list of (relative path, full names) for files in more than one."""
+    owners = {}
+    files = {}
+    for (full, root) in packages:
+        files[full] = runtimefiles(root)
+        for rel in files[full]:
+            owners.setdefault(rel, []).append(full)
+
+    conflicts = sorted((rel, sorted(names)) for (rel, names) in owners.items()
+                       if len(names) > 1)
+    excluded = set(full for (_, names) in conflicts for full in names)
+
+    links = {}
+    packed = []
+    for (full, root) in packages:
+        if full in excluded:
+            continue
+        packed.append(full)
+        for rel in files[full]:
+            links[rel] = joinpath(root, rel)
+    return (links, sorted(packed), conflicts)
+
+def load_manifest(path):
+    """Returns the manifest of a packed tree, or an empty one."""
+    if not os.path.exists(path):
+        return {"links": {}, "packages": []}
+    with open(path, "rt") as f:
+        return json.load(f)
+
+def save_manifest(path, manifest):
+    temp = "%s.%d" % (path, os.getpid())
+    with open(temp, "wt") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.rename(temp, path)
+
+def prune(path, rel):
+    """Removes directories below path left empty by removing rel."""
+    parent = pathname(rel)
+    while len(parent) > 0:
+        directory = joinpath(path, parent)
+        if not os.path.isdir(directory) or len(os.listdir(directory)) > 0:
+            break
+        os.rmdir(directory)
+        parent = pathname(parent)
+
+def build(path, manifest, links, packed):
+    """Updates the packed tree at path to contain links.
+
+    Only links that differ from those in the manifest file are changed.
+    Returns the number of links added and removed."""
+    old = load_manifest(manifest)["links"]
+    removed = 0
+    for rel in sorted(old):
+        if links.get(rel) != old[rel] and os.path.lexists(joinpath(path, rel)):
+            os.unlink(joinpath(path, rel))
+            prune(path, rel)
+            removed += 1
+
+    added = 0
+    for rel in sorted(links):
+        dst = joinpath(path, rel)
+        if readlink(dst) != links[rel]:
+            symlink(links[rel], dst)
+            added += 1
+
+    doc = joinpath(path, "doc")
+    tags = joinpath(doc, "tags")
+    if os.path.isdir(doc) and any(n.endswith(".txt") for n in os.listdir(doc)):
+        if added > 0 or removed > 0 or not os.path.exists(tags):
+            helptags(doc)
+    elif os.path.exists(tags):
+        os.unlink(tags)
+        prune(path, joinpath("doc", "tags"))
+
+    mkdir(path)
+    save_manifest(manifest, {"links": links, "packages": packed})
+    verb("Packed %d plugins into %s: %d links added, %d removed" % (
+         len(packed), path, added, removed))
+    return (added, removed)
+
+def packed_names(manifest):
+    """Returns the full names of the plugins in the packed tree."""
+    return load_manifest(manifest)["packages"]
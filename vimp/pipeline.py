@@ -0,0 +1,189 @@
+"""
+Pipelined installation of vim packages.
+
+Downloads run in one pool of workers, and each package is extracted and
+linked in another as soon as its own archive and its dependencies are in
+place, while other downloads are still in flight.
+
+Copyright (C) 2014 Christian Stigen Larsen
+Distributed under the LGPL v2.1; see LICENSE.txt
+"""
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from vimp.download import Downloader
+from vimp.install import (
+    download,
+    get_full_name,
+    get_script,
+    get_short_name,
+    getcatalog,
+    getsource,
+    getstate,
+    install_script,
+    isinstalled,
+)
+from vimp.log import verb
+from vimp.pool import WorkerPool
+from vimp.resolve import resolve
+
+class Package(object):
+    """A package being installed, and what it is waiting for."""
+    def __init__(self, name, script):
+        self.name = name
+        self.script = script
+        self.waiting = set()
+        self.dependents = set()
+        self.downloaded = "download" not in script and "git" not in script
+        self.submitted = False
+        self.error = None
+
+    @property
+    def ready(self):
+        return self.downloaded and len(self.waiting) == 0
+
+def plan(names):
+    """Returns dict of Packages that must be installed for names.
+
+    Packages are keyed by short name.  Packages that are already installed
+    are left out, and packages in a dependency cycle do not wait for each
+    other, so that a cycle cannot stall the pipeline."""
+    resolved = resolve(getcatalog(), names,
+                       skip=lambda full: isinstalled(get_short_name(full)),
+                       installed=getstate().installed())
+    for cycle in resolved.cycles:
+        print("Warning: Dependency cycle between %s" % " and ".join(cycle))
+
+    packages = {}
+    for full in resolved.order:
+        name = get_short_name(full)
+        packages[name] = Package(name, get_script(full))
+
+    for full in resolved.order:
+        name = get_short_name(full)
+        cycle = resolved.cycle(full)
+        for dep in resolved.deps[full]:
+            if dep not in cycle:
+                packages[name].waiting.add(get_short_name(dep))
+                packages[get_short_name(dep)].dependents.add(name)
+    return packages
+
+def pin(script, url, sha256, commit=None):
+    """Returns copy of a script that downloads from url with digest sha256.
+
+    Scripts fetched with git are pinned to commit instead."""
+    script = dict(script)
+    if "download" in script:
+        script["download"] = (url or script["download"][0],
+                              script["download"][1])
+        script["sha256"] = sha256 or script.get("sha256")
+    if "git" in script:
+        script["git"] = (url or script["git"][0], commit or script["git"][1])
+    return script
+
+def install_all(names, jobs=None, pins=None, requested=None):
+    """Downloads and installs names and their dependencies.
+
+    pins maps short names to dicts whose "url" and "sha256" (or "commit")
+    override those of the script.  requested holds the names that were
+    asked for, as opposed to being dependencies; it defaults to names.
+
+    Returns dict of package name to error for packages that failed."""
+    packages = plan(names)
+    if requested is None:
+        requested = names
+    requested = set(get_short_name(get_full_name(n)) for n in requested)
+    for (name, pinned) in (pins or {}).items():
+        if name in packages:
+            packages[name].script = pin(packages[name].script,
+                                        pinned.get("url"),
+                                        pinned.get("sha256"),
+                                        pinned.get("commit"))
+    for name in names:
+        if get_short_name(get_full_name(name)) not in packages:
+            print("%s is already installed" % name)
+    if len(packages) == 0:
+        return {}
+
+    # Events from worker threads are handled on this thread only
+    events = queue.Queue()
+    failed = {}
+
+    def fail(package, error):
+        if package.error is not None:
+            return
+        package.error = error
+        failed[package.name] = error
+        for name in package.dependents:
+            fail(packages[name], "depends on %s, which failed" % package.name)
+
+    def downloaded(result):
+        events.put(("downloaded", result.name, result.error))
+
+    def installed(task):
+        events.put(("installed", task.args[0], task.error))
+
+    downloads = []
+    for name in sorted(packages):
+        package = packages[name]
+        if package.script.get("deps"):
+            print("%s depends on %s" % (name,
+                                        " ".join(package.script["deps"])))
+        if not package.downloaded:
+            url, archive, options = getsource(name, package.script)
+            downloads.append((name, url, archive, options))
+
+    if len(downloads) > 1:
+        print("Downloading %d packages in parallel: %s" % (
+          len(downloads), " ".join(d[0] for d in downloads)))
+    elif len(downloads) == 1:
+        print("Downloading %s" % downloads[0][0])
+
+    installer = WorkerPool(jobs)
+    loader = Downloader(jobs, callback=downloaded, fetcher=download)
+
+    def submit_ready():
+        for package in packages.values():
+            if package.ready and not package.submitted and \
+                    package.error is None:
+                verb("Scheduling install of %s" % package.name)
+                package.submitted = True
+                installer.submit(install_script,
+                                 (package.name, package.script,
+                                  package.name in requested),
+                                 callback=installed)
+
+    def finished():
+        return all(p.error is not None or p.name in done
+                   for p in packages.values())
+
+    done = set()
+    with installer:
+        with loader:
+            for (name, url, archive, options) in downloads:
+                loader.add(name, url, archive, **options)
+
+            submit_ready()
+            while not finished():
+                try:
+                    event, name, error = events.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+
+                package = packages[name]
+                if error is not None:
+                    fail(package, error)
+                elif event == "downloaded":
+                    package.downloaded = True
+                elif event == "installed":
+                    done.add(name)
+                    for dependent in package.dependents:
+                        packages[dependent].waiting.discard(name)
+                submit_ready()
+
+    for name in sorted(failed):
+        print("Error: Could not install %s: %s" % (name, failed[name]))
+    return failed
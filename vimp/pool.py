@@ -0,0 +1,149 @@
+"""
+A small bounded pool of worker threads.
+
+Copyright (C) 2014 Christian Stigen Larsen
+Distributed under the LGPL v2.1; see LICENSE.txt
+"""
+
+import threading
+import traceback
+
+from vimp.log import verb
+
+# Default number of worker threads, can be changed with `vimp -j N`.
+JOBS = 8
+
+def setjobs(count):
+    """Set the default number of worker threads."""
+    global JOBS
+    JOBS = max(1, int(count))
+
+class Task(object):
+    """A unit of work submitted to a WorkerPool."""
+    def __init__(self, function, args, key, callback):
+        self.function = function
+        self.args = args
+        self.key = key
+        self.callback = callback
+        self.result = None
+        self.error = None
+        self.traceback = None
+        self.done = False
+
+    def __str__(self):
+        return "<Task key=%s done=%s error=%s>" % (self.key, self.done,
+                                                   self.error)
+
+class WorkerPool(object):
+    """Runs tasks on a fixed number of threads.
+
+    Tasks can be given a key (e.g. a hostname), and at most `limits[key]`
+    (or `default_limit`) tasks with the same key will run at the same time.
+    Exceptions raised by tasks are stored in `Task.error` instead of
+    propagating, so one failing task does not stop the others.
+    """
+    def __init__(self, jobs=None, limits=None, default_limit=None):
+        self.jobs = jobs if jobs is not None else JOBS
+        self.limits = limits if limits is not None else {}
+        self.default_limit = default_limit
+        self.tasks = []
+        self._pending = []
+        self._active = {}
+        self._running = 0
+        self._workers = []
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ex, bt, a):
+        if ex is not None:
+            self.cancel()
+        else:
+            self.close()
+
+    def _limit(self, key):
+        return self.limits.get(key, self.default_limit)
+
+    def _runnable(self):
+        """Returns index of first pending task that may start, or None."""
+        for index, task in enumerate(self._pending):
+            limit = self._limit(task.key)
+            if limit is None or self._active.get(task.key, 0) < limit:
+                return index
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                index = self._runnable()
+                while index is None:
+                    if self._closed and len(self._pending) == 0:
+                        return
+                    self._cond.wait()
+                    index = self._runnable()
+                task = self._pending.pop(index)
+                self._active[task.key] = self._active.get(task.key, 0) + 1
+
+            try:
+                # Also catch SystemExit, e.g. from sys.exit in a task, since
+                # the task must be accounted for or join() never returns
+                try:
+                    task.result = task.function(*task.args)
+                except BaseException as e:
+                    task.error = e
+                    task.traceback = traceback.format_exc()
+                    verb("Task %s failed: %r" % (task.key, e))
+
+                if task.callback is not None:
+                    try:
+                        task.callback(task)
+                    except BaseException as e:
+                        verb("Callback for task %s failed: %r" % (task.key, e))
+            finally:
+                with self._cond:
+                    self._active[task.key] -= 1
+                    self._running -= 1
+                    task.done = True
+                    self._cond.notify_all()
+
+    def submit(self, function, args=(), key=None, callback=None):
+        """Queues function(*args) and returns its Task."""
+        task = Task(function, args, key, callback)
+        with self._cond:
+            self.tasks.append(task)
+            self._pending.append(task)
+            self._running += 1
+            if len(self._workers) < self.jobs:
+                worker = threading.Thread(target=self._worker)
+                worker.daemon = True
+                self._workers.append(worker)
+                worker.start()
+            self._cond.notify_all()
+        return task
+
+    def join(self):
+        """Waits for all submitted tasks and returns them."""
+        with self._cond:
+            while self._running > 0:
+                # Wait with a timeout so that Ctrl-C gets through.
+                self._cond.wait(0.1)
+        return list(self.tasks)
+
+    def close(self):
+        """Waits for queued tasks to finish and stops the workers."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for worker in self._workers:
+            while worker.is_alive():
+                worker.join(0.1)
+
+    def cancel(self):
+        """Drops queued tasks that have not started, without waiting."""
+        with self._cond:
+            self._running -= len(self._pending)
+            self._pending = []
+            self._closed = True
+            self._cond.notify_all()
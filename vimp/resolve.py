@@ -0,0 +1,172 @@
+"""
+Resolves the dependencies of vim scripts into an installation plan.
+
+The full transitive dependency graph of the requested scripts is read from
+the catalog up front, so that everything can be downloaded at once.  The
+plan lists the scripts in layers: every script depends only on scripts in
+earlier layers, so all scripts in a layer can be installed in parallel.
+Scripts that depend on each other form a cycle, and are placed in the same
+layer.
+
+Copyright (C) 2014 Christian Stigen Larsen
+Distributed under the LGPL v2.1; see LICENSE.txt
+"""
+
+from vimp.log import verb
+from vimp.state import getbasename
+from vimp.util import VimpError
+
+class ResolveError(VimpError):
+    """Dependencies cannot be resolved."""
+    pass
+
+# Dependencies of each script, as full names, per catalog stamp and version.
+_deps = {}
+
+def getdeps(catalog, fullname):
+    """Returns the full names of a script's direct dependencies.
+
+    The result is memoized for as long as the catalog does not change."""
+    memo = _deps.setdefault((catalog.stamp, catalog.version), {})
+    if fullname not in memo:
+        deps = []
+        for dep in catalog.deps(fullname):
+            full = catalog.full_name(dep)
+            if full not in catalog:
+                raise ResolveError("%s depends on unknown script %s" % (
+                    fullname, dep))
+            deps.append(full)
+        memo[fullname] = tuple(deps)
+    return memo[fullname]
+
+class Plan(object):
+    """The scripts to install, and the order to install them in."""
+    def __init__(self, deps, layers, cycles):
+        # Dependencies of each script within the plan
+        self.deps = deps
+        # Lists of scripts that may be installed in parallel
+        self.layers = layers
+        # Lists of scripts that depend on each other
+        self.cycles = cycles
+
+    def __len__(self):
+        return len(self.deps)
+
+    def __contains__(self, fullname):
+        return fullname in self.deps
+
+    @property
+    def order(self):
+        """Returns all scripts, dependencies first."""
+        return [name for layer in self.layers for name in layer]
+
+    def cycle(self, fullname):
+        """Returns the cycle a script is part of, or an empty list."""
+        for cycle in self.cycles:
+            if fullname in cycle:
+                return cycle
+        return []
+
+def components(graph):
+    """Returns the strongly connected components of a graph.
+
+    The graph maps each node to the nodes it has edges to.  Every node is
+    in exactly one component, and a component with more than one node is a
+    cycle.  Uses Tarjan's algorithm, without recursion."""
+    index = {}
+    lowlink = {}
+    stack = []
+    onstack = set()
+    found = []
+
+    for root in sorted(graph):
+        if root in index:
+            continue
+        work = [(root, iter(sorted(graph[root])))]
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        onstack.add(root)
+        while work:
+            node, edges = work[-1]
+            for dep in edges:
+                if dep not in index:
+                    index[dep] = lowlink[dep] = len(index)
+                    stack.append(dep)
+                    onstack.add(dep)
+                    work.append((dep, iter(sorted(graph[dep]))))
+                    break
+                elif dep in onstack:
+                    lowlink[node] = min(lowlink[node], index[dep])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        onstack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    found.append(sorted(component))
+    return found
+
+def resolve(catalog, names, skip=None, installed=()):
+    """Returns a Plan for installing names and their dependencies.
+
+    Scripts for which skip(fullname) is true, e.g. because they are already
+    installed, are left out along with their dependencies.  Raises
+    ResolveError for unknown scripts, and for conflicts: two versions of the
+    same script in the plan, or one in the plan and another installed."""
+    graph = {}
+    pending = []
+    for name in names:
+        full = catalog.full_name(name)
+        if full not in catalog:
+            raise ResolveError("Unknown script: %s" % name)
+        pending.append(full)
+
+    while pending:
+        full = pending.pop()
+        if full in graph or (skip is not None and skip(full)):
+            continue
+        graph[full] = getdeps(catalog, full)
+        pending.extend(graph[full])
+
+    # Drop edges to skipped scripts
+    for full in graph:
+        graph[full] = [dep for dep in graph[full] if dep in graph]
+
+    versions = {}
+    for full in list(graph) + list(installed):
+        versions.setdefault(getbasename(full), set()).add(full)
+    for full in sorted(graph):
+        others = versions[getbasename(full)] - set([full])
+        if len(others) > 0:
+            raise ResolveError("%s conflicts with %s%s" % (full,
+              "installed " if others <= set(installed) else "",
+              " and ".join(sorted(others))))
+
+    # Layer the components of the graph, with cycles collapsed into one node
+    found = components(graph)
+    owner = {}
+    for (number, component) in enumerate(found):
+        for full in component:
+            owner[full] = number
+    waiting = [set(owner[dep] for full in component for dep in graph[full])
+               - set([number]) for (number, component) in enumerate(found)]
+
+    layers = []
+    done = set()
+    while len(done) < len(found):
+        ready = [n for n in range(len(found))
+                 if n not in done and waiting[n] <= done]
+        layers.append(sorted(full for n in ready for full in found[n]))
+        done.update(ready)
+
+    cycles = [c for c in found if len(c) > 1]
+    for (number, layer) in enumerate(layers):
+        verb("Install layer %d: %s" % (number + 1, " ".join(layer)))
+    return Plan(graph, layers, cycles)
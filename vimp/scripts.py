@@ -84,7 +84,12 @@ SCRIPTS = {
                   "{install}/plugin/NERD_commenter.vim") ],
     "symlink": [ ("{install}", "{bundle}") ],
     "print": ["You can use NERDCommenter by typing <leader>cc and <leader>cu",
-              "which will comment and uncomment a line, respectively."]
+              "which will comment and uncomment a line, respectively."],
+    "lazy": {"mappings": ["<Leader>cc", "<Leader>cn", "<Leader>c<Space>",
+                          "<Leader>cm", "<Leader>ci", "<Leader>cs",
+                          "<Leader>cy", "<Leader>c$", "<Leader>cA",
+                          "<Leader>ca", "<Leader>cl", "<Leader>cb",
+                          "<Leader>cu"]},
   },
 
   "l9-1.1": {
@@ -109,6 +114,9 @@ SCRIPTS = {
     "extract": [ ("doc/taglist.txt", "{install}/doc/taglist.txt"),
                  ("plugin/taglist.vim", "{install}/plugin/taglist.vim") ],
     "symlink": [ ("{install}", "{bundle}") ],
+    "lazy": {"commands": ["Tlist", "TlistToggle", "TlistOpen", "TlistClose",
+                          "TlistUpdate", "TlistShowPrototype",
+                          "TlistShowTag"]},
   },
 
   "fuzzyfinder-4.2.2": {
@@ -348,6 +356,9 @@ let g:airline_symbols.linenr = '⭡'
                  ("syntax/nerdtree.vim", "{install}/syntax/nerdtree.vim"), ],
     "symlink": [ ("{install}", "{bundle}") ],
     "print": ["To bind :NERDTreeToggle to CTRL+d, install: nerdtree@ctrl-d"],
+    "lazy": {"commands": ["NERDTree", "NERDTreeToggle", "NERDTreeFind",
+                          "NERDTreeMirror", "NERDTreeClose",
+                          "NERDTreeFromBookmark", "NERDTreeCWD"]},
   },
 
   "nerdtree@ctrl-d": {
@@ -558,6 +569,8 @@ and of course `:help fugitive`.
        "{install}/syntax/undotree.vim") ],
     "symlink": [ ("{install}", "{bundle}") ],
     "print": ["To map :UndotreeToggle to CTRL+u, install: undotree@ctrl-u"],
+    "lazy": {"commands": ["UndotreeToggle", "UndotreeShow", "UndotreeHide",
+                          "UndotreeFocus"]},
   },
 
   "undotree@ctrl-u": {
@@ -801,5 +814,8 @@ and of course `:help fugitive`.
       ("syntastic-3.4.0/syntax_checkers/zsh/zsh.vim", "{install}/syntax_checkers/zsh/zsh.vim"),
     ],
     "symlink": [ ("{install}", "{bundle}") ],
+    "lazy": {"commands": ["SyntasticCheck", "SyntasticInfo", "Errors",
+                          "SyntasticReset", "SyntasticToggleMode"],
+             "events": ["BufWritePre"]},
   },
 }
@@ -0,0 +1,268 @@
+"""
+Search index over the catalog of vim scripts.
+
+The index is built from the compiled catalog the first time `vimp search`
+runs after the catalog has changed, and is memory-mapped on later runs.
+It stores a phonetic key and the keywords of each script, and maps every
+trigram of the script names, keywords and phonetic keys to the scripts
+containing it.  A query only looks at scripts sharing a trigram with it,
+and these are then ranked by how well they match.
+
+The file layout is (all integers are little-endian uint32):
+
+    header    MAGIC, then stamp length, entry count, key count, and the
+              offsets of the entry table, key table, postings and string
+              pool
+    stamp     the stamp and version of the catalog the index was built from
+    entries   per script, in catalog order: (offset, length) of its name,
+              phonetic key and NUL-separated keywords in the string pool
+    keys      per key, sorted: (offset, length) of the key in the string
+              pool, and (index, count) of its postings
+    postings  sorted entry numbers
+    strings   UTF-8 strings
+
+Keys are a trigram prefixed with the field it came from: "n" for names,
+"k" for keywords and "p" for phonetic keys.  The key "s" lists scripts
+with a name, keyword or phonetic key too short to have trigrams.
+
+Copyright (C) 2014 Christian Stigen Larsen
+Distributed under the LGPL v2.1; see LICENSE.txt
+"""
+
+import mmap
+import os
+import struct
+
+from vimp.util import (VimpError, mkdir, pathname)
+
+MAGIC = b"VIMPIDX\x01"
+HEADER = struct.Struct("<8s7I")
+ENTRY = struct.Struct("<6I")
+KEY = struct.Struct("<4I")
+POSTING = struct.Struct("<I")
+
+class SearchIndexError(VimpError):
+    """The search index is missing or damaged."""
+    pass
+
+def phonetic(s):
+    """Returns a phonetic key for a string.
+
+    This is an old heuristic that actually performs quite well: Remove all
+    vowels and compare.  Means that "powrlaine" will match "powerline".
+    Furthermore, remove double letters, and translate some consonants such
+    as C to K, etc."""
+    tr = {"q": "k", "w": "v", "z": "s", "c": "k"}
+    out = []
+    for c in s.lower():
+        c = tr.get(c, c)
+        if c in "aeiouy":
+            continue
+        if len(out) == 0 or out[-1] != c:
+            out.append(c)
+    return "".join(out)
+
+def trigrams(s):
+    """Returns the set of three-character substrings of s."""
+    return set(s[i:i+3] for i in range(len(s) - 2))
+
+def contains(a, b):
+    """Checks if either string is a substring of the other."""
+    return (a in b) or (b in a)
+
+def score(query, name, keywords, key):
+    """Returns how well a script matches a query, or 0 if it does not.
+
+    The query should be in lower case, and key should be phonetic(name).
+    Name matches rank above keyword matches, which rank above phonetic
+    matches, and closer matches rank above looser ones.  Within each
+    class, a higher share of common trigrams ranks first."""
+    points = 0
+    if name == query:
+        points = 100
+    elif name.startswith(query):
+        points = 80
+    elif query in name:
+        points = 60
+    elif name in query:
+        points = 50
+    elif query in keywords:
+        points = 40
+    elif any(contains(query, k) for k in keywords):
+        points = 30
+    else:
+        q = phonetic(query)
+        if q == key:
+            points = 25
+        elif contains(q, key):
+            points = 15
+    if points == 0:
+        return 0
+
+    common = trigrams(query)
+    if len(common) > 0:
+        points += 10.0 * len(common & trigrams(name)) / len(common)
+    return points
+
+def build_index(path, catalog):
+    """Writes a search index for a Catalog to path."""
+    strings = bytearray()
+    postings = {}
+
+    def string(s):
+        data = s.encode("utf-8")
+        offset = len(strings)
+        strings.extend(data)
+        return (offset, len(data))
+
+    entries = bytearray()
+    for (number, name) in enumerate(catalog.names()):
+        keywords = [k.lower() for k in catalog.keywords(name)]
+        key = phonetic(name)
+        entries.extend(ENTRY.pack(*(string(name) + string(key) +
+                                    string("\0".join(keywords)))))
+
+        grams = set("n" + t for t in trigrams(name))
+        grams.update("p" + t for t in trigrams(key))
+        for keyword in keywords:
+            grams.update("k" + t for t in trigrams(keyword))
+        if min(len(s) for s in [name, key] + keywords) < 3:
+            grams.add("s")
+        for gram in grams:
+            postings.setdefault(gram, []).append(number)
+
+    keys = bytearray()
+    numbers = bytearray()
+    count = 0
+    for gram in sorted(postings):
+        keys.extend(KEY.pack(*(string(gram) + (count, len(postings[gram])))))
+        for number in postings[gram]:
+            numbers.extend(POSTING.pack(number))
+        count += len(postings[gram])
+
+    stamp = ("%s\0%s" % (catalog.stamp, catalog.version)).encode("utf-8")
+    entries_at = HEADER.size + len(stamp)
+    keys_at = entries_at + len(entries)
+    postings_at = keys_at + len(keys)
+    strings_at = postings_at + len(numbers)
+
+    mkdir(pathname(path))
+    temp = "%s.%d" % (path, os.getpid())
+    with open(temp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(stamp), len(catalog), len(postings),
+                            entries_at, keys_at, postings_at, strings_at))
+        f.write(stamp)
+        f.write(entries)
+        f.write(keys)
+        f.write(numbers)
+        f.write(strings)
+    os.rename(temp, path)
+
+class SearchIndex(object):
+    """Read-only view of a search index file."""
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, OSError, ValueError) as e:
+            raise SearchIndexError("Cannot open search index %s: %s" % (
+                path, e))
+
+        if len(self._map) < HEADER.size:
+            raise SearchIndexError("Search index %s is truncated" % path)
+        (magic, stamplen, self._count, self._kcount, self._entries,
+         self._keys, self._postings, self._strings) = \
+            HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise SearchIndexError("Search index %s has the wrong format" %
+                                   path)
+        self.stamp = self._map[HEADER.size:HEADER.size+stamplen]
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        self._map.close()
+
+    def _string(self, offset, length):
+        start = self._strings + offset
+        return self._map[start:start+length].decode("utf-8")
+
+    def entry(self, number):
+        """Returns (name, phonetic key, keywords) of an entry."""
+        fields = ENTRY.unpack_from(self._map, self._entries +
+                                   number*ENTRY.size)
+        keywords = self._string(*fields[4:6])
+        return (self._string(*fields[0:2]), self._string(*fields[2:4]),
+                keywords.split("\0") if len(keywords) > 0 else [])
+
+    def postings(self, gram):
+        """Returns entry numbers whose field contains a prefixed trigram."""
+        lo, hi = 0, self._kcount
+        while lo < hi:
+            mid = (lo + hi) // 2
+            fields = KEY.unpack_from(self._map, self._keys + mid*KEY.size)
+            if self._string(*fields[0:2]) < gram:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._kcount:
+            fields = KEY.unpack_from(self._map, self._keys + lo*KEY.size)
+            if self._string(*fields[0:2]) == gram:
+                start = self._postings + fields[2]*POSTING.size
+                return [POSTING.unpack_from(self._map,
+                                            start + i*POSTING.size)[0]
+                        for i in range(fields[3])]
+        return []
+
+    def candidates(self, query):
+        """Returns entry numbers that may match a query, or None if every
+        entry must be checked.
+
+        Whichever of a script's name, keywords or phonetic key matches a
+        query, the shorter of the two strings is contained in the longer,
+        so they share a trigram unless one is shorter than three letters.
+        Short queries therefore fall back to checking all entries, and
+        scripts with short fields are always checked."""
+        key = phonetic(query)
+        if len(query) < 3 or len(key) < 3:
+            return None
+
+        found = set(self.postings("s"))
+        for gram in trigrams(query):
+            for field in ("n", "k"):
+                found.update(self.postings(field + gram))
+        for gram in trigrams(key):
+            found.update(self.postings("p" + gram))
+        return found
+
+    def search(self, query):
+        """Returns list of (score, name) matching a query, best first."""
+        query = query.lower()
+        numbers = self.candidates(query)
+        if numbers is None:
+            numbers = range(self._count)
+
+        results = []
+        for number in numbers:
+            name, key, keywords = self.entry(number)
+            points = score(query, name, keywords, key)
+            if points > 0:
+                results.append((points, name))
+        results.sort(key=lambda r: (-r[0], len(r[1]), r[1]))
+        return results
+
+def load_index(path, catalog):
+    """Opens the search index for a Catalog, building it first if needed."""
+    stamp = ("%s\0%s" % (catalog.stamp, catalog.version)).encode("utf-8")
+    try:
+        index = SearchIndex(path)
+        if index.stamp == stamp:
+            return index
+        index.close()
+    except SearchIndexError:
+        pass
+
+    build_index(path, catalog)
+    return SearchIndex(path)
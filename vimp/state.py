@@ -0,0 +1,192 @@
+"""
+Persistent record of installed packages.
+
+The state is kept as JSON in ~/.vimp/state, and maps the full name of each
+installed package to its short name, version, files, symlinks, download
+URL and digest (or git commit), and whether it is enabled and loaded
+lazily.  It also holds options that apply to all packages, like packed
+mode.  Every change is written to a temporary file that is then renamed
+over the old one, so the file on disk is always complete.
+
+Copyright (C) 2014 Christian Stigen Larsen
+Distributed under the LGPL v2.1; see LICENSE.txt
+"""
+
+import contextlib
+import json
+import os
+import re
+import threading
+
+from vimp.log import verb
+from vimp.util import (mkdir, pathname)
+
+# State file format version.
+VERSION = 1
+
+# Matches the version at the end of a full package name.
+VERSION_SUFFIX = re.compile(r"-(\d[\w.]*)$")
+
+def getversion(fullname):
+    """Returns the version part of a full package name, or None."""
+    match = VERSION_SUFFIX.search(fullname)
+    return match.group(1) if match else None
+
+def getbasename(fullname):
+    """Returns a full package name without its version."""
+    return VERSION_SUFFIX.sub("", fullname)
+
+def versionkey(fullname):
+    """Returns a key that sorts full package names by version."""
+    key = []
+    for part in re.split(r"[^0-9A-Za-z]+", getversion(fullname) or ""):
+        key.append((int(part), "") if part.isdigit() else (-1, part))
+    return key
+
+class State(object):
+    """The installed-state database."""
+    def __init__(self, path):
+        self.path = path
+        self.packages = {}
+        self.options = {}
+        self._lock = threading.RLock()
+        self._batch = 0
+        self._dirty = False
+        # Set when the state has been changed since it was loaded
+        self.modified = False
+
+    @property
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        """Reads the state from disk."""
+        with self._lock:
+            self.packages = {}
+            self.options = {}
+            if self.exists:
+                with open(self.path, "rt") as f:
+                    data = json.load(f)
+                self.packages = data.get("packages", {})
+                self.options = data.get("options", {})
+            return self
+
+    def save(self):
+        """Atomically writes the state to disk."""
+        with self._lock:
+            self.modified = True
+            if self._batch > 0:
+                self._dirty = True
+                return
+            mkdir(pathname(self.path))
+            temp = "%s.%d" % (self.path, os.getpid())
+            with open(temp, "wt") as f:
+                json.dump({"version": VERSION, "packages": self.packages,
+                           "options": self.options},
+                          f, indent=1, sort_keys=True)
+            os.rename(temp, self.path)
+            self._dirty = False
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Defers writing the state to disk until the block is done."""
+        with self._lock:
+            self._batch += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch -= 1
+                if self._batch == 0 and self._dirty:
+                    self.save()
+
+    def get_option(self, key, default=None):
+        """Returns the value of an option."""
+        with self._lock:
+            return self.options.get(key, default)
+
+    def set_option(self, key, value):
+        """Sets an option that applies to all packages."""
+        with self._lock:
+            if self.options.get(key) != value:
+                self.options[key] = value
+                self.save()
+
+    def get(self, fullname):
+        """Returns the record for a package, or None."""
+        with self._lock:
+            return self.packages.get(fullname)
+
+    def named(self, name):
+        """Returns the full name of the installed package recorded under a
+        short name, enabled or not, or None.  The newest version wins if
+        there are several."""
+        with self._lock:
+            names = [n for n, e in self.packages.items() if e["name"] == name]
+        return max(names, key=versionkey) if len(names) > 0 else None
+
+    def isinstalled(self, fullname):
+        """Checks if a package is installed and enabled."""
+        entry = self.get(fullname)
+        return entry is not None and entry["enabled"]
+
+    def installed(self, enabled=True):
+        """Returns sorted full names of (enabled) installed packages."""
+        with self._lock:
+            return sorted(n for n, e in self.packages.items()
+                          if e["enabled"] or not enabled)
+
+    def add(self, fullname, name, files, symlinks, enabled=True,
+            requested=False, url=None, sha256=None, commit=None):
+        """Records an installed package, and where it was downloaded from."""
+        with self._lock:
+            old = self.packages.get(fullname, {})
+            verb("Recording %s as installed" % fullname)
+            self.packages[fullname] = {
+                "name": name,
+                "version": getversion(fullname),
+                "files": sorted(files),
+                "symlinks": [list(link) for link in symlinks],
+                "enabled": enabled,
+                "requested": requested or old.get("requested", False),
+                "lazy": old.get("lazy", False),
+                "url": url or old.get("url"),
+                "sha256": sha256 or old.get("sha256"),
+                "commit": commit or old.get("commit"),
+            }
+            self.save()
+
+    def restore(self, fullname, record):
+        """Puts back a record previously returned by get()."""
+        with self._lock:
+            self.packages[fullname] = record
+            self.save()
+
+    def set_lazy(self, fullname, lazy):
+        """Records whether a package is loaded on first use."""
+        with self._lock:
+            if fullname in self.packages:
+                self.packages[fullname]["lazy"] = lazy
+                self.save()
+
+    def set_symlinks(self, fullname, symlinks):
+        """Records where the symlinks of a package are."""
+        with self._lock:
+            if fullname in self.packages:
+                self.packages[fullname]["symlinks"] = [list(link)
+                                                       for link in symlinks]
+                self.save()
+
+    def set_enabled(self, fullname, enabled):
+        """Records that a package has been enabled or disabled."""
+        with self._lock:
+            if fullname in self.packages:
+                self.packages[fullname]["enabled"] = enabled
+                self.save()
+
+    def remove(self, fullname):
+        """Forgets a package."""
+        with self._lock:
+            if self.packages.pop(fullname, None) is not None:
+                verb("Recording %s as removed" % fullname)
+                self.save()
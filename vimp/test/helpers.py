@@ -0,0 +1,100 @@
+"""
+Helpers shared by the tests.
+
+Copyright (C) 2014 Christian Stigen Larsen
+Distributed under the LGPL v2.1; see LICENSE.txt
+"""
+
+import io
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+import zipfile
+
+from vimp import install
+
+def writefile(path, data):
+    """Writes data, bytes or text, to path, creating directories."""
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, "wb") as f:
+        f.write(data if isinstance(data, bytes) else data.encode("utf-8"))
+
+def readfile(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+def which(program):
+    """Returns the path of program in $PATH, or None."""
+    for directory in os.environ.get("PATH", "").split(os.pathsep):
+        path = os.path.join(directory, program)
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+    return None
+
+def maketar(path, files):
+    """Writes a gzipped tar file with files, a dict of member name to
+    contents."""
+    with tarfile.open(path, "w:gz") as tar:
+        for name in sorted(files):
+            data = files[name]
+            if not isinstance(data, bytes):
+                data = data.encode("utf-8")
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+def makezip(path, files):
+    """Writes a zip file with files, a dict of member name to contents."""
+    with zipfile.ZipFile(path, "w") as z:
+        for name in sorted(files):
+            z.writestr(name, files[name])
+
+class TempDirTest(unittest.TestCase):
+    """Gives each test a temporary directory in self.tmp."""
+    def setUp(self):
+        self.tmp = os.path.realpath(tempfile.mkdtemp(prefix="vimp-test-"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def path(self, *names):
+        return os.path.join(self.tmp, *names)
+
+class TempHomeTest(TempDirTest):
+    """Runs each test with HOME in a temporary directory, so that vimp
+    keeps its state, cache and packages there."""
+    def setUp(self):
+        TempDirTest.setUp(self)
+        self.home = os.environ.get("HOME")
+        os.environ["HOME"] = self.tmp
+        self.reset()
+
+    def tearDown(self):
+        if self.home is None:
+            del os.environ["HOME"]
+        else:
+            os.environ["HOME"] = self.home
+        self.reset()
+        TempDirTest.tearDown(self)
+
+    def catalog(self, aliases, scripts):
+        """Makes vimp use a catalog with the given aliases and scripts.
+
+        It is written as the catalog fetched by `vimp update`, which is used
+        instead of vimp.scripts."""
+        from vimp.configure import configure
+        writefile(self.path(".vimp", "list", "feed.json"), json.dumps(
+                  {"version": 1, "aliases": aliases, "scripts": scripts}))
+        self.reset()
+        configure()
+
+    def reset(self):
+        """Forgets the state, cache and catalog vimp has loaded."""
+        install._catalog = None
+        install._cache = None
+        install._state = None
+        install._packed = None
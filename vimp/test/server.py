@@ -0,0 +1,102 @@
+"""
+A local HTTP server for tests.
+
+It serves files from a dict, or from a directory, with an ETag for each,
+and honours If-None-Match, Range and If-Range like a real web server.  The
+requests it gets are recorded, with lowercase header names, so tests can
+check what was asked for.
+
+Copyright (C) 2014 Christian Stigen Larsen
+Distributed under the LGPL v2.1; see LICENSE.txt
+"""
+
+import hashlib
+import os
+import threading
+
+try:
+    from BaseHTTPServer import (BaseHTTPRequestHandler, HTTPServer)
+except ImportError:
+    from http.server import (BaseHTTPRequestHandler, HTTPServer)
+
+def etag(data):
+    return '"%s"' % hashlib.sha256(data).hexdigest()[:16]
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def lookup(self):
+        path = self.path.lstrip("/")
+        if path in self.server.files:
+            return self.server.files[path]
+        if self.server.directory is not None:
+            filename = os.path.join(self.server.directory, path)
+            if os.path.isfile(filename):
+                with open(filename, "rb") as f:
+                    return f.read()
+        return None
+
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(
+            (key.lower(), value) for (key, value) in self.headers.items())))
+        data = self.lookup()
+        if data is None:
+            self.send_error(404)
+            return
+
+        tag = etag(data)
+        if self.headers.get("If-None-Match") == tag:
+            self.send_response(304)
+            self.send_header("ETag", tag)
+            self.end_headers()
+            return
+
+        start = 0
+        ranged = self.headers.get("Range")
+        if ranged is not None and ranged.startswith("bytes=") and \
+                self.headers.get("If-Range", tag) == tag:
+            start = int(ranged[len("bytes="):].rstrip("-"))
+
+        if start > 0:
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes %d-%d/%d" % (
+                             start, len(data) - 1, len(data)))
+        else:
+            self.send_response(200)
+        self.send_header("ETag", tag)
+        self.send_header("Content-Length", str(len(data) - start))
+        self.end_headers()
+        self.wfile.write(data[start:])
+
+class Server(object):
+    """Serves files on localhost in a background thread.
+
+    Use it as a context manager; url(path) returns the URL of a file."""
+    def __init__(self, files=None, directory=None):
+        self.httpd = HTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.files = files if files is not None else {}
+        self.httpd.directory = directory
+        self.httpd.requests = []
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       args=(0.05,))
+        self.thread.daemon = True
+
+    @property
+    def files(self):
+        return self.httpd.files
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    def url(self, path=""):
+        return "http://127.0.0.1:%d/%s" % (self.httpd.server_port, path)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, ex, bt, a):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,132 @@
+import io
+import os
+import stat
+import tarfile
+import unittest
+
+from vimp.archive import (Archive, Pattern)
+from vimp.test.helpers import (TempDirTest, maketar, makezip, readfile)
+
+FILES = {
+    "pkg/plugin/a.vim": "a",
+    "pkg/autoload/l9/b.vim": "b",
+    "pkg/autoload/l9/sub/c.vim": "c",
+    "pkg/README": "readme",
+}
+
+class TestPattern(unittest.TestCase):
+    def test_plain(self):
+        pattern = Pattern("./pkg/README", "/out/README")
+        self.assertEqual(pattern.match("pkg/README"), "/out/README")
+        self.assertEqual(pattern.match("pkg/README2"), None)
+
+    def test_glob(self):
+        pattern = Pattern("pkg/autoload/*", "/out")
+        self.assertEqual(pattern.match("pkg/autoload/l9/sub/c.vim"),
+                         os.path.join("/out", "l9", "sub", "c.vim"))
+        self.assertEqual(pattern.match("pkg/autoload"), None)
+        self.assertEqual(pattern.match("pkg/plugin/a.vim"), None)
+
+    def test_unsafe(self):
+        pattern = Pattern("evil-1.0/plugin/*", "/out/plugin")
+        self.assertEqual(pattern.match(
+            "evil-1.0/plugin/../../../../escaped.txt"), None)
+        self.assertEqual(Pattern("*", "/out").match("/etc/passwd"), None)
+        self.assertEqual(Pattern("*", "/out").match("../x"), None)
+
+class TestArchive(TempDirTest):
+    def extract(self, archive, pairs, reuse=None):
+        pairs = [(p, self.path("out", o)) for (p, o) in pairs]
+        with Archive(archive, reuse=reuse) as a:
+            return (a.extract_pairs(pairs), a.reused)
+
+    def check(self, archive):
+        missing, _ = self.extract(archive, [
+            ("pkg/plugin/a.vim", "plugin/a.vim"),
+            ("pkg/autoload/*", "autoload"),
+            ("pkg/nothing/*", "nothing"),
+        ])
+        self.assertEqual(missing, ["pkg/nothing/*"])
+        self.assertEqual(readfile(self.path("out", "plugin", "a.vim")), b"a")
+        self.assertEqual(readfile(self.path("out", "autoload", "l9", "sub",
+                                            "c.vim")), b"c")
+        self.assertFalse(os.path.exists(self.path("out", "README")))
+
+    def test_tar(self):
+        maketar(self.path("a.tar.gz"), FILES)
+        self.check(self.path("a.tar.gz"))
+
+    def test_zip(self):
+        makezip(self.path("a.zip"), FILES)
+        self.check(self.path("a.zip"))
+
+    def test_same_member_twice(self):
+        maketar(self.path("a.tar.gz"), FILES)
+        self.extract(self.path("a.tar.gz"), [("pkg/plugin/a.vim", "x/a.vim"),
+                                             ("pkg/plugin/a.vim", "y/a.vim")])
+        self.assertEqual(readfile(self.path("out", "x", "a.vim")), b"a")
+        self.assertEqual(readfile(self.path("out", "y", "a.vim")), b"a")
+
+    def test_reuse(self):
+        maketar(self.path("a.tar.gz"), FILES)
+        self.extract(self.path("a.tar.gz"), [("pkg/plugin/*", "old")])
+        _, reused = self.extract(self.path("a.tar.gz"),
+                                 [("pkg/plugin/*", "new")],
+                                 lambda dest: dest.replace("new", "old"))
+        self.assertEqual(reused, 1)
+        self.assertEqual(os.stat(self.path("out", "new", "a.vim")).st_ino,
+                         os.stat(self.path("out", "old", "a.vim")).st_ino)
+
+    def escape(self, make, name):
+        make(name, {"evil-1.0/plugin/ok.vim": "ok",
+                    "evil-1.0/plugin/../../../../escaped.txt": "evil"})
+        # The output is four directories down, so the member would land in
+        # self.tmp if it were not skipped
+        output = self.path("a", "b", "c", "plugin")
+        with Archive(name) as a:
+            a.extract_pairs([("evil-1.0/plugin/*", output)])
+        self.assertEqual(readfile(os.path.join(output, "ok.vim")), b"ok")
+        for (base, _, names) in os.walk(self.tmp):
+            self.assertFalse("escaped.txt" in names, base)
+
+    def test_tar_links(self):
+        name = self.path("links.tar.gz")
+        with tarfile.open(name, "w:gz") as tar:
+            info = tarfile.TarInfo("pkg/plugin/a.vim")
+            info.size = 1
+            info.mode = 0o755
+            tar.addfile(info, io.BytesIO(b"a"))
+            for (member, kind, target) in [
+                    ("pkg/plugin/sym.vim", tarfile.SYMTYPE, "a.vim"),
+                    ("pkg/plugin/hard.vim", tarfile.LNKTYPE,
+                     "pkg/plugin/a.vim"),
+                    ("pkg/plugin/up.vim", tarfile.SYMTYPE, "../../../x"),
+                    ("pkg/plugin/abs.vim", tarfile.SYMTYPE, "/etc/passwd"),
+                    ("pkg/plugin/gone.vim", tarfile.LNKTYPE, "pkg/README")]:
+                info = tarfile.TarInfo(member)
+                info.type = kind
+                info.linkname = target
+                tar.addfile(info)
+
+        missing, _ = self.extract(name, [("pkg/plugin/*", "plugin"),
+                                         ("pkg/plugin/sym.vim", "sym.vim")])
+        self.assertEqual(missing, [])
+        out = self.path("out", "plugin")
+        self.assertEqual(sorted(os.listdir(out)),
+                         ["a.vim", "hard.vim", "sym.vim"])
+        self.assertEqual(os.readlink(os.path.join(out, "sym.vim")), "a.vim")
+        self.assertEqual(readfile(os.path.join(out, "sym.vim")), b"a")
+        self.assertEqual(os.stat(os.path.join(out, "hard.vim")).st_ino,
+                         os.stat(os.path.join(out, "a.vim")).st_ino)
+        self.assertEqual(os.readlink(self.path("out", "sym.vim")), "a.vim")
+        mode = os.stat(os.path.join(out, "a.vim")).st_mode
+        self.assertEqual(stat.S_IMODE(mode), 0o755)
+
+    def test_tar_escape(self):
+        self.escape(maketar, self.path("evil.tar.gz"))
+
+    def test_zip_escape(self):
+        self.escape(makezip, self.path("evil.zip"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+import os
+import subprocess
+import unittest
+
+from vimp import install
+from vimp.pack import BUNDLE
+from vimp.test.helpers import (TempHomeTest, readfile, which, writefile)
+from vimp.util import symlink
+
+SCRIPTS = {
+    "pathogen-2.3": {
+        "symlink": [["{install}/autoload/pathogen.vim",
+                     "{vim}/autoload/pathogen.vim"]],
+        "vimrc": ["execute pathogen#infect()"],
+    },
+    "abc-1.0": {
+        "symlink": [["{install}", "{bundle}"]],
+        "vimrc": ["let g:abc = '{bundle}'"],
+    },
+    "lazy-1.0": {
+        "symlink": [["{install}", "{bundle}"]],
+        "lazy": {"commands": ["Lazy"]},
+    },
+}
+
+PLUGINS = {
+    "abc-1.0": "let g:abc_loaded = get(g:, 'abc_loaded', 0) + 1\n",
+    "lazy-1.0": "let g:lazy_loaded = get(g:, 'lazy_loaded', 0) + 1\n"
+                "command! Lazy let g:lazy = get(g:, 'lazy', 0) + 1\n",
+}
+
+class TestBackend(TempHomeTest):
+    def setUp(self):
+        TempHomeTest.setUp(self)
+        self.catalog(dict((full.split("-")[0], full) for full in SCRIPTS),
+                     SCRIPTS)
+        writefile(self.path(".vimp", "installed", "pathogen-2.3", "autoload",
+                            "pathogen.vim"), "")
+        for full in sorted(SCRIPTS):
+            self.add(full)
+        from vimp.command import lazy
+        lazy("lazy")
+        install.update_vimprc(force=True)
+
+    def add(self, full):
+        """Installs a package by hand, as install_script would."""
+        state = install.getstate()
+        path = install.getpath("install", full)
+        if full in PLUGINS:
+            writefile(os.path.join(path, "plugin", full + ".vim"),
+                      PLUGINS[full])
+        links = [(install.expandvars(full, src), install.expandvars(full, dst))
+                 for (src, dst) in SCRIPTS[full]["symlink"]]
+        for (src, dst) in links:
+            symlink(src, dst)
+        state.add(full, full.split("-")[0], install.listfiles(path), links,
+                  requested=True)
+
+    def switch(self, name):
+        from vimp.command import backend
+        backend(name)
+        install.update_vimprc()
+
+    def vim(self, *names):
+        return self.path(".vim", *names)
+
+    def links(self):
+        """Returns the links in ~/.vim, relative to it."""
+        found = {}
+        for base, dirs, names in os.walk(self.vim()):
+            for name in dirs + names:
+                path = os.path.join(base, name)
+                if os.path.islink(path):
+                    found[os.path.relpath(path, self.vim())] = \
+                        os.readlink(path)
+        return found
+
+    def vimrc(self):
+        return readfile(self.path(".vimp", "vimrc")).decode("utf-8")
+
+    def installed(self, full):
+        return self.path(".vimp", "installed", full)
+
+    def test_switch(self):
+        pathogen = {
+            "autoload/pathogen.vim": os.path.join(
+                self.installed("pathogen-2.3"), "autoload", "pathogen.vim"),
+            "bundle/abc": self.installed("abc-1.0"),
+            "bundle/lazy": self.installed("lazy-1.0"),
+        }
+        self.assertEqual(self.links(), pathogen)
+
+        # Lazy packages go to opt/, where only :packadd finds them
+        self.switch("native")
+        self.assertEqual(self.links(), {
+            "autoload/pathogen.vim": pathogen["autoload/pathogen.vim"],
+            "pack/vimp/start/abc": self.installed("abc-1.0"),
+            "pack/vimp/opt/lazy": self.installed("lazy-1.0"),
+        })
+        state = install.getstate()
+        self.assertEqual(state.get("abc-1.0")["symlinks"], [
+            [self.installed("abc-1.0"), self.vim("pack", "vimp", "start",
+                                                 "abc")]])
+        self.assertTrue("let g:abc = '%s'\n" % self.vim(
+                        "pack", "vimp", "start", "abc") in self.vimrc())
+
+        self.switch("pathogen")
+        self.assertEqual(self.links(), pathogen)
+        self.assertEqual(os.listdir(self.vim("pack", "vimp", "start")), [])
+
+    def test_packed(self):
+        from vimp.command import pack
+        self.switch("native")
+        pack()
+        install.update_vimprc()
+        # The packed tree is the only start package, and abc moves to opt/
+        links = self.links()
+        self.assertEqual(links["pack/vimp/start/%s" % BUNDLE],
+                         self.path(".vimp", "packed"))
+        self.assertEqual(links["pack/vimp/opt/abc"], self.installed("abc-1.0"))
+        self.assertEqual(os.listdir(self.vim("pack", "vimp", "start")),
+                         [BUNDLE])
+        self.assertFalse(os.path.lexists(self.vim("bundle", BUNDLE)))
+
+        pack("-d")
+        install.update_vimprc()
+        self.assertEqual(os.listdir(self.vim("pack", "vimp", "start")),
+                         ["abc"])
+
+    def test_vimrc(self):
+        self.assertTrue("execute pathogen#infect()" in self.vimrc())
+        self.assertTrue("pathogen_disabled" in self.vimrc())
+        self.switch("native")
+        vimrc = self.vimrc()
+        self.assertFalse("pathogen" in vimrc)
+        self.assertTrue("command! -nargs=* -bang -complete=file Lazy "
+                        "call VimpLazyCommand('lazy', '', ['Lazy'], [], "
+                        "'Lazy', '<bang>', <q-args>)\n" in vimrc)
+
+    @unittest.skipIf(which("vim") is None, "vim is not installed")
+    def test_vim(self):
+        self.switch("native")
+        script = [
+            "set packpath=%s" % self.vim(),
+            "set loadplugins",
+            "source %s" % self.path(".vimp", "vimrc"),
+            "packloadall",
+            "let g:before = get(g:, 'lazy_loaded', 0)",
+            "Lazy",
+            "Lazy",
+            "call writefile(map(['abc_loaded', 'before', 'lazy_loaded', "
+            "'lazy'], 'string(get(g:, v:val, 0))'), '%s')" % self.path("out"),
+            "qa!",
+        ]
+        writefile(self.path("test.vim"), "\n".join(script) + "\n")
+        with open(os.devnull, "w") as null:
+            subprocess.call(["vim", "-N", "-u", "NONE", "-i", "NONE", "-n",
+                             "--not-a-term", "-S", self.path("test.vim")],
+                            stdin=null, stdout=null, stderr=null)
+        self.assertEqual([int(n) for n in readfile(self.path("out")).split()],
+                         [1, 0, 1, 2])
+
+if __name__ == "__main__":
+    unittest.main()
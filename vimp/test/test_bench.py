@@ -0,0 +1,155 @@
+import json
+import os
+import sys
+import unittest
+
+from vimp import install
+from vimp.bench import (benchvimrc, median, parse_startuptime, regressed)
+from vimp.test.helpers import (TempHomeTest, readfile, which, writefile)
+from vimp.util import symlink
+
+# Written by vim 9.0 with `vim --startuptime`
+STARTUPTIME = """
+
+times in msec
+ clock   self+sourced   self:  sourced script
+ clock   elapsed:              other lines
+
+000.008  000.008: --- VIM STARTING ---
+000.122  000.114: Allocated generic buffers
+000.536  000.362: inits 1
+000.835  000.147: init highlight
+004.825  001.951  000.619: sourcing /usr/share/vim/vim90/syntax/syncolor.vim
+004.979  002.295  000.344: sourcing /usr/share/vim/vim90/syntax/synload.vim
+017.848  016.976  001.315: sourcing /home/me/.vimrc
+017.852  000.041: sourcing vimrc file(s)
+018.724  000.193  000.193: sourcing /home/me/.vim/bundle/foo/plugin/foo.vim
+019.440  000.694  000.694: sourcing /home/me/.vim/bundle/foo/plugin/bar.vim
+019.850  000.390  000.390: sourcing /home/me/.vim/bundle/foobar/plugin/x.vim
+020.831  000.009: inits 3
+020.972  000.137: opening buffers
+020.975  000.002: editing files in windows
+021.104  000.129: VimEnter autocommands
+021.107  000.003: before starting main loop
+021.598  000.491: first screen update
+021.599  000.001: --- VIM STARTED ---
+"""
+
+SCRIPTS = {
+    "slow-1.0": {
+        "symlink": [["{install}", "{bundle}"]],
+        "vimrc": ["let g:slow = 1"],
+    },
+    "fast-1.0": {
+        "symlink": [["{install}", "{bundle}"]],
+        "vimrc": ["let g:fast = 1"],
+    },
+}
+
+class Output(object):
+    def __init__(self):
+        self.text = ""
+
+    def write(self, text):
+        self.text += text
+
+class TestParse(unittest.TestCase):
+    def test_parse(self):
+        m = parse_startuptime(STARTUPTIME)
+        self.assertEqual(m.total, 21.599)
+        self.assertEqual(len(m.sourced), 6)
+        self.assertEqual(m.sourced[2], ("/home/me/.vimrc", 1.315))
+        count, spent = m.files(["/home/me/.vim/bundle/foo"])
+        self.assertEqual(count, 2)
+        self.assertAlmostEqual(spent, 0.887)
+        self.assertEqual(m.files(["/home/me/.vim/bundle/foobar"]), (1, 0.39))
+        self.assertEqual(m.files(["/home/me/.vim/bundle/baz"]), (0, 0.0))
+
+    def test_empty(self):
+        m = parse_startuptime("")
+        self.assertEqual((m.total, m.sourced), (0.0, []))
+
+    def test_median(self):
+        self.assertEqual(median([3.0]), 3.0)
+        self.assertEqual(median([5.0, 1.0, 3.0]), 3.0)
+        self.assertEqual(median([4.0, 1.0, 2.0, 10.0]), 3.0)
+
+    def test_regressed(self):
+        self.assertFalse(regressed(100.0, None))
+        # Both more than a millisecond and ten percent slower
+        self.assertTrue(regressed(12.0, 10.0))
+        self.assertFalse(regressed(10.9, 10.0))
+        self.assertFalse(regressed(105.0, 100.0))
+        self.assertTrue(regressed(111.0, 100.0))
+        self.assertFalse(regressed(5.0, 10.0))
+
+class TestRender(TempHomeTest):
+    def setUp(self):
+        TempHomeTest.setUp(self)
+        self.catalog({"slow": "slow-1.0", "fast": "fast-1.0"}, SCRIPTS)
+
+    def add(self, full, plugin=""):
+        """Installs a package by hand, as install_script would."""
+        state = install.getstate()
+        path = install.getpath("install", full)
+        writefile(os.path.join(path, "plugin", full + ".vim"), plugin)
+        links = [(install.expandvars(full, src), install.expandvars(full, dst))
+                 for (src, dst) in SCRIPTS[full]["symlink"]]
+        for (src, dst) in links:
+            symlink(src, dst)
+        state.add(full, full.split("-")[0], install.listfiles(path), links,
+                  requested=True)
+
+    def test_exclude(self):
+        self.add("slow-1.0")
+        self.add("fast-1.0")
+        state = install.getstate()
+        vimrc = install.render_vimprc(state)
+        self.assertTrue("let g:slow = 1" in vimrc)
+        self.assertTrue("let g:fast = 1" in vimrc)
+        vimrc = install.render_vimprc(state, exclude=["slow-1.0"])
+        self.assertFalse("slow" in vimrc)
+        self.assertTrue("let g:fast = 1" in vimrc)
+
+    def test_benchvimrc(self):
+        text = benchvimrc("vimprc\n", ["slow"])
+        self.assertEqual(text, "set nocompatible\n"
+                               "let g:pathogen_disabled = ['slow']\n"
+                               "vimprc\n")
+        writefile(self.path("a b", "after", "plugin", "x.vim"), "")
+        text = benchvimrc("", bundles=[self.path("a b")])
+        self.assertTrue("set packpath=\n" in text)
+        self.assertTrue("set runtimepath^=%s\\ b\n" % self.path("a") in text)
+        self.assertTrue("set runtimepath+=%s\\ b/after\n" % self.path("a")
+                        in text)
+
+    @unittest.skipIf(which("vim") is None, "vim is not installed")
+    def test_bench(self):
+        from vimp.command import bench
+        install.getstate().set_option("backend", "native")
+        self.add("slow-1.0", "sleep 100m\n")
+        self.add("fast-1.0")
+
+        out = Output()
+        stdout, sys.stdout = sys.stdout, out
+        try:
+            bench("-n", "1", "--save")
+        finally:
+            sys.stdout = stdout
+        self.assertEqual(out.text.splitlines()[-1], "Saved baseline to %s" %
+                         self.path(".vimp", "bench.json"))
+
+        results = json.loads(readfile(self.path(".vimp", "bench.json"))
+                             .decode("utf-8"))
+        self.assertEqual(results["runs"], 1)
+        self.assertEqual(sorted(results["plugins"]), ["fast-1.0", "slow-1.0"])
+        slow = results["plugins"]["slow-1.0"]
+        fast = results["plugins"]["fast-1.0"]
+        self.assertEqual((slow["files"], fast["files"]), (1, 1))
+        self.assertTrue(slow["sourced"] >= 100.0)
+        self.assertTrue(slow["cost"] >= 50.0)
+        self.assertTrue(fast["cost"] < slow["cost"])
+        self.assertTrue(results["total"] >= slow["cost"])
+
+if __name__ == "__main__":
+    unittest.main()
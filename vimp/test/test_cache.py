@@ -0,0 +1,68 @@
+import os
+import unittest
+
+from vimp.cache import (ChecksumError, Cache, sha256sum)
+from vimp.test.helpers import (TempDirTest, readfile, writefile)
+
+class TestCache(TempDirTest):
+    def setUp(self):
+        TempDirTest.setUp(self)
+        self.cache = Cache(self.path("cache"), max_size=100)
+
+    def download(self, name, data):
+        path = self.path("download", name)
+        writefile(path, data)
+        return path
+
+    def test_store_and_lookup(self):
+        path = self.download("a.zip", b"a" * 10)
+        digest = self.cache.store("http://x/a.zip", path,
+                                  validators={"etag": '"1"'})
+        self.assertEqual(digest, sha256sum(path))
+        cached = self.cache.lookup("http://x/a.zip")
+        self.assertEqual(readfile(cached), b"a" * 10)
+        self.assertEqual(self.cache.lookup("http://y/a.zip", digest), cached)
+        self.assertEqual(self.cache.validators("http://x/a.zip")["etag"],
+                         '"1"')
+        self.assertTrue(self.cache.isfresh("http://x/a.zip"))
+        self.assertEqual(self.cache.lookup("http://x/b.zip"), None)
+
+        # The index is kept on disk
+        again = Cache(self.path("cache"))
+        self.assertEqual(again.lookup("http://x/a.zip"), cached)
+        self.assertEqual(again.stats(), (1, 10))
+
+    def test_checksum(self):
+        path = self.download("a.zip", b"a")
+        self.assertRaises(ChecksumError, self.cache.store, "http://x/a.zip",
+                          path, "0" * 64)
+        self.assertEqual(self.cache.stats(), (0, 0))
+
+    def test_prune(self):
+        for (i, name) in enumerate("abc"):
+            self.cache.store("http://x/%s" % name,
+                             self.download(name, name * 40))
+            self.cache.index["objects"][sha256sum(
+                self.path("download", name))]["atime"] = i
+        # Storing c evicted a, the least recently used
+        self.assertEqual(self.cache.lookup("http://x/a"), None)
+        self.assertEqual(self.cache.stats(), (2, 80))
+        self.assertEqual(self.cache.prune(0), (2, 80))
+        self.assertEqual([names for (_, _, names)
+                          in os.walk(self.path("cache", "objects"))
+                          if len(names) > 0], [])
+
+    def test_disappeared(self):
+        digest = self.cache.store("http://x/a", self.download("a", "a"))
+        os.unlink(self.cache.objectpath(digest))
+        self.assertEqual(self.cache.lookup("http://x/a"), None)
+        self.assertEqual(self.cache.stats(), (0, 0))
+
+    def test_remove(self):
+        digest = self.cache.store("http://x/a", self.download("a", "a"))
+        self.cache.remove([digest])
+        self.assertFalse(os.path.exists(self.cache.objectpath(digest)))
+        self.assertEqual(self.cache.digest("http://x/a"), None)
+
+if __name__ == "__main__":
+    unittest.main()
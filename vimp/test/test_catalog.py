@@ -0,0 +1,104 @@
+import json
+import os
+import unittest
+
+from vimp.catalog import (Catalog, CatalogError, compile_catalog, load_catalog)
+from vimp.test.helpers import (TempDirTest, writefile)
+
+ALIASES = {"nerdtree": "nerdtree-4.2.0", "nt": "nerdtree-4.2.0",
+           "l9": "l9-1.1", "fuzzyfinder": "fuzzyfinder-4.2.2"}
+SCRIPTS = {
+    "nerdtree-4.2.0": {"about": "Tree explorer", "keywords": ["file",
+                                                              "explorer"]},
+    "nerdtree@ctrl-d": {"about": "Ctrl-D opens NERDTree",
+                        "deps": ["nerdtree"]},
+    "l9-1.1": {"about": "Library"},
+    "fuzzyfinder-4.2.2": {"about": "Fuzzy finder", "deps": ["l9"],
+                          "download": ("http://x/ff.zip", "{name}.zip")},
+}
+
+class TestCatalog(TempDirTest):
+    def setUp(self):
+        TempDirTest.setUp(self)
+        compile_catalog(self.path("catalog"), "1.0", ALIASES, SCRIPTS, "test")
+        self.catalog = Catalog(self.path("catalog"))
+
+    def tearDown(self):
+        self.catalog.close()
+        TempDirTest.tearDown(self)
+
+    def test_names(self):
+        self.assertEqual(len(self.catalog), 4)
+        self.assertEqual(self.catalog.names(), sorted(SCRIPTS))
+        self.assertEqual(self.catalog.aliases(), ALIASES)
+        self.assertEqual((self.catalog.stamp, self.catalog.version),
+                         ("test", "1.0"))
+
+    def test_lookup(self):
+        self.assertEqual(self.catalog.full_name("nt"), "nerdtree-4.2.0")
+        self.assertEqual(self.catalog.full_name("l9-1.1"), "l9-1.1")
+        self.assertEqual(self.catalog.full_name("unknown"), "unknown")
+        # The first alias in sorted order is the short name
+        self.assertEqual(self.catalog.short_name("nerdtree-4.2.0"),
+                         "nerdtree")
+        self.assertEqual(self.catalog.short_name("nerdtree@ctrl-d"),
+                         "nerdtree@ctrl-d")
+        self.assertTrue("fuzzyfinder" in self.catalog)
+        self.assertFalse("fuzzy" in self.catalog)
+
+    def test_fields(self):
+        self.assertEqual(self.catalog.deps("fuzzyfinder"), ["l9"])
+        self.assertEqual(self.catalog.deps("l9"), [])
+        self.assertEqual(self.catalog.keywords("nerdtree"),
+                         ["file", "explorer"])
+        recipe = self.catalog.get("fuzzyfinder-4.2.2")
+        self.assertEqual(recipe["download"], ("http://x/ff.zip",
+                                              "{name}.zip"))
+        self.assertEqual(self.catalog.get("unknown"), None)
+
+    def test_damaged(self):
+        writefile(self.path("bad"), b"not a catalog")
+        self.assertRaises(CatalogError, Catalog, self.path("bad"))
+
+    def test_load_feed(self):
+        feed = self.path("feed.json")
+        writefile(feed, json.dumps({"version": 7, "aliases": {"a": "a-1.0"},
+                                    "scripts": {"a-1.0": {"about": "A"}}}))
+        catalog = load_catalog(self.path("compiled"), feed)
+        self.assertEqual((catalog.names(), catalog.version), (["a-1.0"], "7"))
+        stamp = catalog.stamp
+        catalog.close()
+
+        # It is only compiled again when the feed changes
+        mtime = os.path.getmtime(self.path("compiled"))
+        catalog = load_catalog(self.path("compiled"), feed)
+        self.assertEqual(catalog.stamp, stamp)
+        self.assertEqual(os.path.getmtime(self.path("compiled")), mtime)
+        catalog.close()
+
+        writefile(feed, json.dumps({"version": 8, "aliases": {},
+                                    "scripts": {"b-1.0": {"about": "B"}}}))
+        catalog = load_catalog(self.path("compiled"), feed)
+        self.assertEqual((catalog.names(), catalog.version), (["b-1.0"], "8"))
+        catalog.close()
+
+    def test_feed_release(self):
+        from vimp.scripts import (SCRIPTS as shipped, __version__)
+        feed = self.path("feed.json")
+
+        def load(release):
+            writefile(feed, json.dumps({"version": 7, "release": release,
+                                        "aliases": {}, "scripts": SCRIPTS}))
+            catalog = load_catalog(self.path("compiled"), feed)
+            try:
+                return (catalog.version, catalog.names())
+            finally:
+                catalog.close()
+
+        # A feed from an older vimp does not hide the scripts of this one
+        self.assertEqual(load("0.0.1"), (__version__, sorted(shipped)))
+        self.assertEqual(load(__version__), ("7", sorted(SCRIPTS)))
+        self.assertEqual(load("999.0"), ("7", sorted(SCRIPTS)))
+
+if __name__ == "__main__":
+    unittest.main()
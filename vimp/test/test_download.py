@@ -0,0 +1,104 @@
+import json
+import os
+import unittest
+
+from vimp import install
+from vimp.download import (Downloader, fetch)
+from vimp.test.helpers import (TempHomeTest, readfile, writefile)
+from vimp.test.server import (Server, etag)
+
+DATA = os.urandom(200*1024)
+
+class TestFetch(TempHomeTest):
+    def setUp(self):
+        TempHomeTest.setUp(self)
+        self.server = Server({"plugin.zip": DATA}).__enter__()
+        self.url = self.server.url("plugin.zip")
+        self.filename = self.path("download", "plugin.zip")
+
+    def tearDown(self):
+        self.server.__exit__(None, None, None)
+        TempHomeTest.tearDown(self)
+
+    def interrupted(self, size, tag):
+        """Leaves a partial download as an interrupted fetch() would."""
+        writefile(self.filename + ".part", DATA[:size])
+        writefile(self.filename + ".part.json", json.dumps(
+                  {"url": self.url, "etag": tag, "last_modified": None}))
+
+    def test_fetch(self):
+        seen = []
+        result = fetch(self.url, self.filename,
+                       lambda received, total: seen.append((received, total)))
+        self.assertTrue(result.modified)
+        self.assertFalse(result.resumed)
+        self.assertEqual(result.received, len(DATA))
+        self.assertEqual(result.etag, etag(DATA))
+        self.assertEqual(readfile(self.filename), DATA)
+        self.assertEqual(seen[-1], (len(DATA), len(DATA)))
+        self.assertFalse(os.path.exists(self.filename + ".part"))
+        self.assertFalse(os.path.exists(self.filename + ".part.json"))
+
+    def test_resume(self):
+        self.interrupted(50000, etag(DATA))
+        result = fetch(self.url, self.filename)
+        self.assertTrue(result.resumed)
+        self.assertEqual(result.received, len(DATA) - 50000)
+        self.assertEqual(readfile(self.filename), DATA)
+        headers = self.server.requests[-1][1]
+        self.assertEqual(headers.get("range"), "bytes=50000-")
+        self.assertEqual(headers.get("if-range"), etag(DATA))
+
+    def test_resume_changed(self):
+        # The file changed since the partial download, so the server sends
+        # all of it and the download starts over
+        self.interrupted(50000, '"old"')
+        result = fetch(self.url, self.filename)
+        self.assertFalse(result.resumed)
+        self.assertEqual(result.received, len(DATA))
+        self.assertEqual(readfile(self.filename), DATA)
+
+    def test_not_modified(self):
+        result = fetch(self.url, self.filename, etag=etag(DATA))
+        self.assertFalse(result.modified)
+        self.assertFalse(os.path.exists(self.filename))
+        self.assertEqual(self.server.requests[-1][1].get("if-none-match"),
+                         etag(DATA))
+
+    def test_revalidate_cached(self):
+        first = self.path("one", "plugin.zip")
+        second = self.path("two", "plugin.zip")
+        install.download(self.url, first)
+        cache = install.getcache()
+        sha256 = cache.digest(self.url)
+
+        # Fresh cache entries are used without asking the server
+        install.download(self.url, second)
+        self.assertEqual(len(self.server.requests), 1)
+
+        # Stale ones are revalidated, and the server answers 304
+        os.unlink(second)
+        cache.index["validators"][self.url]["checked"] = 0
+        install.download(self.url, second)
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.server.requests[-1][1].get("if-none-match"),
+                         etag(DATA))
+        self.assertEqual(readfile(second), DATA)
+        self.assertEqual(cache.digest(self.url), sha256)
+        self.assertTrue(cache.isfresh(self.url))
+
+    def test_downloader(self):
+        done = []
+        with Downloader(4, callback=done.append) as downloader:
+            ok = downloader.add("ok", self.url, self.path("ok.zip"))
+            missing = downloader.add("missing", self.server.url("no.zip"),
+                                     self.path("no.zip"))
+            downloader.wait()
+        self.assertTrue(ok.ok)
+        self.assertEqual(readfile(self.path("ok.zip")), DATA)
+        self.assertFalse(missing.ok)
+        self.assertFalse(os.path.exists(self.path("no.zip")))
+        self.assertEqual(sorted(r.name for r in done), ["missing", "ok"])
+
+if __name__ == "__main__":
+    unittest.main()
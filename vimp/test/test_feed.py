@@ -0,0 +1,173 @@
+import gzip
+import os
+import unittest
+
+from vimp import install
+from vimp.cache import ChecksumError
+from vimp.feed import (Feed, apply_delta, make_delta, publish, read_json)
+from vimp.test.helpers import (TempDirTest, TempHomeTest, readfile)
+from vimp.test.server import Server
+
+VERSIONS = [
+    ({"foo": "foo-1.0"}, {"foo-1.0": {"about": "Foo"}}),
+    ({"foo": "foo-2.0"}, {"foo-1.0": {"about": "Foo"},
+                          "foo-2.0": {"about": "Foo 2"}}),
+    ({"foo": "foo-2.0", "bar": "bar-1.0"}, {"foo-2.0": {"about": "Foo 2"},
+                                            "bar-1.0": {"about": "Bar"}}),
+]
+
+class TestDelta(unittest.TestCase):
+    def test_roundtrip(self):
+        old = {"version": 1, "aliases": VERSIONS[1][0],
+               "scripts": VERSIONS[1][1]}
+        new = {"version": 2, "aliases": VERSIONS[2][0],
+               "scripts": VERSIONS[2][1]}
+        delta = make_delta(old, new)
+        self.assertEqual(delta["scripts"]["foo-1.0"], None)
+        self.assertFalse("foo" in delta["aliases"])
+        self.assertEqual(apply_delta(old, delta), new)
+
+        new["release"] = "0.5.0"
+        self.assertEqual(apply_delta(old, make_delta(old, new)), new)
+
+class TestFeed(TempDirTest):
+    def setUp(self):
+        TempDirTest.setUp(self)
+        self.directory = self.path("feed")
+        self.server = Server(directory=self.directory).__enter__()
+        self.feed = Feed(self.server.url(""), self.tmp)
+
+    def tearDown(self):
+        self.server.__exit__(None, None, None)
+        TempDirTest.tearDown(self)
+
+    def publish(self, version):
+        aliases, scripts = VERSIONS[version - 1]
+        self.assertEqual(publish(self.directory, aliases, scripts), version)
+
+    def update(self, local):
+        """Updates local from the feed, and returns the catalog, whether it
+        was built from deltas and the files that were downloaded."""
+        del self.server.requests[:]
+        catalog, incremental = self.feed.update(local)
+        files = [path.lstrip("/") for (path, _) in self.server.requests]
+        return (catalog, incremental, files)
+
+    def tamper(self, name):
+        with gzip.open(os.path.join(self.directory, name), "wb") as f:
+            f.write(b'{"version": 2, "scripts": {"evil": {}}}')
+
+    def test_full(self):
+        self.publish(1)
+        catalog, incremental, files = self.update(None)
+        self.assertEqual(catalog, {"version": 1, "aliases": VERSIONS[0][0],
+                                   "scripts": VERSIONS[0][1]})
+        self.assertFalse(incremental)
+        self.assertEqual(files, ["index.json", "catalog-1.json.gz"])
+
+        # Nothing but the index is fetched when there is nothing new
+        self.assertEqual(self.update(catalog),
+                         (catalog, True, ["index.json"]))
+
+    def test_deltas(self):
+        self.publish(1)
+        local = self.update(None)[0]
+        self.publish(2)
+        self.publish(3)
+        catalog, incremental, files = self.update(local)
+        self.assertEqual(catalog, {"version": 3, "aliases": VERSIONS[2][0],
+                                   "scripts": VERSIONS[2][1]})
+        self.assertTrue(incremental)
+        self.assertEqual(files, ["index.json", "delta-2.json.gz",
+                                 "delta-3.json.gz"])
+
+    def test_deltas_do_not_add_up(self):
+        self.publish(1)
+        local = self.update(None)[0]
+        local["scripts"]["changed-1.0"] = {}
+        self.publish(2)
+        catalog, incremental, files = self.update(local)
+        self.assertFalse(incremental)
+        self.assertFalse("changed-1.0" in catalog["scripts"])
+        self.assertEqual(files[-1], "catalog-2.json.gz")
+
+    def test_checksum(self):
+        self.publish(1)
+        local = self.update(None)[0]
+        self.publish(2)
+        self.tamper("delta-2.json.gz")
+        self.assertRaises(ChecksumError, self.feed.update, local)
+        self.tamper("catalog-2.json.gz")
+        self.assertRaises(ChecksumError, self.feed.update, None)
+        self.assertEqual(os.listdir(self.tmp), ["feed"])
+
+class TestUpdate(TempHomeTest):
+    def setUp(self):
+        from vimp.configure import configure
+        TempHomeTest.setUp(self)
+        configure()
+        self.directory = self.path("feed")
+        self.server = Server(directory=self.directory).__enter__()
+        self.url = self.server.url("")
+
+    def tearDown(self):
+        self.server.__exit__(None, None, None)
+        TempHomeTest.tearDown(self)
+
+    def update(self, *args):
+        from vimp.command import update
+        update(*args)
+        # As the next run of vimp would see it
+        self.reset()
+
+    def search(self, query):
+        from vimp.search import load_index
+        index = load_index(self.path(".vimp", "list", "search"),
+                           install.getcatalog())
+        try:
+            return [name for (_, name) in index.search(query)]
+        finally:
+            index.close()
+
+    def test_update(self):
+        publish(self.directory, *VERSIONS[0])
+        self.update("--url", self.url)
+        self.assertEqual(install.getstate().get_option("feed"), self.url)
+        feed = self.path(".vimp", "list", "feed.json")
+        self.assertEqual(read_json(feed)["version"], 1)
+        self.assertEqual(install.getcatalog().names(), ["foo-1.0"])
+        self.assertEqual(install.get_full_name("foo"), "foo-1.0")
+        self.assertEqual(self.search("foo"), ["foo-1.0"])
+
+        # The catalog and search index are compiled again from the update
+        publish(self.directory, *VERSIONS[1])
+        publish(self.directory, *VERSIONS[2])
+        self.update()
+        self.assertEqual(read_json(feed)["version"], 3)
+        self.assertEqual(install.getcatalog().names(),
+                         ["bar-1.0", "foo-2.0"])
+        self.assertEqual(install.get_full_name("foo"), "foo-2.0")
+        self.assertEqual(self.search("bar"), ["bar-1.0"])
+
+        # Nothing is written when there is nothing new
+        data = readfile(feed)
+        self.update()
+        self.assertEqual(readfile(feed), data)
+
+    def test_older_release(self):
+        from vimp.scripts import (SCRIPTS, __version__)
+        publish(self.directory, *VERSIONS[0], release="0.0.1")
+        self.update("--url", self.url)
+        self.assertEqual(read_json(self.path(".vimp", "list", "feed.json"))
+                         ["release"], "0.0.1")
+        catalog = install.getcatalog()
+        self.assertEqual((catalog.version, catalog.names()),
+                         (__version__, sorted(SCRIPTS)))
+
+        # Until the feed is published from a newer vimp
+        publish(self.directory, *VERSIONS[0], release="999.0")
+        self.update()
+        self.assertEqual(install.getcatalog().names(), ["foo-1.0"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import subprocess
+import sys
+import unittest
+
+from vimp import install
+from vimp.gc import (RECENT, plan, recent, roots)
+from vimp.test.helpers import (TempHomeTest, writefile)
+from vimp.transaction import Transaction
+
+SCRIPTS = {
+    "a-1.0": {"deps": ["b"]},
+    "b-1.0": {},
+    "c-1.0": {},
+    "d-1.0": {},
+}
+
+class TestGC(TempHomeTest):
+    def setUp(self):
+        TempHomeTest.setUp(self)
+        self.catalog({"a": "a-1.0", "b": "b-1.0", "c": "c-1.0",
+                      "d": "d-1.0"}, SCRIPTS)
+        self.state = install.getstate()
+
+    def add(self, full, **flags):
+        enabled = flags.pop("enabled", True)
+        writefile(os.path.join(install.getpath("install", full), "x.vim"),
+                  full)
+        self.state.add(full, full.split("-")[0], ["x.vim"], [], **flags)
+        self.state.set_enabled(full, enabled)
+
+    def plan(self):
+        return plan(self.state, install.getcatalog(), install.getcache(),
+                    "pathogen")
+
+    def vimp(self, *names):
+        return os.path.join(self.path(".vimp"), *names)
+
+    def old(self, path):
+        """Makes path look like it was last written to long ago."""
+        writefile(os.path.join(path, "file"), "")
+        then = os.path.getmtime(path) - 2 * RECENT
+        for name in (os.path.join(path, "file"), path):
+            os.utime(name, (then, then))
+
+    def exited(self):
+        """Returns the id of a process that is no longer running."""
+        child = subprocess.Popen([sys.executable, "-c", "pass"])
+        child.wait()
+        return child.pid
+
+    def test_roots(self):
+        # A disabled package that was asked for keeps its dependencies
+        self.add("a-1.0", requested=True, enabled=False)
+        self.add("b-1.0")
+        self.add("c-1.0")
+        self.assertEqual(roots(self.state, "pathogen"), ["a-1.0"])
+        packages, paths, objects = self.plan()
+        self.assertEqual(packages, ["c-1.0"])
+        self.assertEqual(paths, [self.vimp("installed", "c-1.0")])
+        self.assertEqual(objects, [])
+
+    def test_leftovers(self):
+        self.add("a-1.0", requested=True)
+        self.add("b-1.0")
+        staging = self.vimp("installed", "c-1.0.staging.%d" % self.exited())
+        self.old(staging)
+        self.old(self.vimp("download", "c-1.0"))
+        self.old(self.vimp("git", "example.com_c.git"))
+        self.assertEqual(self.plan()[1], [
+            staging,
+            self.vimp("download", "c-1.0"),
+            self.vimp("git", "example.com_c.git"),
+        ])
+
+    def test_running(self):
+        self.add("a-1.0", requested=True)
+        self.add("b-1.0")
+
+        # An install of d in another vimp, with its download just done
+        txn = Transaction(self.state, "d-1.0", install.getpath("install",
+                          "d-1.0"), install.getpath("journal"))
+        txn.data["pid"] = os.getppid()
+        txn.begin()
+        self.old(self.vimp("download", "d-1.0"))
+        self.old(txn.staging)
+
+        # An upgrade of c, in a process that has not written its journal
+        self.add("c-1.0")
+        backup = self.vimp("installed", "c-1.0.backup.%d" % os.getppid())
+        self.old(backup)
+
+        # A download, and a fetch into a git store, in progress
+        writefile(self.vimp("download", "e-1.0", "e.zip.part"), "")
+        writefile(self.vimp("git", "example.com_e.git", "HEAD"), "")
+
+        packages, paths, objects = self.plan()
+        self.assertEqual(packages, ["c-1.0"])
+        self.assertEqual(paths, [self.vimp("installed", "c-1.0")])
+
+        txn.publish()
+        self.assertEqual(self.plan()[1], [self.vimp("installed", "c-1.0")])
+
+    def test_recent(self):
+        self.old(self.path("x"))
+        self.assertFalse(recent(self.path("x")))
+        writefile(self.path("x", "y", "z"), "")
+        self.assertTrue(recent(self.path("x")))
+        self.assertTrue(recent(self.path("missing")))
+
+if __name__ == "__main__":
+    unittest.main()
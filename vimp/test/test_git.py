@@ -0,0 +1,92 @@
+import os
+import shutil
+import subprocess
+import tarfile
+import unittest
+
+from vimp.git import (export, fetch, hascommit, revision, storepath)
+from vimp.test.helpers import (TempDirTest, which, writefile)
+
+@unittest.skipIf(which("git") is None, "git is not installed")
+class TestGit(TempDirTest):
+    def setUp(self):
+        TempDirTest.setUp(self)
+        self.root = self.path("store")
+        self.upstream = self.path("upstream.git")
+        self.url = "file://" + self.upstream
+        self.call("git", "init", "--bare", "--quiet", self.upstream)
+        self.call("git", "init", "--quiet", self.path("work"))
+        self.v1 = self.commit("1", "v1")
+        self.v2 = self.commit("2", "v2")
+
+    def call(self, *command):
+        out = subprocess.check_output(command, cwd=self.tmp,
+                                      stderr=subprocess.STDOUT)
+        return out.decode("utf-8").strip()
+
+    def commit(self, text, tag):
+        """Commits a new plugin/foo.vim upstream and tags it."""
+        work = self.path("work")
+        writefile(os.path.join(work, "plugin", "foo.vim"), text)
+        git = ["git", "-C", work, "-c", "user.name=vimp",
+               "-c", "user.email=vimp@localhost"]
+        self.call(*(git + ["add", "."]))
+        self.call(*(git + ["commit", "--quiet", "-m", tag]))
+        self.call(*(git + ["tag", tag]))
+        self.call(*(git + ["push", "--quiet", self.upstream, "HEAD:master",
+                          tag]))
+        return self.call(*(git + ["rev-parse", "HEAD"]))
+
+    def store(self):
+        return storepath(self.root, self.url)
+
+    def depth(self, commit):
+        """Returns the number of commits in the store's history of commit."""
+        return int(self.call("git", "--git-dir", self.store(), "rev-list",
+                            "--count", commit))
+
+    def test_shallow(self):
+        filename = self.path("foo-2.tar")
+        self.assertEqual(export(self.root, self.url, "v2", "foo-2", filename),
+                         self.v2)
+        self.assertEqual(revision(self.root, self.url, "foo-2"), self.v2)
+        self.assertEqual(revision(self.root, self.url, "foo-1"), None)
+
+        # Only the tagged commit is fetched, not its parent
+        self.assertTrue(os.path.isfile(os.path.join(self.store(), "shallow")))
+        self.assertEqual(self.depth(self.v2), 1)
+        self.assertFalse(hascommit(self.store(), self.v1))
+
+        with tarfile.open(filename) as tar:
+            self.assertEqual(tar.extractfile("plugin/foo.vim").read(), b"2")
+
+    def test_new_commit(self):
+        fetch(self.root, self.url, "v1", "foo-1")
+        v3 = self.commit("3", "v3")
+        self.assertEqual(fetch(self.root, self.url, "v3", "foo-3"), v3)
+
+        # Both versions are in the same store
+        self.assertEqual(os.listdir(self.root),
+                         [os.path.basename(self.store())])
+        self.assertTrue(hascommit(self.store(), self.v1))
+        self.assertTrue(hascommit(self.store(), v3))
+        self.assertEqual(revision(self.root, self.url, "foo-1"), self.v1)
+
+    def test_shared_store(self):
+        fetch(self.root, self.url, "v1", "foo-1")
+
+        # Another recipe for the same repository, with a differently
+        # written url, uses the same store
+        url = self.url + "/"
+        self.assertEqual(storepath(self.root, url), self.store())
+        self.assertEqual(fetch(self.root, url, "v2", "foo@other"), self.v2)
+        self.assertEqual(os.listdir(self.root),
+                         [os.path.basename(self.store())])
+
+        # A commit the store has is not fetched again
+        shutil.rmtree(self.upstream)
+        self.assertEqual(fetch(self.root, url, self.v1, "bar-1"), self.v1)
+        self.assertEqual(revision(self.root, url, "bar-1"), self.v1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import os
+import shutil
+import subprocess
+import unittest
+
+from vimp import install
+from vimp.helptags import (find_tags, helptags, helptags_all)
+from vimp.test.helpers import (TempDirTest, TempHomeTest, readfile, which,
+                               writefile)
+
+DOCS = {
+    "abc": {
+        "abc.txt": b"*abc.txt*  For Vim\n"
+                   b"Commands\t\t\t\t*abc-commands* *:Abc*\n"
+                   b"See |abc-commands| and *not a tag* or x*abc-no*\n"
+                   b"*abc-dup*\n",
+        "more.txt": b"*abc-dup* is already in abc.txt\n"
+                    b"*abc/slash*\n",
+    },
+    "def": {
+        "def.txt": b"*def.txt*  \xc3\xa6\xc3\xb8\xc3\xa5\n",
+    },
+}
+
+TAGS = {
+    "abc": b":Abc\tabc.txt\t/*:Abc*\n"
+           b"abc-commands\tabc.txt\t/*abc-commands*\n"
+           b"abc-dup\tabc.txt\t/*abc-dup*\n"
+           b"abc.txt\tabc.txt\t/*abc.txt*\n"
+           b"abc/slash\tmore.txt\t/*abc\\/slash*\n",
+    "def": b"!_TAG_FILE_ENCODING\tutf-8\t//\n"
+           b"def.txt\tdef.txt\t/*def.txt*\n",
+}
+
+class TestHelptags(TempDirTest):
+    def setUp(self):
+        TempDirTest.setUp(self)
+        for package in DOCS:
+            for (name, data) in DOCS[package].items():
+                writefile(self.path(package, "doc", name), data)
+        # Only README files, and no doc directory at all
+        writefile(self.path("readme", "doc", "README"), "")
+        writefile(self.path("none", "plugin", "none.vim"), "")
+
+    def docdir(self, package):
+        return self.path(package, "doc")
+
+    def test_find_tags(self):
+        self.assertEqual(find_tags(b"*a* *b*\t*c*\n"), [b"a", b"b", b"c"])
+        self.assertEqual(find_tags(b"x*a* *b c* *d|e* **\n"), [])
+        self.assertEqual(find_tags(b"*a*b *c*\r\n"), [b"c"])
+
+    def test_helptags(self):
+        self.assertEqual(helptags(self.docdir("abc")), 5)
+        self.assertEqual(readfile(self.path("abc", "doc", "tags")),
+                         TAGS["abc"])
+        self.assertEqual(helptags(self.docdir("readme")), None)
+        self.assertFalse(os.path.exists(self.path("readme", "doc", "tags")))
+
+    def test_all(self):
+        docdirs = [self.docdir(p) for p in ("abc", "def", "readme", "none")]
+        self.assertEqual(helptags_all(docdirs, jobs=2), {})
+        for package in DOCS:
+            self.assertEqual(readfile(self.path(package, "doc", "tags")),
+                             TAGS[package])
+        self.assertEqual(os.listdir(self.docdir("readme")), ["README"])
+        self.assertFalse(os.path.exists(self.docdir("none")))
+
+    def test_failed(self):
+        os.mkdir(self.path("def", "doc", "dir.txt"))
+        failed = helptags_all([self.docdir("abc"), self.docdir("def")])
+        self.assertEqual(list(failed), [self.docdir("def")])
+        self.assertEqual(readfile(self.path("abc", "doc", "tags")),
+                         TAGS["abc"])
+
+    @unittest.skipIf(which("vim") is None, "vim is not installed")
+    def test_vim(self):
+        # The same tags as vim's own :helptags
+        os.rename(self.path("abc", "doc", "more.txt"),
+                  self.path("more.txt"))
+        shutil.copytree(self.docdir("abc"), self.path("vim"))
+        helptags(self.docdir("abc"))
+        with open(os.devnull, "w") as null:
+            subprocess.call(["vim", "-N", "-u", "NONE", "-i", "NONE", "-n",
+                             "--not-a-term", "-c", "helptags " +
+                             self.path("vim"), "-c", "qa!"],
+                            stdin=null, stdout=null, stderr=null)
+        self.assertEqual(readfile(self.path("abc", "doc", "tags")),
+                         readfile(self.path("vim", "tags")))
+
+class TestCommand(TempHomeTest):
+    def setUp(self):
+        TempHomeTest.setUp(self)
+        packages = sorted(DOCS) + ["none"]
+        self.catalog(dict((p, p + "-1.0") for p in packages),
+                     dict((p + "-1.0", {}) for p in packages))
+        state = install.getstate()
+        for package in packages:
+            path = install.getpath("install", package)
+            for (name, data) in DOCS.get(package, {}).items():
+                writefile(os.path.join(path, "doc", name), data)
+            writefile(os.path.join(path, "plugin", package + ".vim"), "")
+            state.add(package + "-1.0", package, install.listfiles(path), [])
+        state.set_enabled("def-1.0", False)
+
+    def tags(self, package):
+        return os.path.join(install.getpath("install", package), "doc",
+                            "tags")
+
+    def test_helptags(self):
+        from vimp.command import helptags
+        writefile(self.tags("abc"), "stale")
+        helptags()
+        for package in DOCS:
+            self.assertEqual(readfile(self.tags(package)), TAGS[package])
+        self.assertFalse(os.path.exists(os.path.dirname(self.tags("none"))))
+
+        os.unlink(self.tags("abc"))
+        os.unlink(self.tags("def"))
+        helptags("def")
+        self.assertFalse(os.path.exists(self.tags("abc")))
+        self.assertEqual(readfile(self.tags("def")), TAGS["def"])
+
+    def test_failed(self):
+        from vimp.command import helptags
+        os.mkdir(os.path.join(os.path.dirname(self.tags("abc")), "dir.txt"))
+        self.assertRaises(SystemExit, helptags)
+        self.assertEqual(readfile(self.tags("def")), TAGS["def"])
+
+if __name__ == "__main__":
+    unittest.main()
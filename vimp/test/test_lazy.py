@@ -0,0 +1,72 @@
+import os
+import subprocess
+import unittest
+
+from vimp.lazy import (render_stubs, triggers)
+from vimp.scripts import SCRIPTS
+from vimp.test.helpers import (TempDirTest, readfile, which, writefile)
+
+PLUGIN = """
+let g:loaded = get(g:, 'loaded', 0) + 1
+command! Foo let g:commands = get(g:, 'commands', 0) + 1
+nnoremap <Leader>f :let g:normal = get(g:, 'normal', 0) + 1<Cr>
+xnoremap <Leader>f :<C-u>let g:visual = get(g:, 'visual', 0) + 1<Cr>
+"""
+
+class TestTriggers(unittest.TestCase):
+    def test_triggers(self):
+        self.assertEqual(triggers({}), None)
+        self.assertEqual(triggers({"lazy": {"commands": []}}), None)
+        self.assertEqual(triggers({"lazy": {"mappings": ["<Leader>f"]}}),
+                         {"mappings": ["<Leader>f"]})
+
+    def test_statusline_eager(self):
+        # A statusline must be drawn from the start
+        for name in ("powerline-7.2", "airline-0.6"):
+            self.assertEqual(triggers(SCRIPTS[name]), None)
+
+    def test_escaped(self):
+        out = render_stubs([("foo", "/b/foo", {"mappings": ["<Leader>f"]})])
+        self.assertTrue("nnoremap <silent> <Leader>f :<C-u>call VimpLazyMap("
+                        "'foo', '/b/foo', [], ['<lt>Leader>f'], "
+                        "'<lt>Leader>f', '')<Cr>\n" in out)
+        self.assertTrue("xnoremap <silent> <Leader>f " in out)
+        self.assertEqual(render_stubs([]), "")
+
+@unittest.skipIf(which("vim") is None, "vim is not installed")
+class TestVim(TempDirTest):
+    def setUp(self):
+        TempDirTest.setUp(self)
+        writefile(self.path("foo", "plugin", "foo.vim"), PLUGIN)
+        writefile(self.path("stubs.vim"), render_stubs([
+            ("foo", self.path("foo"), {"commands": ["Foo"],
+                                       "mappings": ["<Leader>f"]})]))
+
+    def run_vim(self, keys, leader="\\"):
+        """Types keys in vim with the stubs, and returns the counters."""
+        script = [
+            "let mapleader = '%s'" % leader,
+            "source %s" % self.path("stubs.vim"),
+            'call feedkeys("%s", "x")' % keys,
+            "call writefile(map(['loaded', 'commands', 'normal', 'visual'],"
+            " 'string(get(g:, v:val, 0))'), '%s')" % self.path("out"),
+            "qa!",
+        ]
+        writefile(self.path("test.vim"), "\n".join(script) + "\n")
+        with open(os.devnull, "w") as null:
+            subprocess.call(["vim", "-N", "-u", "NONE", "-i", "NONE", "-n",
+                             "--not-a-term", "-S", self.path("test.vim")],
+                            stdin=null, stdout=null, stderr=null)
+        return [int(n) for n in readfile(self.path("out")).split()]
+
+    def test_mapping(self):
+        # The stub loads the plugin once, then types its mapping again
+        self.assertEqual(self.run_vim("\\\\f\\\\f"), [1, 0, 2, 0])
+        self.assertEqual(self.run_vim("v\\\\f\\\\f"), [1, 0, 1, 1])
+        self.assertEqual(self.run_vim(",f", leader=","), [1, 0, 1, 0])
+
+    def test_command(self):
+        self.assertEqual(self.run_vim(":Foo\\r:Foo\\r\\\\f"), [1, 2, 1, 0])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import unittest
+
+from vimp import install
+from vimp.lock import (LockError, compare, lock_entries, read_lock, write_lock)
+from vimp.test.helpers import (TempDirTest, TempHomeTest, maketar, readfile,
+                               writefile)
+from vimp.test.server import Server
+
+class TestLockfile(TempDirTest):
+    def test_roundtrip(self):
+        packages = {"foo-1.0": {"name": "foo", "url": "http://x/foo.zip",
+                                "sha256": "ab", "requested": True,
+                                "lazy": False}}
+        write_lock(self.path("vimp.lock"), packages)
+        self.assertEqual(read_lock(self.path("vimp.lock")), packages)
+
+    def test_bad(self):
+        self.assertRaises(LockError, read_lock, self.path("missing"))
+        writefile(self.path("bad"), "{")
+        self.assertRaises(LockError, read_lock, self.path("bad"))
+        writefile(self.path("old"), '{"version": 0}')
+        self.assertRaises(LockError, read_lock, self.path("old"))
+
+    def test_compare(self):
+        current = {"a-1": {"sha256": "1"}, "b-1": {"commit": "c1"},
+                   "c-1": {"sha256": None, "lazy": True}, "d-1": {}}
+        locked = {"a-1": {"sha256": "2"}, "b-1": {"commit": "c2"},
+                  "c-1": {"sha256": "3"}, "e-1": {"sha256": "4"},
+                  "d-1": {"sha256": None, "lazy": True}}
+        self.assertEqual(compare(current, locked),
+                         (["a-1", "b-1", "c-1"], ["c-1", "d-1"]))
+        self.assertEqual(compare(current, current), ([], []))
+
+class TestSync(TempHomeTest):
+    def setUp(self):
+        TempHomeTest.setUp(self)
+        self.server = Server().__enter__()
+        self.publish("let g:foo = 1\n")
+        url = self.server.url("foo.tar.gz")
+        self.catalog({"foo": "foo-1.0"}, {"foo-1.0": {
+            "about": "Foo",
+            "download": [url, "foo.tar.gz"],
+            "extract": [["foo/plugin/foo.vim", "{install}/plugin/foo.vim"]],
+            "symlink": [["{install}", "{bundle}"]],
+            "lazy": {"commands": ["Foo"]},
+        }})
+
+    def tearDown(self):
+        self.server.__exit__(None, None, None)
+        TempHomeTest.tearDown(self)
+
+    def publish(self, text):
+        maketar(self.path("foo.tar.gz"), {"foo/plugin/foo.vim": text})
+        self.server.files["foo.tar.gz"] = readfile(self.path("foo.tar.gz"))
+
+    def installed(self):
+        return readfile(self.path(".vimp", "installed", "foo-1.0", "plugin",
+                                  "foo.vim"))
+
+    def test_sync(self):
+        from vimp.command import (install as install_command, lock, remove,
+                                  sync)
+
+        # Pathogen installed by hand, so that install does not fetch it
+        writefile(self.path(".vim", "autoload", "pathogen.vim"), "")
+        install_command("foo")
+        install.getstate().set_lazy("foo-1.0", True)
+        lock(self.path("vimp.lock"))
+        locked = read_lock(self.path("vimp.lock"))["foo-1.0"]
+        self.assertTrue(locked["lazy"])
+        self.assertTrue(locked["requested"])
+
+        # Install another build of the same version, and eagerly
+        self.publish("let g:foo = 2\n")
+        remove("foo")
+        install.getcache().remove([locked["sha256"]])
+        install_command("foo")
+        self.assertEqual(self.installed(), b"let g:foo = 2\n")
+        current = lock_entries(install.getstate(), install.getcatalog(),
+                               install.getcache())
+        self.assertEqual(compare(current, read_lock(self.path("vimp.lock"))),
+                         (["foo-1.0"], ["foo-1.0"]))
+
+        # The locked build is installed again, and made lazy
+        self.publish("let g:foo = 1\n")
+        sync(self.path("vimp.lock"))
+        self.assertEqual(self.installed(), b"let g:foo = 1\n")
+        entry = install.getstate().get("foo-1.0")
+        self.assertEqual(entry["sha256"], locked["sha256"])
+        self.assertTrue(entry["lazy"])
+        self.assertTrue(entry["requested"])
+        self.assertTrue(os.path.islink(self.path(".vim", "bundle", "foo")))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import shutil
+import unittest
+
+from vimp.gc import reclaimable
+from vimp.objects import ObjectStore
+from vimp.test.helpers import (TempDirTest, readfile, writefile)
+
+class TestObjectStore(TempDirTest):
+    def setUp(self):
+        TempDirTest.setUp(self)
+        self.store = ObjectStore(self.path("objects"))
+        for package in ("a", "b"):
+            writefile(self.path(package, "plugin", "same.vim"), "x" * 100)
+            writefile(self.path(package, "plugin", package + ".vim"), package)
+
+    def inode(self, *names):
+        st = os.lstat(self.path(*names))
+        return (st.st_dev, st.st_ino)
+
+    def test_dedup(self):
+        self.assertEqual(self.store.dedup(self.path("a")), (0, 0))
+        self.assertEqual(self.store.dedup(self.path("b")), (1, 100))
+        self.assertEqual(self.inode("a", "plugin", "same.vim"),
+                         self.inode("b", "plugin", "same.vim"))
+        self.assertNotEqual(self.inode("a", "plugin", "a.vim"),
+                            self.inode("b", "plugin", "b.vim"))
+
+        # Adding the same directory again changes nothing
+        self.assertEqual(self.store.dedup(self.path("b")), (0, 0))
+        self.assertEqual(self.store.stats(), (3, 102, 100))
+        self.assertEqual(len(self.store.inodes()), 3)
+
+    def test_unused(self):
+        self.store.dedup(self.path("a"))
+        self.store.dedup(self.path("b"))
+        shutil.rmtree(self.path("a"))
+        self.assertEqual([readfile(p) for p in self.store.unused()], [b"a"])
+        shutil.rmtree(self.path("b"))
+        self.assertEqual(len(self.store.unused()), 3)
+
+    def test_edited(self):
+        self.store.dedup(self.path("a"))
+        # Edited in place, which changes the object as well
+        with open(self.path("a", "plugin", "same.vim"), "ab") as f:
+            f.write(b"edited")
+
+        # The object is replaced by the unchanged copy, and a keeps its edit
+        self.assertEqual(self.store.dedup(self.path("b")), (0, 0))
+        self.assertTrue(self.inode("b", "plugin", "same.vim") in
+                        self.store.inodes())
+        self.assertFalse(self.inode("a", "plugin", "same.vim") in
+                         self.store.inodes())
+        self.assertEqual(readfile(self.path("a", "plugin", "same.vim")),
+                         b"x" * 100 + b"edited")
+        writefile(self.path("c", "same.vim"), "x" * 100)
+        self.assertEqual(self.store.dedup(self.path("c")), (1, 100))
+
+    def test_reclaimable(self):
+        self.store.dedup(self.path("a"))
+        self.store.dedup(self.path("b"))
+        shared = self.store.inodes()
+
+        # Files still linked from b are not freed by deleting a
+        self.assertEqual(reclaimable([self.path("a")], shared), 1)
+        self.assertEqual(reclaimable([self.path("a"), self.path("b")],
+                                     shared), 102)
+        # Unless their objects are removed too, they stay on disk
+        self.assertEqual(reclaimable([self.path("a"), self.path("b")]), 0)
+
+if __name__ == "__main__":
+    unittest.main()
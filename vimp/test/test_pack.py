@@ -0,0 +1,181 @@
+import os
+import unittest
+
+from vimp import install
+from vimp.pack import (BUNDLE, build, packed_names, plan, runtimefiles)
+from vimp.test.helpers import (TempDirTest, TempHomeTest, readfile, writefile)
+from vimp.util import symlink
+
+SCRIPTS = {
+    "pathogen-2.3": {
+        "symlink": [["{install}/autoload/pathogen.vim",
+                     "{vim}/autoload/pathogen.vim"]],
+        "vimrc": ["execute pathogen#infect()"],
+    },
+    "abc-1.0": {"symlink": [["{install}", "{bundle}"]]},
+    "def-1.0": {"symlink": [["{install}", "{bundle}"]]},
+    "lazy-1.0": {
+        "symlink": [["{install}", "{bundle}"]],
+        "lazy": {"commands": ["Lazy"]},
+    },
+    "same-1.0": {"symlink": [["{install}", "{bundle}"]]},
+}
+
+FILES = {
+    "abc-1.0": {"plugin/abc.vim": "", "autoload/abc.vim": "",
+                "doc/abc.txt": "*abc*\n", "doc/tags": "stale", "README": ""},
+    "def-1.0": {"plugin/def.vim": "", "doc/def.txt": "*def*\n"},
+    "lazy-1.0": {"plugin/lazy.vim": ""},
+    "same-1.0": {"plugin/def.vim": ""},
+}
+
+class TestPlan(TempDirTest):
+    def setUp(self):
+        TempDirTest.setUp(self)
+        for full in FILES:
+            for (rel, data) in FILES[full].items():
+                writefile(self.path(full, rel), data)
+        self.manifest = self.path("packed.json")
+
+    def links(self, *fulls):
+        return dict((rel, self.path(full, rel)) for full in fulls
+                    for rel in runtimefiles(self.path(full)))
+
+    def tree(self):
+        """Returns the links in the packed tree, relative to it."""
+        found = {}
+        for base, _, names in os.walk(self.path("packed")):
+            for name in names:
+                path = os.path.join(base, name)
+                rel = os.path.relpath(path, self.path("packed"))
+                if os.path.islink(path):
+                    found[rel] = os.readlink(path)
+        return found
+
+    def test_runtimefiles(self):
+        # Each plugin's own tags are left out, and so is the README
+        self.assertEqual(runtimefiles(self.path("abc-1.0")),
+                         ["autoload/abc.vim", "doc/abc.txt", "plugin/abc.vim"])
+
+    def test_conflicts(self):
+        links, packed, conflicts = plan([
+            (full, self.path(full)) for full in ("abc-1.0", "def-1.0",
+                                                 "same-1.0")])
+        self.assertEqual(conflicts, [("plugin/def.vim",
+                                      ["def-1.0", "same-1.0"])])
+        self.assertEqual(packed, ["abc-1.0"])
+        self.assertEqual(links, self.links("abc-1.0"))
+
+    def test_incremental(self):
+        path = self.path("packed")
+        both = self.links("abc-1.0", "def-1.0")
+        self.assertEqual(build(path, self.manifest, both,
+                               ["abc-1.0", "def-1.0"]), (5, 0))
+        self.assertEqual(self.tree(), both)
+        self.assertEqual(packed_names(self.manifest), ["abc-1.0", "def-1.0"])
+        self.assertEqual(build(path, self.manifest, both,
+                               ["abc-1.0", "def-1.0"]), (0, 0))
+
+        # Only the links of the plugin that is left out are touched
+        before = os.lstat(self.path("packed", "plugin", "def.vim")).st_ino
+        self.assertEqual(build(path, self.manifest, self.links("def-1.0"),
+                               ["def-1.0"]), (0, 3))
+        self.assertEqual(self.tree(), self.links("def-1.0"))
+        self.assertEqual(os.lstat(self.path("packed", "plugin",
+                                            "def.vim")).st_ino, before)
+        self.assertFalse(os.path.exists(self.path("packed", "autoload")))
+        self.assertEqual(packed_names(self.manifest), ["def-1.0"])
+
+        self.assertEqual(build(path, self.manifest, self.links("abc-1.0"),
+                               ["abc-1.0"]), (3, 2))
+        self.assertEqual(self.tree(), self.links("abc-1.0"))
+
+    def test_tags(self):
+        path = self.path("packed")
+        tags = self.path("packed", "doc", "tags")
+        build(path, self.manifest, self.links("abc-1.0", "def-1.0"), [])
+        self.assertEqual(readfile(tags), b"abc\tabc.txt\t/*abc*\n"
+                                         b"def\tdef.txt\t/*def*\n")
+        build(path, self.manifest, self.links("def-1.0"), [])
+        self.assertEqual(readfile(tags), b"def\tdef.txt\t/*def*\n")
+
+        # Without help files, the tags and doc directory go away
+        build(path, self.manifest, self.links("lazy-1.0"), [])
+        self.assertFalse(os.path.exists(self.path("packed", "doc")))
+        self.assertEqual(packed_names(self.path("missing.json")), [])
+
+class TestPacked(TempHomeTest):
+    def setUp(self):
+        TempHomeTest.setUp(self)
+        self.catalog(dict((full.split("-")[0], full) for full in SCRIPTS),
+                     SCRIPTS)
+        writefile(self.path(".vimp", "installed", "pathogen-2.3", "autoload",
+                            "pathogen.vim"), "")
+        for full in sorted(SCRIPTS):
+            self.add(full)
+        from vimp.command import lazy
+        lazy("lazy")
+        install.update_vimprc(force=True)
+
+    def add(self, full):
+        """Installs a package by hand, as install_script would."""
+        state = install.getstate()
+        path = install.getpath("install", full)
+        for (rel, data) in FILES.get(full, {}).items():
+            writefile(os.path.join(path, rel), data)
+        links = [(install.expandvars(full, src), install.expandvars(full, dst))
+                 for (src, dst) in SCRIPTS[full]["symlink"]]
+        for (src, dst) in links:
+            symlink(src, dst)
+        state.add(full, full.split("-")[0], install.listfiles(path), links,
+                  requested=True)
+
+    def packed(self, *names):
+        return self.path(".vimp", "packed", *names)
+
+    def test_pack(self):
+        from vimp.command import (disable, pack)
+        pack()
+        install.update_vimprc()
+        bundle = self.path(".vim", "bundle", BUNDLE)
+        self.assertEqual(os.readlink(bundle), self.packed())
+
+        # Conflicting and lazy plugins are left as bundles
+        state = install.getstate()
+        self.assertEqual(state.get_option("packed"), True)
+        self.assertEqual(packed_names(self.packed() + ".json"), ["abc-1.0"])
+        self.assertEqual(sorted(os.listdir(self.packed("plugin"))),
+                         ["abc.vim"])
+        self.assertEqual(readfile(self.packed("doc", "tags")),
+                         b"abc\tabc.txt\t/*abc*\n")
+        vimrc = readfile(self.path(".vimp", "vimrc")).decode("utf-8")
+        self.assertTrue("+ ['lazy', 'abc']\n" in vimrc)
+
+        # Without the conflict, def is packed too
+        disable("same")
+        install.update_vimprc()
+        self.assertEqual(packed_names(self.packed() + ".json"),
+                         ["abc-1.0", "def-1.0"])
+        self.assertEqual(sorted(os.listdir(self.packed("plugin"))),
+                         ["abc.vim", "def.vim"])
+        self.assertEqual(readfile(self.packed("doc", "tags")),
+                         b"abc\tabc.txt\t/*abc*\n"
+                         b"def\tdef.txt\t/*def*\n")
+
+        disable("abc")
+        install.update_vimprc()
+        self.assertEqual(sorted(os.listdir(self.packed())), ["doc", "plugin"])
+        self.assertEqual(readfile(self.packed("doc", "tags")),
+                         b"def\tdef.txt\t/*def*\n")
+
+        pack("-d")
+        install.update_vimprc()
+        self.assertEqual(state.get_option("packed"), False)
+        self.assertFalse(os.path.lexists(self.packed()))
+        self.assertFalse(os.path.lexists(self.packed() + ".json"))
+        self.assertFalse(os.path.lexists(bundle))
+        vimrc = readfile(self.path(".vimp", "vimrc")).decode("utf-8")
+        self.assertTrue("+ ['lazy']\n" in vimrc)
+
+if __name__ == "__main__":
+    unittest.main()
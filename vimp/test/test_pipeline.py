@@ -0,0 +1,86 @@
+import os
+import threading
+import unittest
+
+from vimp import install
+from vimp.pipeline import install_all
+from vimp.test.helpers import (TempHomeTest, maketar, makezip, readfile)
+from vimp.test.server import Server
+
+class TestPipeline(TempHomeTest):
+    def setUp(self):
+        TempHomeTest.setUp(self)
+        maketar(self.path("foo.tar.gz"), {
+            "pkg/plugin/foo.vim": "let g:foo = 1\n",
+            "pkg/doc/foo.txt": "*foo.txt*  Foo\n",
+        })
+        makezip(self.path("bar.zip"),
+                {"bar/plugin/bar.vim": "let g:bar = 1\n"})
+        self.server = Server({
+            "foo.tar.gz": readfile(self.path("foo.tar.gz")),
+            "bar.zip": readfile(self.path("bar.zip")),
+        }).__enter__()
+
+        def script(archive, pairs, deps=()):
+            return {"about": "Test", "deps": list(deps),
+                    "download": [self.server.url(archive), archive],
+                    "extract": pairs,
+                    "symlink": [["{install}", "{bundle}"]]}
+
+        self.catalog({"foo": "foo-1.0", "bar": "bar-2.0", "baz": "baz-1.0"}, {
+            "foo-1.0": script("foo.tar.gz", [
+                ["pkg/plugin/foo.vim", "{install}/plugin/foo.vim"],
+                ["pkg/doc/*", "{install}/doc"]], ["bar"]),
+            "bar-2.0": script("bar.zip", [
+                ["bar/plugin/bar.vim", "{install}/plugin/bar.vim"]]),
+            "baz-1.0": script("missing.zip", [
+                ["baz/plugin/baz.vim", "{install}/plugin/baz.vim"]]),
+        })
+
+    def tearDown(self):
+        self.server.__exit__(None, None, None)
+        TempHomeTest.tearDown(self)
+
+    def test_install_with_deps(self):
+        self.assertEqual(install_all(["foo"]), {})
+        state = install.getstate()
+        self.assertEqual(state.installed(), ["bar-2.0", "foo-1.0"])
+        self.assertTrue(state.get("foo-1.0")["requested"])
+        self.assertFalse(state.get("bar-2.0")["requested"])
+
+        bundle = self.path(".vim", "bundle")
+        self.assertEqual(readfile(os.path.join(bundle, "foo", "plugin",
+                                               "foo.vim")), b"let g:foo = 1\n")
+        self.assertTrue(os.path.exists(os.path.join(bundle, "bar", "plugin",
+                                                    "bar.vim")))
+        # Help tags are generated at install time
+        self.assertEqual(readfile(os.path.join(bundle, "foo", "doc", "tags")),
+                         b"foo.txt\tfoo.txt\t/*foo.txt*\n")
+        # Downloads are removed once they are installed
+        self.assertEqual(os.listdir(self.path(".vimp", "download")), [])
+
+    def test_failed_download(self):
+        failed = install_all(["baz", "bar"])
+        self.assertEqual(sorted(failed), ["baz"])
+        self.assertEqual(install.getstate().installed(), ["bar-2.0"])
+        self.assertFalse(os.path.exists(self.path(".vimp", "installed",
+                                                  "baz-1.0")))
+
+    def test_already_installed(self):
+        install_all(["bar"])
+        self.assertEqual(install_all(["bar"]), {})
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_getcache_threads(self):
+        # The cache is created once, even if threads race to create it
+        caches = []
+        threads = [threading.Thread(target=lambda: caches.append(
+                   install.getcache())) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(id(c) for c in caches)), 1)
+
+if __name__ == "__main__":
+    unittest.main()
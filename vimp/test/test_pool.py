@@ -0,0 +1,67 @@
+import sys
+import threading
+import time
+import unittest
+
+from vimp.pool import WorkerPool
+
+class TestWorkerPool(unittest.TestCase):
+    def test_results(self):
+        with WorkerPool(4) as pool:
+            tasks = [pool.submit(lambda x: x * x, (i,)) for i in range(20)]
+            pool.join()
+        self.assertEqual([t.result for t in tasks],
+                         [i * i for i in range(20)])
+        self.assertTrue(all(t.done for t in tasks))
+
+    def test_limit_per_key(self):
+        lock = threading.Lock()
+        running = {"now": 0, "max": 0}
+
+        def work():
+            with lock:
+                running["now"] += 1
+                running["max"] = max(running["max"], running["now"])
+            time.sleep(0.02)
+            with lock:
+                running["now"] -= 1
+
+        with WorkerPool(8, limits={"host": 2}) as pool:
+            for _ in range(8):
+                pool.submit(work, key="host")
+            pool.join()
+        self.assertEqual(running["max"], 2)
+
+    def test_error(self):
+        def fail():
+            raise ValueError("boom")
+
+        with WorkerPool(2) as pool:
+            bad = pool.submit(fail)
+            good = pool.submit(lambda: 1)
+            pool.join()
+        self.assertTrue(isinstance(bad.error, ValueError))
+        self.assertTrue(bad.traceback is not None)
+        self.assertEqual(good.result, 1)
+
+    def test_system_exit(self):
+        # A task calling sys.exit must not leave join() waiting forever
+        finished = []
+        with WorkerPool(2) as pool:
+            task = pool.submit(sys.exit, (1,), callback=finished.append)
+            pool.join()
+        self.assertTrue(isinstance(task.error, SystemExit))
+        self.assertEqual(finished, [task])
+
+    def test_callback_error(self):
+        def callback(task):
+            raise RuntimeError("callback")
+
+        with WorkerPool(1) as pool:
+            task = pool.submit(lambda: 2, callback=callback)
+            pool.join()
+        self.assertTrue(task.done)
+        self.assertEqual(task.result, 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+
+from vimp.catalog import (Catalog, compile_catalog)
+from vimp.resolve import (ResolveError, components, resolve)
+from vimp.test.helpers import TempDirTest
+
+ALIASES = {"a": "a-1.0", "b": "b-1.0", "c": "c-1.0", "d": "d-1.0",
+           "x": "x-1.0", "y": "y-1.0", "bad": "bad-1.0", "e": "e-2.0",
+           "old": "old-1.0"}
+SCRIPTS = {
+    "a-1.0": {"deps": ["b", "c"]},
+    "b-1.0": {"deps": ["d"]},
+    "c-1.0": {"deps": ["d"]},
+    "d-1.0": {},
+    # x and y depend on each other
+    "x-1.0": {"deps": ["y"]},
+    "y-1.0": {"deps": ["x", "d"]},
+    "bad-1.0": {"deps": ["missing"]},
+    "e-1.0": {},
+    "e-2.0": {},
+    "old-1.0": {"deps": ["e-1.0"]},
+}
+
+class TestResolve(TempDirTest):
+    def setUp(self):
+        TempDirTest.setUp(self)
+        compile_catalog(self.path("catalog"), "1", ALIASES, SCRIPTS,
+                        self.id())
+        self.catalog = Catalog(self.path("catalog"))
+
+    def tearDown(self):
+        self.catalog.close()
+        TempDirTest.tearDown(self)
+
+    def test_layers(self):
+        plan = resolve(self.catalog, ["a"])
+        self.assertEqual(plan.layers, [["d-1.0"], ["b-1.0", "c-1.0"],
+                                       ["a-1.0"]])
+        self.assertEqual(plan.order[-1], "a-1.0")
+        self.assertTrue("d-1.0" in plan)
+        self.assertEqual(len(plan), 4)
+
+    def test_cycle(self):
+        plan = resolve(self.catalog, ["x"])
+        self.assertEqual(plan.layers, [["d-1.0"], ["x-1.0", "y-1.0"]])
+        self.assertEqual(plan.cycle("y-1.0"), ["x-1.0", "y-1.0"])
+        self.assertEqual(plan.cycle("d-1.0"), [])
+
+    def test_skip(self):
+        plan = resolve(self.catalog, ["a"], skip=lambda f: f == "b-1.0")
+        self.assertEqual(plan.order, ["d-1.0", "c-1.0", "a-1.0"])
+
+    def test_unknown(self):
+        self.assertRaises(ResolveError, resolve, self.catalog, ["nope"])
+        self.assertRaises(ResolveError, resolve, self.catalog, ["bad"])
+
+    def test_conflict(self):
+        self.assertRaises(ResolveError, resolve, self.catalog, ["e", "old"])
+        self.assertRaises(ResolveError, resolve, self.catalog, ["e"],
+                          installed=["e-1.0"])
+        self.assertEqual(len(resolve(self.catalog, ["e"],
+                                     installed=["e-2.0"])), 1)
+
+class TestComponents(unittest.TestCase):
+    def test_components(self):
+        graph = {1: [2], 2: [3], 3: [1], 4: [1], 5: []}
+        self.assertEqual(sorted(components(graph)), [[1, 2, 3], [4], [5]])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+
+from vimp.catalog import (Catalog, compile_catalog)
+from vimp.search import (load_index, phonetic, score)
+from vimp.test.helpers import TempDirTest
+
+SCRIPTS = {
+    "powerline": {"keywords": ["statusline"]},
+    "fugitive": {"keywords": ["git"]},
+    "nerdtree": {"keywords": ["file", "explorer"]},
+    "nerdcommenter": {"keywords": ["comment"]},
+    "l9": {},
+}
+
+class TestScore(unittest.TestCase):
+    def test_phonetic(self):
+        self.assertEqual(phonetic("powrlaine"), phonetic("powerline"))
+
+    def test_order(self):
+        key = phonetic("nerdtree")
+        exact = score("nerdtree", "nerdtree", [], key)
+        prefix = score("nerd", "nerdtree", [], key)
+        keyword = score("explorer", "nerdtree", ["explorer"], key)
+        self.assertTrue(exact > prefix > keyword > 0)
+        self.assertEqual(score("zzz", "nerdtree", [], key), 0)
+
+class TestSearchIndex(TempDirTest):
+    def setUp(self):
+        TempDirTest.setUp(self)
+        compile_catalog(self.path("catalog"), "1", {}, SCRIPTS, "test")
+        self.catalog = Catalog(self.path("catalog"))
+        self.index = load_index(self.path("search"), self.catalog)
+
+    def tearDown(self):
+        self.index.close()
+        self.catalog.close()
+        TempDirTest.tearDown(self)
+
+    def names(self, query):
+        return [name for (_, name) in self.index.search(query)]
+
+    def test_search(self):
+        self.assertEqual(self.names("nerd"), ["nerdtree", "nerdcommenter"])
+        self.assertEqual(self.names("NERDTree")[0], "nerdtree")
+        self.assertEqual(self.names("git"), ["fugitive"])
+        self.assertEqual(self.names("statusline"), ["powerline"])
+        self.assertEqual(self.names("powrlaine"), ["powerline"])
+        self.assertEqual(self.names("nothing-like-it"), [])
+
+    def test_short(self):
+        # Too short for trigrams, so every script is checked
+        self.assertEqual(self.names("l9"), ["l9"])
+
+    def test_matches_full_scan(self):
+        # The trigram index must not lose any match a full scan finds
+        for query in ("tree", "ner", "comment", "fug", "line", "xplor"):
+            everything = []
+            for number in range(len(self.index)):
+                name, key, keywords = self.index.entry(number)
+                if score(query, name, keywords, key) > 0:
+                    everything.append(name)
+            self.assertEqual(sorted(self.names(query)), sorted(everything))
+
+    def test_rebuilt(self):
+        compile_catalog(self.path("catalog"), "2", {},
+                        {"surround": {}}, "test")
+        catalog = Catalog(self.path("catalog"))
+        index = load_index(self.path("search"), catalog)
+        self.assertEqual([n for (_, n) in index.search("surround")],
+                         ["surround"])
+        self.assertEqual(len(index), 1)
+        index.close()
+        catalog.close()
+
+if __name__ == "__main__":
+    unittest.main()
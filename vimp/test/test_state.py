@@ -0,0 +1,77 @@
+import json
+import unittest
+
+from vimp.state import (State, getbasename, getversion, versionkey)
+from vimp.test.helpers import TempDirTest
+
+class TestNames(unittest.TestCase):
+    def test_version(self):
+        self.assertEqual(getversion("nerdtree-4.2.0"), "4.2.0")
+        self.assertEqual(getbasename("nerdtree-4.2.0"), "nerdtree")
+        self.assertEqual(getversion("nerdtree@ctrl-d"), None)
+        self.assertEqual(getbasename("nerdtree@ctrl-d"), "nerdtree@ctrl-d")
+
+    def test_versionkey(self):
+        names = ["a-1.10", "a-1.9", "a-1.13.2", "a-2.0", "a-1.2"]
+        self.assertEqual(sorted(names, key=versionkey),
+                         ["a-1.2", "a-1.9", "a-1.10", "a-1.13.2", "a-2.0"])
+
+class TestState(TempDirTest):
+    def setUp(self):
+        TempDirTest.setUp(self)
+        self.state = State(self.path("state"))
+
+    def saved(self):
+        with open(self.path("state"), "rt") as f:
+            return json.load(f)
+
+    def test_add(self):
+        self.state.add("foo-1.0", "foo", ["a", "b"], [("src", "dst")],
+                       requested=True, url="http://x/foo.zip", sha256="ab")
+        entry = State(self.path("state")).load().get("foo-1.0")
+        self.assertEqual(entry["name"], "foo")
+        self.assertEqual(entry["version"], "1.0")
+        self.assertEqual(entry["symlinks"], [["src", "dst"]])
+        self.assertTrue(entry["requested"])
+        self.assertEqual(entry["sha256"], "ab")
+        self.assertTrue(self.state.isinstalled("foo-1.0"))
+        self.assertTrue(self.state.modified)
+
+    def test_add_keeps_flags(self):
+        self.state.add("foo-1.0", "foo", [], [], requested=True)
+        self.state.set_lazy("foo-1.0", True)
+        self.state.add("foo-1.0", "foo", ["c"], [])
+        entry = self.state.get("foo-1.0")
+        self.assertTrue(entry["requested"])
+        self.assertTrue(entry["lazy"])
+
+    def test_enabled(self):
+        self.state.add("foo-1.0", "foo", [], [])
+        self.state.add("bar-1.0", "bar", [], [])
+        self.state.set_enabled("bar-1.0", False)
+        self.assertEqual(self.state.installed(), ["foo-1.0"])
+        self.assertEqual(self.state.installed(enabled=False),
+                         ["bar-1.0", "foo-1.0"])
+        self.state.remove("foo-1.0")
+        self.assertEqual(list(self.saved()["packages"]), ["bar-1.0"])
+
+    def test_batch(self):
+        with self.state.batch():
+            self.state.add("foo-1.0", "foo", [], [])
+            self.state.set_option("packed", True)
+            with self.state.batch():
+                self.state.add("bar-1.0", "bar", [], [])
+            self.assertFalse(self.state.exists)
+        data = self.saved()
+        self.assertEqual(sorted(data["packages"]), ["bar-1.0", "foo-1.0"])
+        self.assertEqual(data["options"], {"packed": True})
+
+    def test_restore(self):
+        self.state.add("foo-1.0", "foo", ["a"], [])
+        record = dict(self.state.get("foo-1.0"))
+        self.state.remove("foo-1.0")
+        self.state.restore("foo-1.0", record)
+        self.assertEqual(self.state.get("foo-1.0")["files"], ["a"])
+
+if __name__ == "__main__":
+    unittest.main()
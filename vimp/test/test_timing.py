@@ -0,0 +1,82 @@
+import sys
+import threading
+import unittest
+
+from vimp.test.helpers import (TempDirTest, writefile)
+from vimp.timing import StartupProfile
+
+class Output(object):
+    def __init__(self):
+        self.lines = []
+
+    def write(self, text):
+        self.lines.extend(text.splitlines())
+
+class TestStartupProfile(TempDirTest):
+    def setUp(self):
+        TempDirTest.setUp(self)
+        sys.path.insert(0, self.tmp)
+        self.profile = StartupProfile()
+        self.names = []
+
+    def tearDown(self):
+        self.profile.disable()
+        sys.path.remove(self.tmp)
+        for name in self.names:
+            sys.modules.pop(name, None)
+        TempDirTest.tearDown(self)
+
+    def module(self, name, seconds, imports=()):
+        """Writes a module that takes seconds to import, besides imports."""
+        self.names.append(name)
+        writefile(self.path(name + ".py"), "".join(
+            ["import time\n", "time.sleep(%f)\n" % seconds] +
+            ["import %s\n" % n for n in imports]))
+
+    def test_nested(self):
+        self.module("vimp_test_inner", 0.05)
+        self.module("vimp_test_outer", 0.05, ["vimp_test_inner"])
+        self.profile.enable()
+        import vimp_test_outer
+        self.profile.disable()
+
+        own, inclusive = self.profile.imports["vimp_test_outer"]
+        inner = self.profile.imports["vimp_test_inner"][1]
+        self.assertTrue(inner >= 0.05)
+        self.assertTrue(inclusive >= own + inner)
+        self.assertTrue(0.05 <= own < 0.05 + inner)
+        self.assertTrue(vimp_test_outer is not None)
+
+    def test_threads(self):
+        # An import in another thread is not charged to this one's
+        self.module("vimp_test_slow", 0.2)
+        self.module("vimp_test_other", 0.1)
+        self.profile.enable()
+        thread = threading.Thread(target=__import__, args=("vimp_test_slow",))
+        thread.start()
+        __import__("vimp_test_other")
+        thread.join()
+        self.profile.disable()
+        own, inclusive = self.profile.imports["vimp_test_slow"]
+        self.assertTrue(own >= 0.2)
+        self.assertEqual(own, inclusive)
+
+    def test_report(self):
+        self.module("vimp_test_inner", 0.01)
+        self.profile.enable()
+        with self.profile.phase("outer"):
+            with self.profile.phase("inner"):
+                __import__("vimp_test_inner")
+        self.profile.disable()
+
+        out = Output()
+        self.profile.report(out)
+        self.assertEqual(out.lines[0], "Startup profile (1 modules imported)")
+        self.assertTrue(out.lines[2].endswith("  vimp_test_inner"))
+        phases = [line[12:] for line in out.lines[5:7]]
+        self.assertEqual(phases, ["outer", "  inner"])
+        self.assertTrue(out.lines[-2].endswith("  imports"))
+        self.assertTrue(out.lines[-1].endswith("  total"))
+
+if __name__ == "__main__":
+    unittest.main()
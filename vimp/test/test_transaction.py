@@ -0,0 +1,102 @@
+import os
+import subprocess
+import sys
+import unittest
+
+from vimp.state import State
+from vimp.test.helpers import (TempDirTest, readfile, writefile)
+from vimp.transaction import (Transaction, pending, recover)
+
+class TestTransaction(TempDirTest):
+    def setUp(self):
+        TempDirTest.setUp(self)
+        self.state = State(self.path("state"))
+        self.install = self.path("installed", "foo-1.0")
+        self.journal = self.path("journal")
+        self.link = self.path("bundle")
+
+        # The package as it was before
+        writefile(os.path.join(self.install, "foo.vim"), "old")
+        os.symlink(self.install, self.link)
+        self.state.add("foo-1.0", "foo", ["foo.vim"], [])
+
+    def transaction(self):
+        return Transaction(self.state, "foo-1.0", self.install, self.journal)
+
+    def build(self, txn):
+        writefile(os.path.join(txn.staging, "foo.vim"), "new")
+        txn.publish()
+        txn.link(self.install, self.link)
+        self.state.add("foo-1.0", "foo", ["foo.vim", "new"], [])
+
+    def assertOld(self):
+        self.assertEqual(readfile(os.path.join(self.link, "foo.vim")), b"old")
+        self.assertEqual(self.state.get("foo-1.0")["files"], ["foo.vim"])
+        self.assertEqual(os.listdir(self.path("installed")), ["foo-1.0"])
+        self.assertEqual(os.listdir(self.journal), [])
+
+    def test_commit(self):
+        with self.transaction() as txn:
+            self.build(txn)
+        self.assertEqual(readfile(os.path.join(self.link, "foo.vim")), b"new")
+        self.assertEqual(self.state.get("foo-1.0")["files"],
+                         ["foo.vim", "new"])
+        self.assertEqual(os.listdir(self.path("installed")), ["foo-1.0"])
+        self.assertEqual(os.listdir(self.journal), [])
+
+    def test_rollback(self):
+        try:
+            with self.transaction() as txn:
+                self.build(txn)
+                raise KeyboardInterrupt()
+        except KeyboardInterrupt:
+            pass
+        self.assertOld()
+
+    def test_rollback_new(self):
+        self.state.remove("foo-1.0")
+        try:
+            with Transaction(self.state, "bar-1.0",
+                             self.path("installed", "bar-1.0"),
+                             self.journal) as txn:
+                writefile(os.path.join(txn.staging, "bar.vim"), "bar")
+                txn.publish()
+                self.state.add("bar-1.0", "bar", ["bar.vim"], [])
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertFalse(self.state.isinstalled("bar-1.0"))
+        self.assertEqual(os.listdir(self.path("installed")), ["foo-1.0"])
+
+    def test_recover(self):
+        # Interrupted after publishing, by a process that has exited
+        txn = self.transaction()
+        txn.begin()
+        self.build(txn)
+        txn.data["pid"] = self.exited()
+        txn._write()
+        self.assertEqual(len(pending(self.state, self.journal)), 1)
+
+        state = State(self.path("state")).load()
+        recover(state, self.journal)
+        self.state = state
+        self.assertOld()
+
+    def test_running(self):
+        # Transactions of a running vimp are left alone
+        txn = self.transaction()
+        txn.begin()
+        txn.data["pid"] = os.getppid()
+        txn._write()
+        recover(self.state, self.journal)
+        self.assertTrue(os.path.isdir(txn.staging))
+        self.assertEqual(os.listdir(self.journal), ["foo-1.0.json"])
+
+    def exited(self):
+        """Returns the id of a process that is no longer running."""
+        child = subprocess.Popen([sys.executable, "-c", "pass"])
+        child.wait()
+        return child.pid
+
+if __name__ == "__main__":
+    unittest.main()
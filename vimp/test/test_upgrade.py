@@ -0,0 +1,79 @@
+import os
+import unittest
+
+from vimp import install
+from vimp.test.helpers import (TempHomeTest, maketar, readfile, writefile)
+from vimp.test.server import Server
+from vimp.upgrade import (plan, upgrade_all)
+
+class TestUpgrade(TempHomeTest):
+    def setUp(self):
+        TempHomeTest.setUp(self)
+        self.server = Server().__enter__()
+        # Pathogen installed by hand, so that install does not fetch it
+        writefile(self.path(".vim", "autoload", "pathogen.vim"), "")
+
+    def tearDown(self):
+        self.server.__exit__(None, None, None)
+        TempHomeTest.tearDown(self)
+
+    def recipe(self, version):
+        archive = "foo-%s.tar.gz" % version
+        maketar(self.path(archive), {"foo/plugin/foo.vim": version})
+        self.server.files[archive] = readfile(self.path(archive))
+        return {
+            "download": [self.server.url(archive), archive],
+            "extract": [["foo/plugin/foo.vim", "{install}/plugin/foo.vim"]],
+            "symlink": [["{install}", "{bundle}"]],
+            "vimrc": ["let g:foo = '{install}'"],
+        }
+
+    def upgrade(self, aliases):
+        from vimp.command import install as install_command
+        self.catalog({"foo": "foo-1.0"}, {"foo-1.0": self.recipe("1.0")})
+        install_command("foo")
+
+        self.catalog(aliases, {"foo-1.0": self.recipe("1.0"),
+                               "foo-2.0": self.recipe("2.0")})
+        state = install.getstate()
+        upgrades = plan(state, install.getcatalog())
+        self.assertEqual(upgrades, [("foo-1.0", "foo-2.0")])
+        self.assertEqual(upgrade_all(upgrades), {})
+
+        # The new version is linked under the name of the old one
+        bundle = self.path(".vim", "bundle")
+        self.assertEqual(os.listdir(bundle), ["foo"])
+        self.assertEqual(os.readlink(os.path.join(bundle, "foo")),
+                         self.path(".vimp", "installed", "foo-2.0"))
+        self.assertEqual(readfile(os.path.join(bundle, "foo", "plugin",
+                                               "foo.vim")), b"2.0")
+        self.assertEqual(state.installed(), ["foo-2.0"])
+        self.assertEqual(state.get("foo-2.0")["name"], "foo")
+        self.assertTrue(state.get("foo-2.0")["requested"])
+        self.assertEqual(os.listdir(self.path(".vimp", "installed")),
+                         ["foo-2.0"])
+        vimrc = install.render_vimprc(state)
+        self.assertTrue("let g:foo = '%s'" % self.path(
+                        ".vimp", "installed", "foo-2.0") in vimrc)
+
+        # The package is known by its name afterwards
+        from vimp.command import (disable, remove)
+        self.assertEqual(install.get_full_name("foo"), "foo-2.0")
+        self.assertTrue(install.isinstalled("foo"))
+        disable("foo")
+        self.assertEqual(os.listdir(bundle), [])
+        self.assertFalse(state.get("foo-2.0")["enabled"])
+        remove("foo")
+        self.assertEqual(state.installed(enabled=False), [])
+        self.assertEqual(os.listdir(self.path(".vimp", "installed")), [])
+        self.assertEqual(install.get_full_name("foo"), aliases["foo"])
+
+    def test_alias_moved(self):
+        self.upgrade({"foo": "foo-2.0"})
+
+    def test_alias_kept(self):
+        # The alias still points to the installed version
+        self.upgrade({"foo": "foo-1.0"})
+
+if __name__ == "__main__":
+    unittest.main()
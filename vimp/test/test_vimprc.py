@@ -0,0 +1,99 @@
+import os
+import unittest
+
+from vimp import install
+from vimp.test.helpers import (TempHomeTest, readfile, writefile)
+from vimp.util import symlink
+
+SCRIPTS = {
+    "pathogen-2.3": {
+        "symlink": [["{install}/autoload/pathogen.vim",
+                     "{vim}/autoload/pathogen.vim"]],
+        "vimrc": ["execute pathogen#infect()"],
+    },
+    "abc-1.0": {
+        "symlink": [["{install}", "{bundle}"]],
+        "vimrc": ["let g:abc = '{install}'"],
+    },
+    "zzz-1.0": {
+        "symlink": [["{install}", "{bundle}"]],
+        "vimrc": ["let g:zzz = 1"],
+    },
+}
+
+class TestVimrc(TempHomeTest):
+    def setUp(self):
+        TempHomeTest.setUp(self)
+        self.catalog({"pathogen": "pathogen-2.3", "abc": "abc-1.0",
+                      "zzz": "zzz-1.0"}, SCRIPTS)
+        for full in sorted(SCRIPTS):
+            self.add(full)
+        install.update_vimprc(force=True)
+
+    def add(self, full):
+        """Installs a package by hand, as install_script would."""
+        state = install.getstate()
+        path = install.getpath("install", full)
+        if full.startswith("pathogen"):
+            writefile(os.path.join(path, "autoload", "pathogen.vim"), "")
+        else:
+            writefile(os.path.join(path, "plugin", full + ".vim"), "")
+        links = [(install.expandvars(full, src), install.expandvars(full, dst))
+                 for (src, dst) in SCRIPTS[full]["symlink"]]
+        for (src, dst) in links:
+            symlink(src, dst)
+        state.add(full, full.split("-")[0], install.listfiles(path), links,
+                  requested=True)
+
+    def vimrc(self):
+        return readfile(self.path(".vimp", "vimrc")).decode("utf-8")
+
+    def blocks(self):
+        return [line[len("\" ==== "):-len(" ====")]
+                for line in self.vimrc().splitlines()
+                if line.startswith("\" ==== ")]
+
+    def test_blocks(self):
+        # Pathogen comes first, since the others need it
+        self.assertEqual(self.blocks(), ["pathogen", "abc", "zzz"])
+        self.assertTrue("  let g:abc = '%s'\n" % self.path(
+                        ".vimp", "installed", "abc-1.0") in self.vimrc())
+        self.assertTrue('if filereadable("%s")\n' % self.path(
+                        ".vim", "bundle", "zzz") in self.vimrc())
+
+    def test_disabled_and_removed(self):
+        from vimp.command import (disable, remove)
+        disable("zzz")
+        install.update_vimprc()
+        self.assertEqual(self.blocks(), ["pathogen", "abc"])
+        remove("abc")
+        install.update_vimprc()
+        self.assertEqual(self.blocks(), ["pathogen"])
+        self.assertFalse("g:abc" in self.vimrc())
+
+    def test_unchanged(self):
+        # The file is not written again if it would be the same
+        vimprc = self.path(".vimp", "vimrc")
+        os.utime(vimprc, (0, 0))
+        before = os.stat(vimprc)
+        install.update_vimprc(force=True)
+        after = os.stat(vimprc)
+        self.assertEqual((after.st_ino, after.st_mtime),
+                         (before.st_ino, before.st_mtime))
+
+        # Nor rendered at all if nothing has changed
+        writefile(vimprc, "edited by hand")
+        install.getstate().modified = False
+        install.update_vimprc()
+        self.assertEqual(self.vimrc(), "edited by hand")
+
+    def test_fsck(self):
+        from vimp.command import fsck
+        text = self.vimrc()
+        writefile(self.path(".vimp", "vimrc"), "edited by hand")
+        install.getstate().modified = False
+        fsck()
+        self.assertEqual(self.vimrc(), text)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+"""
+Measures where vimp spends its time when starting up.
+
+Run `vimp --profile-startup <command>` to print how long each module took
+to import and how long each phase of the run took, e.g. configuring,
+loading the catalog and dispatching the command.  The report is written
+to standard error, so it does not mix with the command's own output.
+Imports and phases are accounted for separately in each thread, since
+packages are installed by a pool of threads.
+
+Copyright (C) 2014 Christian Stigen Larsen
+Distributed under the LGPL v2.1; see LICENSE.txt
+"""
+
+import sys
+import threading
+import time
+
+try:
+    import __builtin__ as builtins
+except ImportError:
+    import builtins
+
+clock = getattr(time, "perf_counter", time.time)
+
+# Number of slowest imports to show in the report.
+TOP_IMPORTS = 15
+
+class StartupProfile(object):
+    """Records module import times and named phases."""
+    def __init__(self):
+        self.enabled = False
+        self.started = clock()
+        self.imports = {}
+        self.phases = []
+        self._local = threading.local()
+        self._import = None
+
+    @property
+    def _stack(self):
+        # Time spent in nested imports, for each import in progress in the
+        # current thread
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @property
+    def _depth(self):
+        return getattr(self._local, "depth", 0)
+
+    @_depth.setter
+    def _depth(self, depth):
+        self._local.depth = depth
+
+    def enable(self):
+        """Starts timing imports of modules that are not yet loaded."""
+        if self.enabled:
+            return
+        self.enabled = True
+        self._import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def disable(self):
+        """Stops timing imports."""
+        if self._import is not None:
+            builtins.__import__ = self._import
+            self._import = None
+
+    def _timed_import(self, name, *args, **kw):
+        if name in sys.modules:
+            return self._import(name, *args, **kw)
+
+        # Inclusive time is charged to the module, and subtracted from the
+        # module that imported it in the same thread.
+        stack = self._stack
+        stack.append(0.0)
+        start = clock()
+        try:
+            return self._import(name, *args, **kw)
+        finally:
+            elapsed = clock() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            if name not in self.imports:
+                self.imports[name] = (elapsed - nested, elapsed)
+
+    def phase(self, name):
+        """Returns a context manager that times a phase of the run."""
+        return _Phase(self, name)
+
+    def report(self, out=None):
+        """Writes the timings to out, or standard error."""
+        out = out if out is not None else sys.stderr
+        total = clock() - self.started
+        imported = sum(own for (own, _) in self.imports.values())
+
+        out.write("Startup profile (%d modules imported)\n" %
+                  len(self.imports))
+        out.write("%10s %10s  %s\n" % ("self ms", "total ms", "module"))
+        slowest = sorted(self.imports.items(), key=lambda i: -i[1][0])
+        for (name, (own, inclusive)) in slowest[:TOP_IMPORTS]:
+            out.write("%10.1f %10.1f  %s\n" % (own*1000, inclusive*1000,
+                                               name))
+
+        out.write("\n%10s  %s\n" % ("ms", "phase"))
+        for (depth, name, elapsed) in self.phases:
+            out.write("%10.1f  %s%s\n" % (elapsed*1000, "  "*depth, name))
+
+        out.write("\n%10.1f  imports\n" % (imported*1000))
+        out.write("%10.1f  total\n" % (total*1000))
+
+class _Phase(object):
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        if self.profile.enabled:
+            self.index = len(self.profile.phases)
+            self.profile.phases.append((self.profile._depth, self.name, 0.0))
+            self.profile._depth += 1
+            self.start = clock()
+        return self
+
+    def __exit__(self, ex, bt, a):
+        if self.profile.enabled:
+            elapsed = clock() - self.start
+            self.profile._depth -= 1
+            self.profile.phases[self.index] = (self.profile._depth, self.name,
+                                               elapsed)
+
+# The profile of this run, enabled by `vimp --profile-startup`.
+profile = StartupProfile()
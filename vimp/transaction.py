@@ -0,0 +1,177 @@
+"""
+Atomic installation of a package, with rollback.
+
+A package is first built in a staging directory next to its install
+directory.  It is then published by renaming the staging directory into
+place, and linked into vim by swapping in symlinks with a rename.  Before
+each of these steps, what is needed to undo it is written to a journal in
+~/.vimp/journal.  If the install fails, or is interrupted, the journal is
+used to restore the package, its symlinks and its state record to what they
+were before.  A journal left behind by a crash is rolled back the next time
+vimp loads its state, unless the vimp process that wrote it is still
+running.
+
+Copyright (C) 2014 Christian Stigen Larsen
+Distributed under the LGPL v2.1; see LICENSE.txt
+"""
+
+import errno
+import json
+import os
+import shutil
+
+from vimp.log import verb
+from vimp.util import (joinpath, mkdir, pathname, readlink, symlink)
+
+class Transaction(object):
+    """Installs a package so that it either succeeds or leaves no trace.
+
+    Use it as a context manager: the transaction is committed if the block
+    succeeds, and rolled back if it raises, including on Ctrl-C."""
+    def __init__(self, state, fullname, install, journal):
+        self.state = state
+        self.fullname = fullname
+        self.install = install
+        self.journalfile = joinpath(journal, fullname + ".json")
+        suffix = ".%d" % os.getpid()
+        record = state.get(fullname)
+        self.data = {
+            "fullname": fullname,
+            "install": install,
+            "staging": install + ".staging" + suffix,
+            "backup": install + ".backup" + suffix,
+            "pid": os.getpid(),
+            "published": False,
+            "links": [],
+            "record": dict(record) if record is not None else None,
+        }
+
+    @classmethod
+    def load(cls, state, journalfile):
+        """Returns the transaction recorded in a journal file."""
+        with open(journalfile, "rt") as f:
+            data = json.load(f)
+        txn = cls(state, data["fullname"], data["install"],
+                  pathname(journalfile))
+        txn.journalfile = journalfile
+        txn.data = data
+        return txn
+
+    @property
+    def staging(self):
+        """Directory the package is built in before it is published."""
+        return self.data["staging"]
+
+    def __enter__(self):
+        self.begin()
+        return self
+
+    def __exit__(self, ex, bt, a):
+        if ex is None:
+            self.commit()
+        else:
+            self.rollback()
+
+    def _write(self):
+        """Atomically writes the journal."""
+        mkdir(pathname(self.journalfile))
+        temp = "%s.%d" % (self.journalfile, os.getpid())
+        with open(temp, "wt") as f:
+            json.dump(self.data, f, indent=1, sort_keys=True)
+        os.rename(temp, self.journalfile)
+
+    def begin(self):
+        """Creates an empty staging directory and the journal."""
+        self._write()
+        if os.path.isdir(self.staging):
+            shutil.rmtree(self.staging)
+        mkdir(self.staging)
+
+    def publish(self):
+        """Moves the staging directory to the install directory.
+
+        An existing install directory is kept as a backup until the
+        transaction is committed."""
+        self.data["published"] = True
+        self._write()
+        if os.path.lexists(self.install):
+            verb("Backing up %s" % self.install)
+            os.rename(self.install, self.data["backup"])
+        verb("Publishing %s" % self.install)
+        os.rename(self.staging, self.install)
+
+    def link(self, src, dst):
+        """Atomically points the symlink dst to src.
+
+        Rolling back restores the symlink that was at dst before, but not a
+        regular file."""
+        self.data["links"].append((dst, readlink(dst)))
+        self._write()
+        symlink(src, dst)
+
+    def commit(self):
+        """Removes the backup and the journal."""
+        backup = self.data["backup"]
+        if os.path.lexists(backup):
+            shutil.rmtree(backup)
+        os.unlink(self.journalfile)
+
+    def rollback(self):
+        """Undoes every step of the transaction that was carried out."""
+        print("Rolling back install of %s" % self.fullname)
+        for (dst, previous) in reversed(self.data["links"]):
+            if readlink(dst) == previous:
+                continue
+            if os.path.lexists(dst):
+                os.unlink(dst)
+            if previous is not None:
+                os.symlink(previous, dst)
+
+        # Once the staging directory is gone, the install directory holds
+        # the new package, and the backup (if any) the old one.
+        backup = self.data["backup"]
+        if self.data["published"]:
+            if not os.path.isdir(self.staging) and \
+                    os.path.isdir(self.install):
+                shutil.rmtree(self.install)
+            if os.path.lexists(backup):
+                os.rename(backup, self.install)
+        if os.path.isdir(self.staging):
+            shutil.rmtree(self.staging)
+
+        record = self.data["record"]
+        if record is not None:
+            self.state.restore(self.fullname, record)
+        else:
+            self.state.remove(self.fullname)
+
+        if os.path.exists(self.journalfile):
+            os.unlink(self.journalfile)
+
+def running(pid):
+    """Checks if another process with the given id is running."""
+    if pid is None or pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+def pending(state, journal):
+    """Returns the transactions in the journal directory."""
+    if not os.path.isdir(journal):
+        return []
+    return [Transaction.load(state, joinpath(journal, name))
+            for name in sorted(os.listdir(journal)) if name.endswith(".json")]
+
+def recover(state, journal):
+    """Rolls back transactions left behind by an interrupted vimp.
+
+    Transactions of vimp processes that are still running are left alone."""
+    for txn in pending(state, journal):
+        if running(txn.data.get("pid")):
+            verb("Leaving transaction of running process %d for %s" % (
+                 txn.data["pid"], txn.fullname))
+            continue
+        txn.rollback()
@@ -0,0 +1,126 @@
+"""
+Upgrades installed packages to the newest versions in the catalog.
+
+The new versions of all packages are downloaded in parallel, and each is
+installed as soon as its download is done, while the others are still in
+flight.  A package is upgraded by building the new version next to the old
+one, reusing the old version's files where they have not changed, and then
+swapping its symlinks over, so vim never sees a half-upgraded package.  The
+state database is written once, after all upgrades.
+
+Copyright (C) 2014 Christian Stigen Larsen
+Distributed under the LGPL v2.1; see LICENSE.txt
+"""
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+from vimp.download import Downloader
+from vimp.install import (
+    download,
+    get_full_name,
+    get_script,
+    getsource,
+    getstate,
+    install_script,
+)
+from vimp.pool import WorkerPool
+from vimp.state import (getbasename, versionkey)
+
+def newest(catalog, fullname):
+    """Returns the newest version of a package in the catalog."""
+    basename = getbasename(fullname)
+    versions = [n for n in catalog.names() if getbasename(n) == basename]
+    return max(versions + [fullname], key=versionkey)
+
+def plan(state, catalog, names=None):
+    """Returns sorted (installed, newest) full names of packages that have
+    newer versions.
+
+    Only names are considered if given, and otherwise all enabled
+    packages."""
+    if names is None:
+        installed = state.installed()
+    else:
+        bases = set(getbasename(get_full_name(n)) for n in names)
+        installed = [f for f in state.installed() if getbasename(f) in bases]
+
+    upgrades = []
+    for full in installed:
+        target = newest(catalog, full)
+        if target != full:
+            upgrades.append((full, target))
+    return upgrades
+
+def missing_deps(state, catalog, upgrades):
+    """Returns full names of dependencies of the new versions that are not
+    installed in any version."""
+    installed = set(getbasename(f) for f in state.installed())
+    installed.update(getbasename(new) for (_, new) in upgrades)
+    missing = set()
+    for (_, new) in upgrades:
+        for dep in catalog.deps(new):
+            if getbasename(get_full_name(dep)) not in installed:
+                missing.add(get_full_name(dep))
+    return sorted(missing)
+
+def upgrade_all(upgrades, jobs=None):
+    """Downloads and installs new versions of packages.
+
+    upgrades is a list of (installed, new) full names.  Returns dict of
+    installed full name to error for upgrades that failed; those packages
+    are left as they were.
+
+    Packages are known by the short name they are installed under, which
+    the new versions keep, even where the catalog's aliases still point to
+    the installed versions."""
+    events = queue.Queue()
+    failed = {}
+    state = getstate()
+    previous = dict((state.get(old)["name"], old) for (old, _) in upgrades)
+    targets = dict((state.get(old)["name"], new) for (old, new) in upgrades)
+    scripts = dict((name, get_script(new)) for (name, new) in targets.items())
+
+    def downloaded(result):
+        events.put(("downloaded", result.name, result.error))
+
+    installer = WorkerPool(jobs)
+    loader = Downloader(jobs, callback=downloaded, fetcher=download)
+
+    def submit(name):
+        def installed(task):
+            events.put(("installed", name, task.error))
+        installer.submit(install_script, (targets[name], scripts[name], False,
+                                          previous[name]),
+                         callback=installed)
+
+    pending = set(scripts)
+    with state.batch():
+        with installer:
+            with loader:
+                for name in sorted(scripts):
+                    source = getsource(targets[name], scripts[name])
+                    if source is None:
+                        submit(name)
+                    else:
+                        url, archive, options = source
+                        loader.add(name, url, archive, **options)
+
+                while len(pending) > 0:
+                    try:
+                        event, name, error = events.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+                    if error is not None:
+                        failed[previous[name]] = error
+                        pending.discard(name)
+                    elif event == "downloaded":
+                        submit(name)
+                    else:
+                        pending.discard(name)
+
+    for old in sorted(failed):
+        print("Error: Could not upgrade %s: %s" % (old, failed[old]))
+    return failed
@@ -5,12 +5,16 @@ Copyright (C) 2014 Christian Stigen Larsen
 Distributed under the LGPL v2.1; see LICENSE.txt
 """
 
+import errno
 import os
 import shutil
-import sys
 
 from vimp.log import verb
 
+class VimpError(Exception):
+    """An error that vimp reports to the user and then exits."""
+    pass
+
 def touch(path):
     """Creates an empty file."""  
     if not exists(path):
@@ -26,7 +30,12 @@ def mkdir(path):
     """Creates full directory path if it does not exist."""
     if not exists(path):
         verb("Creating directories %s" % path)
-        os.makedirs(path)
+        try:
+            os.makedirs(path)
+        except OSError as e:
+            # Someone else may have created it in the meantime
+            if e.errno != errno.EEXIST:
+                raise
 
 def copyfile(src, dst):
     verb("Copy %s to %s" % (src, dst))
@@ -37,22 +46,50 @@ def pathname(path):
     return os.path.split(path)[0]
 
 def symlink(src, dst):
-  """Creates a symlink at `dst` that points to `src`."""
+  """Creates a symlink at `dst` that points to `src`.
 
-  if exists(dst):
-      verb("Symlink: Removing existing file %s" % dst)
-      os.unlink(dst)
+  The link is created under a temporary name and renamed over `dst`, so
+  `dst` is replaced atomically and never missing.  Raises VimpError if
+  `src` does not exist."""
 
   if not exists(src):
-      print("Error: Symlink source does not exist: %s" % src)
-      sys.exit(1)
-  if not exists(dst):
-      # TODO: Shouldn't use pathname below, we only want to
-      #       create directories UP TO the last part.
-      mkdir(pathname(dst))
+      raise VimpError("Symlink source does not exist: %s" % src)
+
+  # TODO: Shouldn't use pathname below, we only want to
+  #       create directories UP TO the last part.
+  mkdir(pathname(dst))
 
   verb("Symlinking %s -> %s" % (dst, src))
-  os.symlink(src, dst)
+  temp = "%s.vimp-%d" % (dst, os.getpid())
+  if os.path.lexists(temp):
+      os.unlink(temp)
+  os.symlink(src, temp)
+  try:
+      os.rename(temp, dst)
+  except OSError:
+      os.unlink(temp)
+      raise
+
+def formatsize(size):
+    """Formats a byte count as a human readable string."""
+    for unit in ["bytes", "kB", "MB", "GB"]:
+        if size < 1024 or unit == "GB":
+            break
+        size /= 1024.0
+    return ("%d %s" if unit == "bytes" else "%.1f %s") % (size, unit)
+
+def parsesize(text):
+    """Parses sizes like 512, 100k, 20M or 1G into a byte count."""
+    units = {"k": 1024, "m": 1024**2, "g": 1024**3}
+    text = text.strip().lower().rstrip("b")
+    factor = 1
+    if len(text) > 0 and text[-1] in units:
+        factor = units[text[-1]]
+        text = text[:-1]
+    try:
+        return int(float(text) * factor)
+    except ValueError:
+        raise VimpError("Invalid size: %s" % text)
 
 def readlink(path):
     try: